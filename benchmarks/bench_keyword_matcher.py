@@ -0,0 +1,88 @@
+"""
+关键词匹配性能测试 - 对比逐个触发器线性扫描与编译后的多模式匹配器
+
+用法:
+    python benchmarks/bench_keyword_matcher.py [--messages 200] [--sizes 10,1000,50000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from my_qq_bot.keyword_matcher import KeywordMatcher  # noqa: E402
+
+# 用于生成随机关键词和消息的常用汉字
+CHARSET = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处府队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+
+
+def random_word(rng, min_len=2, max_len=4):
+    return "".join(rng.choice(CHARSET) for _ in range(rng.randint(min_len, max_len)))
+
+
+def build_triggers(rng, count):
+    """生成指定数量的随机触发器（关键词互不相同）"""
+    keywords = set()
+    while len(keywords) < count:
+        keywords.add(random_word(rng))
+    return [{"keyword": keyword, "answers": [{"text": keyword}]} for keyword in keywords]
+
+
+def build_messages(rng, triggers, count, length=40, hit_ratio=0.3):
+    """生成测试消息，其中一部分会嵌入某个触发器的关键词"""
+    messages = []
+    for _ in range(count):
+        message = random_word(rng, length, length)
+        if rng.random() < hit_ratio:
+            keyword = rng.choice(triggers)["keyword"]
+            pos = rng.randint(0, length)
+            message = message[:pos] + keyword + message[pos:]
+        messages.append(message)
+    return messages
+
+
+def linear_scan(triggers, message_str):
+    """原实现：逐个触发器判断关键词是否出现在消息中"""
+    return [trigger for trigger in triggers if trigger["keyword"] in message_str]
+
+
+def measure(func, messages):
+    """返回处理每条消息的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词匹配性能测试")
+    parser.add_argument("--messages", type=int, default=200, help="每组测试的消息数量")
+    parser.add_argument("--sizes", default="10,1000,50000", help="触发器数量，逗号分隔")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'triggers':>10} {'compile ms':>12} {'linear us/msg':>15} {'compiled us/msg':>17} {'speedup':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        triggers = build_triggers(rng, size)
+        messages = build_messages(rng, triggers, args.messages)
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(triggers)
+        compile_ms = (time.perf_counter() - start) * 1e3
+
+        # 两种实现的匹配结果必须一致
+        for message in messages:
+            expected = {t["keyword"] for t in linear_scan(triggers, message)}
+            assert {t["keyword"] for t in matcher.match(message)} == expected
+
+        linear_us = measure(lambda m: linear_scan(triggers, m), messages)
+        compiled_us = measure(matcher.match, messages)
+        print(f"{size:>10} {compile_ms:>12.1f} {linear_us:>15.1f} {compiled_us:>17.1f} {linear_us / compiled_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
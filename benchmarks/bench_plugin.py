@@ -0,0 +1,352 @@
+"""
+插件负载测试 - 使用 AstrBot 替身驱动插件的各个入口，输出吞吐量、各阶段延迟和峰值内存
+
+测试场景:
+    handle_message: MyQQBotPlugin.handle_message，合成的群聊/私聊消息
+    keyword_reply: KeywordReplyModule.handle_keyword_reply
+    get_image: DoudouImageModule.get_image
+    scheduled: ScheduledTaskModule.send_scheduled_message，群发给多个目标
+
+用法:
+    python benchmarks/bench_plugin.py [--messages 2000] [--concurrency 64] [--scenarios handle_message,get_image]
+                                      [--json results.json] [--baseline previous.json]
+
+未安装 AstrBot 时自动使用 fake_astrbot 中的替身模块；测试在临时目录中进行，不会修改 data/ 下的文件。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fake_astrbot import (  # noqa: E402
+    EventGenerator, FakeContext, FakeConversationManager, FakeLLMRequest, FakeProvider, install_stubs,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("handle_message", "keyword_reply", "get_image", "scheduled")
+
+
+def peak_rss_mb():
+    """进程的峰值常驻内存（MB），平台不支持时返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def write_images(category_dir, count, rng):
+    """生成测试图片，未安装 Pillow 时写入占位文件（此时不能启用图片压缩缓存）"""
+    os.makedirs(category_dir, exist_ok=True)
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    for i in range(count):
+        path = os.path.join(category_dir, f"{i:04d}.jpg")
+        if Image:
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new("RGB", (1600, 1200), color).save(path, quality=90)
+        else:
+            with open(path, "wb") as f:
+                f.write(os.urandom(2048))
+
+
+def prepare_source_dir(args, rng):
+    """在临时目录中准备插件的 data/ 目录，以仓库中的 config.yaml 为基础关闭与测试无关的后台功能"""
+    import yaml
+    from my_qq_bot.config import load_plugin_config
+
+    source_dir = tempfile.mkdtemp(prefix="my-qq-bot-bench-")
+    data_dir = os.path.join(source_dir, "data")
+    os.makedirs(data_dir)
+
+    config = load_plugin_config(ROOT)
+    config.setdefault("hot_reload", {})["enabled"] = False
+    config.setdefault("metrics", {})["flush_interval"] = 0
+    config.setdefault("classify_cache", {})["persist"] = False
+    config.setdefault("remote_images", {})["enabled"] = False
+    config.setdefault("pipeline", {})["mode"] = args.mode
+    if args.debounce is not None:
+        config.setdefault("dispatcher", {})["debounce"] = args.debounce
+    config.setdefault("admission", {})["enabled"] = not args.no_admission
+    config.setdefault("streaming", {}).update(enabled=args.streaming, interval=args.stream_interval)
+    doudou = config.setdefault("doudou_image", {})
+    doudou["root_dir"] = os.path.join(source_dir, "pictures")
+    doudou["cache"] = dict(doudou.get("cache") or {}, enabled=args.image_cache, warm_on_start=False)
+    broadcast = config.setdefault("scheduler", {}).setdefault("broadcast", {})
+    broadcast.update(rate=args.send_rate, burst=max(1, int(args.send_rate)))
+    with open(os.path.join(data_dir, "config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+    keywords = [f"关键词{i}" for i in range(args.triggers)]
+    triggers = [{"keyword": keyword, "answers": [{"text": f"{keyword}的回复"}]} for keyword in keywords]
+    with open(os.path.join(data_dir, "keyreply.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump({"triggers": triggers}, f, allow_unicode=True)
+    with open(os.path.join(data_dir, "scheduled.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump({"schedules": []}, f, allow_unicode=True)
+
+    for category in ("豆豆", "小豆"):
+        write_images(os.path.join(doudou["root_dir"], category), args.images, rng)
+    return source_dir, keywords
+
+
+async def simulate_llm_request(context, event, request, on_llm_response=None):
+    """
+    模拟 AstrBot 流水线处理 request_llm：调用提供商，调用 on_llm_response 钩子，
+    请求中带有会话对象时像 AstrBot 一样把一问一答写回会话历史
+    """
+    kwargs = request.kwargs
+    response = await context.provider.text_chat(prompt=kwargs.get("prompt", ""), contexts=kwargs.get("contexts"))
+    if on_llm_response:
+        await on_llm_response(event, response)
+    conversation = kwargs.get("conversation")
+    if conversation is not None:
+        history = json.loads(conversation.history or "[]")
+        history.append({"role": "user", "content": kwargs.get("prompt", "")})
+        history.append({"role": "assistant", "content": response.completion_text})
+        await context.conversation_manager.update_conversation(event.unified_msg_origin, conversation.cid, history)
+
+
+async def drive(events, handler, concurrency, on_result=None):
+    """
+    以固定并发数处理一组输入（闭环：每个工作协程处理完一条再取下一条）
+
+    返回:
+        (每条输入的耗时列表, 出错数量, 产生的回复数量, 总耗时)
+    """
+    iterator = iter(events)
+    latencies = []
+    counts = {"errors": 0, "outputs": 0}
+
+    async def worker():
+        for item in iterator:
+            start = time.perf_counter()
+            try:
+                result = handler(item)
+                if hasattr(result, "__aiter__"):
+                    async for output in result:
+                        counts["outputs"] += 1
+                        if on_result:
+                            await on_result(item, output)
+                else:
+                    await result
+                    counts["outputs"] += 1
+            except Exception as e:
+                counts["errors"] += 1
+                logging.getLogger("bench").debug("处理失败: %s", e)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, counts["errors"], counts["outputs"], time.perf_counter() - start
+
+
+def ms_summary(summary):
+    """把以秒为单位的统计摘要转换为毫秒"""
+    return {key: round(value * 1000, 3) if key != "count" else value for key, value in summary.items()}
+
+
+def scenario_result(latencies, errors, outputs, duration, units=None):
+    from my_qq_bot.metrics import summarize
+
+    units = units if units is not None else len(latencies)
+    return {
+        "inputs": len(latencies),
+        "errors": errors,
+        "outputs": outputs,
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(units / duration, 2) if duration else 0.0,
+        "latency_ms": ms_summary(summarize(latencies)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_benchmark(args):
+    rng = random.Random(args.seed)
+    source_dir, keywords = prepare_source_dir(args, rng)
+
+    import main
+    from my_qq_bot.metrics import MetricsRegistry
+
+    # 插件从 main.source_dir 读取 data/ 目录
+    main.source_dir = source_dir
+    provider = FakeProvider(args.latency_ms, args.latency_sigma, args.error_rate, args.reply_length, seed=args.seed)
+    conversations = FakeConversationManager(args.history_turns, args.db_latency_ms)
+    context = FakeContext(provider, conversations, args.send_latency_ms, args.send_error_rate, seed=args.seed)
+
+    def generator(**kwargs):
+        options = dict(
+            group_ratio=args.group_ratio, at_ratio=args.at_ratio, canned_ratio=args.canned_ratio,
+            mean_length=args.mean_length, groups=args.groups, users=args.users, seed=args.seed,
+        )
+        options.update(kwargs)
+        gen = EventGenerator(**options)
+        return [gen.next_event() for _ in range(args.messages)]
+
+    results = {}
+    plugin = main.MyQQBotPlugin(context)
+    try:
+        doudou_module = await plugin.get_doudou_module()
+        await asyncio.to_thread(doudou_module.catalog.wait_ready, 30)
+        for name in args.scenarios:
+            plugin.metrics = MetricsRegistry()
+            calls_before = provider.calls
+
+            if name == "handle_message":
+                async def on_result(event, output):
+                    if isinstance(output, FakeLLMRequest):
+                        with plugin.metrics.timer("simulated_pipeline_llm"):
+                            await simulate_llm_request(context, event, output, plugin.save_llm_reply)
+
+                result = scenario_result(*await drive(generator(), plugin.handle_message, args.concurrency, on_result))
+                snapshot = plugin.metrics.snapshot()
+                result["stages_ms"] = {stage: ms_summary(s) for stage, s in snapshot["histograms"].items()}
+                result["counters"] = snapshot["counters"]
+            elif name == "keyword_reply":
+                events = generator(keywords=keywords, keyword_ratio=args.keyword_ratio, canned_ratio=0)
+                result = scenario_result(*await drive(events, plugin.keyword_module.handle_keyword_reply, args.concurrency))
+            elif name == "get_image":
+                events = generator()
+                result = scenario_result(*await drive(
+                    events, lambda e: doudou_module.get_image(e, rng.choice(["豆豆", "小豆"])), args.concurrency,
+                ))
+                image_cache = doudou_module.image_cache
+                if image_cache:
+                    # 等待后台生成的副本完成，再清理临时目录
+                    with image_cache.lock:
+                        pending = list(image_cache.pending.values())
+                    await asyncio.to_thread(wait, pending)
+                    result["image_cache"] = image_cache.stats()
+            else:
+                targets = [f"fake:GroupMessage:{900000 + i}" for i in range(args.targets)]
+                send_items = [{"text": "定时消息"}]
+                broadcasts = range(args.broadcasts)
+                latencies, errors, outputs, duration = await drive(
+                    broadcasts, lambda _: plugin.scheduled_module.send_scheduled_message(targets, send_items), 1,
+                )
+                # 吞吐量按送达的消息条数计算
+                result = scenario_result(latencies, errors, outputs, duration, units=context.sent)
+                context.sent = 0
+
+            result["provider_calls"] = provider.calls - calls_before
+            results[name] = result
+            print_result(name, result)
+    finally:
+        await plugin.terminate()
+        shutil.rmtree(source_dir, ignore_errors=True)
+    return results
+
+
+def print_result(name, result):
+    latency = result["latency_ms"]
+    print(
+        f"{name:<16} 吞吐 {result['throughput_per_s']:>9.1f}/s  p50 {latency['p50']:>9.2f}ms  "
+        f"p99 {latency['p99']:>9.2f}ms  错误 {result['errors']:>4}  LLM调用 {result['provider_calls']:>5}  "
+        f"峰值内存 {result['peak_rss_mb'] or 0:.1f}MB"
+    )
+    for stage, summary in result.get("stages_ms", {}).items():
+        print(f"    {stage:<28} n={summary['count']:<6} p50 {summary['p50']:>9.2f}ms  p99 {summary['p99']:>9.2f}ms")
+
+
+def compare_with_baseline(results, baseline_path):
+    """与之前保存的结果对比吞吐量和 p99 延迟"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+    print(f"\n与基线 {baseline_path} 对比:")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        throughput = result["throughput_per_s"] / previous["throughput_per_s"] - 1 if previous["throughput_per_s"] else 0
+        p99 = result["latency_ms"]["p99"] / previous["latency_ms"]["p99"] - 1 if previous["latency_ms"]["p99"] else 0
+        print(f"{name:<16} 吞吐 {throughput:+.1%}  p99 {p99:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="插件负载测试")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="测试场景，逗号分隔")
+    parser.add_argument("--messages", type=int, default=2000, help="每个场景的消息数量")
+    parser.add_argument("--concurrency", type=int, default=64, help="同时处理的消息数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    # 合成流量
+    parser.add_argument("--group-ratio", type=float, default=0.7, help="群聊消息的比例")
+    parser.add_argument("--at-ratio", type=float, default=0.8, help="群聊消息中@机器人的比例")
+    parser.add_argument("--canned-ratio", type=float, default=0.3, help="问候、要照片等固定短语的比例")
+    parser.add_argument("--mean-length", type=int, default=20, help="随机消息长度的中位数")
+    parser.add_argument("--groups", type=int, default=20, help="群的数量")
+    parser.add_argument("--users", type=int, default=500, help="用户的数量")
+    parser.add_argument("--triggers", type=int, default=1000, help="关键词回复的触发器数量")
+    parser.add_argument("--keyword-ratio", type=float, default=0.3, help="keyword_reply 场景中命中关键词的比例")
+    parser.add_argument("--images", type=int, default=50, help="每个图片类别的图片数量")
+    parser.add_argument("--targets", type=int, default=50, help="scheduled 场景中每次群发的目标数")
+    parser.add_argument("--broadcasts", type=int, default=10, help="scheduled 场景中的群发次数")
+    # 替身的延迟和错误
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="LLM 延迟的中位数（毫秒）")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="LLM 延迟对数正态分布的形状参数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="LLM 请求失败的比例")
+    parser.add_argument("--reply-length", type=int, default=60, help="LLM 自由回复的字数")
+    parser.add_argument("--history-turns", type=int, default=200, help="每个会话预先填充的历史轮数")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="会话管理器每次读写的延迟（毫秒）")
+    parser.add_argument("--send-latency-ms", type=float, default=20.0, help="发送消息的延迟（毫秒）")
+    parser.add_argument("--send-error-rate", type=float, default=0.0, help="发送消息失败的比例")
+    parser.add_argument("--send-rate", type=float, default=1000.0, help="群发时每个平台每秒的发送上限")
+    # 插件配置
+    parser.add_argument("--mode", default="sequential", help="流水线模式: sequential / concurrent / single_call")
+    parser.add_argument("--debounce", type=float, help="会话调度的防抖时间（秒），默认使用 config.yaml 中的值")
+    parser.add_argument("--no-admission", action="store_true", help="关闭准入控制")
+    parser.add_argument("--streaming", action="store_true", help="以流式方式生成自由回复并分条发送")
+    parser.add_argument("--stream-interval", type=float, default=0.0, help="流式回复相邻两条消息的最小间隔（秒）")
+    parser.add_argument("--image-cache", action="store_true", help="启用图片压缩缓存（需要 Pillow）")
+    # 输出
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前的 JSON 结果对比")
+    parser.add_argument("--log-level", default="WARNING", help="插件日志级别")
+    args = parser.parse_args()
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的测试场景: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger("astrbot").setLevel(args.log_level)
+    stubbed = install_stubs()
+
+    results = asyncio.run(run_benchmark(args))
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "astrbot_stubbed": stubbed,
+            "args": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+        },
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+消息预过滤性能测试 - 回放大量群聊消息，对比原来的@检查与 MessagePrefilter 处理每条消息的耗时
+
+用法:
+    python benchmarks/bench_prefilter.py [--messages 200000] [--at-ratio 0.03] [--log group_log.jsonl]
+
+--log 指定的 JSON Lines 文件每行是一条群消息:
+    {"group_id": "123", "self_id": "10000", "text": "...", "at": ["20000"], "images": 1}
+不指定时生成合成的群聊消息。日志级别为 INFO，与线上一致（DEBUG 日志不输出）。
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fake_astrbot import CHARSET, FakeMessageObject, install_stubs  # noqa: E402
+
+
+def legacy_filter(logger, message_obj, message_str):
+    """原实现：先输出调试信息，再逐个组件按类名判断是否@了机器人"""
+    logger.debug(
+        "收到消息: 类型=%s, 机器人ID=%s, 会话ID=%s, 消息ID=%s, 群组ID=%s, 发送者=%s, 内容=%s, 组件=%s",
+        message_obj.type, message_obj.self_id, message_obj.session_id, message_obj.message_id,
+        message_obj.group_id, message_obj.sender, message_str, message_obj.message,
+    )
+    if not message_obj.group_id:
+        return True
+    for i, msg_component in enumerate(message_obj.message):
+        component_type = msg_component.__class__.__name__
+        logger.debug("消息组件[%d]: 类型=%s, 内容=%s", i, component_type, msg_component)
+        if component_type == "At":
+            try:
+                at_qq = getattr(msg_component, "qq", None)
+                logger.debug("发现At组件，目标QQ: %s, 机器人QQ: %s", at_qq, message_obj.self_id)
+                if str(at_qq) == str(message_obj.self_id):
+                    logger.debug("确认@了机器人自己")
+                    return True
+            except Exception as e:
+                logger.warning("处理At组件时出错: %s", e)
+    logger.debug("群消息未@机器人，忽略处理: %s", message_str)
+    return False
+
+
+def make_components(record, index, components):
+    """把一条日志记录转换为消息对象及消息文本"""
+    Plain, Image, At = components
+    text = record.get("text", "")
+    message = [At(qq=qq) for qq in record.get("at", [])]
+    message.append(Plain(text=text))
+    message.extend(Image(f"https://example.com/{index}_{i}.jpg") for i in range(record.get("images", 0)))
+    self_id = record.get("self_id", "10000")
+    group_id = str(record.get("group_id", "900000"))
+    message_obj = FakeMessageObject(
+        "GroupMessage", self_id, group_id, str(index), group_id, str(record.get("sender", index % 500)), message,
+    )
+    return message_obj, text
+
+
+def synthetic_records(rng, count, groups, at_ratio, other_at_ratio, image_ratio, self_id):
+    """生成合成的群聊记录：少量@机器人，部分@其他成员或带图片"""
+    for _ in range(count):
+        record = {
+            "group_id": str(900000 + rng.randrange(groups)),
+            "self_id": self_id,
+            "text": "".join(rng.choice(CHARSET) for _ in range(rng.randint(2, 40))),
+        }
+        at = []
+        if rng.random() < other_at_ratio:
+            at.append(str(200000 + rng.randrange(500)))
+        if rng.random() < at_ratio:
+            at.append(self_id)
+        record["at"] = at
+        if rng.random() < image_ratio:
+            record["images"] = 1
+        yield record
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def measure(func, messages, rounds):
+    """返回处理每条消息的平均耗时（纳秒），取多轮中最快的一轮"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for message_obj, text in messages:
+            func(message_obj, text)
+        elapsed = (time.perf_counter_ns() - start) / len(messages)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息预过滤性能测试")
+    parser.add_argument("--messages", type=int, default=200000, help="合成群消息的数量")
+    parser.add_argument("--groups", type=int, default=50, help="合成消息的群数量")
+    parser.add_argument("--at-ratio", type=float, default=0.03, help="@机器人的消息比例")
+    parser.add_argument("--other-at-ratio", type=float, default=0.1, help="@其他成员的消息比例")
+    parser.add_argument("--image-ratio", type=float, default=0.15, help="带图片的消息比例")
+    parser.add_argument("--keyword-groups", type=int, default=0, help="开启免@关键词回复的群数量")
+    parser.add_argument("--log", help="回放的群聊日志（JSON Lines）")
+    parser.add_argument("--rounds", type=int, default=3, help="重复测量的轮数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    install_stubs()
+    from astrbot.api.message_components import At, Image, Plain
+    from my_qq_bot.prefilter import MessagePrefilter, DENIED, SKIP
+
+    logger = logging.getLogger("bench.prefilter")
+    logger.setLevel(logging.INFO)
+
+    rng = random.Random(args.seed)
+    self_id = "10000"
+    records = load_records(args.log) if args.log else synthetic_records(
+        rng, args.messages, args.groups, args.at_ratio, args.other_at_ratio, args.image_ratio, self_id,
+    )
+    messages = [make_components(record, index, (Plain, Image, At)) for index, record in enumerate(records)]
+    if not messages:
+        parser.error("没有可回放的消息")
+
+    prefilter = MessagePrefilter(keyword_groups=[str(900000 + i) for i in range(args.keyword_groups)])
+
+    # 两种实现对"是否@了机器人"的判断必须一致
+    for message_obj, text in messages:
+        assert legacy_filter(logger, message_obj, text) == prefilter.is_at_me(message_obj)
+
+    legacy_ns = measure(lambda message_obj, text: legacy_filter(logger, message_obj, text), messages, args.rounds)
+    prefilter_ns = measure(lambda message_obj, text: prefilter.check(message_obj), messages, args.rounds)
+    skipped = sum(1 for message_obj, _ in messages if prefilter.check(message_obj) in (SKIP, DENIED))
+
+    print(f"消息 {len(messages)} 条，预过滤丢弃 {skipped / len(messages):.1%}")
+    print(f"{'implementation':<16} {'ns/msg':>10} {'msgs/s':>14}")
+    for name, value in (("legacy", legacy_ns), ("prefilter", prefilter_ns)):
+        print(f"{name:<16} {value:>10.0f} {1e9 / value:>14,.0f}")
+    print(f"speedup {legacy_ns / prefilter_ns:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+插件启动性能测试 - 使用大规模的合成配置，对比 YAML 解析器、配置快照和模块延迟初始化对加载时间的影响
+
+每种启动方式在独立的子进程中运行，包含导入插件代码的时间:
+    import: 导入 main.py（含功能模块的依赖）
+    init: MyQQBotPlugin.__init__ 返回，即 AstrBot 加载插件所等待的时间
+    ready: 定时任务调度器和关键词回复模块启动完成
+    keyword: 第一次使用关键词回复
+
+用法:
+    python benchmarks/bench_startup.py [--triggers 20000] [--schedules 2000] [--repeat 5] [--json results.json]
+
+未安装 AstrBot 时自动使用 fake_astrbot 中的替身模块；测试在临时目录中进行，不会修改 data/ 下的文件。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# 启动方式: 名称 -> (startup.lazy_modules, startup.config_snapshot)
+MODES = {
+    "eager": (False, False),
+    "eager+snapshot": (False, True),
+    "lazy+snapshot": (True, True),
+}
+
+STAGES = ("import", "init", "ready", "keyword")
+
+# 用于生成随机关键词的常用汉字
+CHARSET = "的一是在不了有和人这中大为上个我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说种面而方后多定行学法所得经"
+
+
+def random_word(rng, min_len=2, max_len=5):
+    return "".join(rng.choice(CHARSET) for _ in range(rng.randint(min_len, max_len)))
+
+
+def build_triggers(rng, count):
+    """生成触发器，大部分为包含匹配，少量为精确、前缀和正则匹配"""
+    triggers = []
+    for index in range(count):
+        keyword = f"{random_word(rng)}{index}"
+        trigger = {
+            "keyword": keyword,
+            "answers": [{"text": f"{keyword}的回复{i}"} for i in range(rng.randint(1, 3))],
+        }
+        roll = rng.random()
+        if roll < 0.05:
+            trigger["mode"] = "exact"
+        elif roll < 0.08:
+            trigger["mode"] = "prefix"
+        elif roll < 0.10:
+            trigger.update(mode="regex", keyword=f"^{keyword}\\d+")
+        if rng.random() < 0.1:
+            trigger["priority"] = rng.randint(1, 10)
+        triggers.append(trigger)
+    return triggers
+
+
+def build_schedules(rng, count, groups=20):
+    """生成定时任务，每条任务有自己的 cron 表达式，部分任务发送给目标分组"""
+    target_groups = {f"分组{i}": [f"aiocqhttp:GroupMessage:{900000 + i * 10 + j}" for j in range(5)]
+                     for i in range(groups)}
+    schedules = []
+    for index in range(count):
+        task = {"send": [{"text": f"定时消息{index}"}]}
+        if rng.random() < 0.5:
+            task["target_groups"] = [rng.choice(list(target_groups))]
+        else:
+            task["target"] = f"aiocqhttp:GroupMessage:{800000 + index}"
+        schedules.append({
+            "schedule": f"{rng.randrange(60)} {rng.randrange(24)} * * {rng.choice(['*', '1-5', '0,6'])}",
+            "tasks": [task],
+        })
+    return {"target_groups": target_groups, "schedules": schedules}
+
+
+def prepare_source_dir(args):
+    """在临时目录中准备插件的 data/ 目录，以仓库中的 config.yaml 为基础关闭与测试无关的后台功能"""
+    import yaml
+    from my_qq_bot.config import load_plugin_config
+
+    rng = random.Random(args.seed)
+    source_dir = tempfile.mkdtemp(prefix="my-qq-bot-startup-")
+    data_dir = os.path.join(source_dir, "data")
+    os.makedirs(data_dir)
+
+    config = load_plugin_config(ROOT)
+    config.setdefault("hot_reload", {})["enabled"] = False
+    config.setdefault("metrics", {})["flush_interval"] = 0
+    config.setdefault("classify_cache", {})["persist"] = False
+    config.setdefault("remote_images", {})["enabled"] = False
+    doudou = config.setdefault("doudou_image", {})
+    doudou["root_dir"] = os.path.join(source_dir, "pictures")
+    doudou["cache"] = dict(doudou.get("cache") or {}, enabled=False)
+    os.makedirs(doudou["root_dir"])
+    with open(os.path.join(data_dir, "config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+    with open(os.path.join(data_dir, "keyreply.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump({"triggers": build_triggers(rng, args.triggers)}, f, allow_unicode=True)
+    with open(os.path.join(data_dir, "scheduled.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(build_schedules(rng, args.schedules), f, allow_unicode=True)
+    return source_dir
+
+
+def set_startup_config(source_dir, mode):
+    import yaml
+
+    config_path = os.path.join(source_dir, "data", "config.yaml")
+    with open(config_path, encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    lazy_modules, config_snapshot = MODES[mode]
+    config["startup"] = {"lazy_modules": lazy_modules, "config_snapshot": config_snapshot}
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+
+def measure_parsers(source_dir):
+    """对比纯 Python 的 SafeLoader 与 libyaml 的 CSafeLoader 解析两个大配置文件的耗时（毫秒）"""
+    import yaml
+
+    loaders = {"SafeLoader": yaml.SafeLoader}
+    if hasattr(yaml, "CSafeLoader"):
+        loaders["CSafeLoader"] = yaml.CSafeLoader
+    results = {}
+    for name in ("keyreply.yaml", "scheduled.yaml"):
+        with open(os.path.join(source_dir, "data", name), encoding="utf-8") as f:
+            text = f.read()
+        for loader_name, loader in loaders.items():
+            start = time.perf_counter()
+            yaml.load(text, Loader=loader)
+            results[f"{name} {loader_name}"] = (time.perf_counter() - start) * 1e3
+    return results
+
+
+async def child_startup(source_dir):
+    """在子进程中加载一次插件，返回各阶段距进程开始测量时的耗时（毫秒）"""
+    start = time.perf_counter()
+    from fake_astrbot import FakeContext, FakeConversationManager, FakeProvider, install_stubs
+
+    install_stubs()
+    import main
+
+    timings = {"import": time.perf_counter() - start}
+    main.source_dir = source_dir
+    context = FakeContext(FakeProvider(), FakeConversationManager())
+
+    plugin = main.MyQQBotPlugin(context)
+    timings["init"] = time.perf_counter() - start
+    try:
+        # 延迟初始化时定时任务和关键词回复模块由事件循环在插件加载完成后启动
+        while plugin.scheduled_start is not None or plugin.keyword_start is not None:
+            await asyncio.sleep(0)
+        timings["ready"] = time.perf_counter() - start
+        plugin.keyword_module.matcher.match("测试消息")
+        timings["keyword"] = time.perf_counter() - start
+        snapshots = plugin.snapshots.stats()
+    finally:
+        await plugin.terminate()
+    return {"ms": {stage: value * 1e3 for stage, value in timings.items()}, "snapshots": snapshots}
+
+
+def run_child(source_dir, mode):
+    set_startup_config(source_dir, mode)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", source_dir],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="插件启动性能测试")
+    parser.add_argument("--triggers", type=int, default=20000, help="关键词回复的触发器数量")
+    parser.add_argument("--schedules", type=int, default=2000, help="定时任务数量")
+    parser.add_argument("--repeat", type=int, default=5, help="每种启动方式重复的次数，取中位数")
+    parser.add_argument("--modes", default=",".join(MODES), help="启动方式，逗号分隔")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child_startup(args.child))))
+        return
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"未知的启动方式: {', '.join(sorted(unknown))}")
+
+    source_dir = prepare_source_dir(args)
+    try:
+        sizes = {name: os.path.getsize(os.path.join(source_dir, "data", name)) / 1024
+                 for name in ("keyreply.yaml", "scheduled.yaml")}
+        print(f"触发器 {args.triggers} 个 ({sizes['keyreply.yaml']:.0f} KB), "
+              f"定时任务 {args.schedules} 个 ({sizes['scheduled.yaml']:.0f} KB)")
+
+        parsers = measure_parsers(source_dir)
+        print("\nYAML 解析耗时:")
+        for name, value in parsers.items():
+            print(f"  {name:<28} {value:>9.1f} ms")
+
+        results = {}
+        print(f"\n{'mode':<16}" + "".join(f"{stage + ' ms':>12}" for stage in STAGES) + f"{'snapshot':>14}")
+        for mode in modes:
+            # 使用快照的方式先运行一次生成快照（即配置修改后的第一次加载），之后每次都命中快照
+            shutil.rmtree(os.path.join(source_dir, "data", "snapshots"), ignore_errors=True)
+            first = run_child(source_dir, mode) if MODES[mode][1] else None
+            runs = [run_child(source_dir, mode) for _ in range(args.repeat)]
+            median = {stage: statistics.median(run["ms"][stage] for run in runs) for stage in STAGES}
+            snapshots = runs[-1]["snapshots"]
+            results[mode] = {"median_ms": median, "first_run_ms": first and first["ms"], "snapshots": snapshots}
+            print(f"{mode:<16}" + "".join(f"{median[stage]:>12.1f}" for stage in STAGES)
+                  + f"{snapshots['hits']:>7} hit/{snapshots['misses']} miss")
+            if first:
+                print(f"{'  (生成快照)':<14}" + "".join(f"{first['ms'][stage]:>12.1f}" for stage in STAGES))
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+
+    if args.json:
+        output = {"args": {key: value for key, value in vars(args).items() if key not in ("json", "child")},
+                  "yaml_parse_ms": parsers, "results": results}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+远程图片缓存自检 - 用本地的 http.server 替身服务器验证条件请求重新验证、并发请求合并和 LRU 淘汰
+
+用法:
+    python benchmarks/check_remote_image_cache.py
+
+不需要网络和 AstrBot（未安装时使用 fake_astrbot 中的替身模块），缓存写入临时目录。
+任何一项检查失败时以非零状态退出。
+"""
+
+import asyncio
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fake_astrbot import install_stubs  # noqa: E402
+
+# 替身服务器上的图片: 路径 -> 内容，/same1 和 /same2 内容相同
+IMAGES = {
+    "/a.png": b"a" * 4096,
+    "/b.png": b"b" * 4096,
+    "/c.png": b"c" * 4096,
+    "/same1.png": b"s" * 4096,
+    "/same2.png": b"s" * 4096,
+}
+
+
+class ImageServer(http.server.ThreadingHTTPServer):
+    """按路径返回固定内容的图片，支持 ETag 条件请求，并记录每个路径的请求次数"""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.2):
+        super().__init__(("127.0.0.1", 0), ImageHandler)
+        self.delay = delay
+        self.requests = {}
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class ImageHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] = server.requests.get(self.path, 0) + 1
+        # 放慢响应，让并发请求在下载完成前到达
+        time.sleep(server.delay)
+        data = IMAGES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        etag = f'"{self.path}-v1"'
+        if self.headers.get("If-None-Match") == etag:
+            with server.lock:
+                server.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def check(condition, message):
+    print(f"{'通过' if condition else '失败'}: {message}")
+    return bool(condition)
+
+
+async def run_checks(server, cache_dir):
+    from my_qq_bot.remote_image_cache import RemoteImageCache
+
+    base = server.base_url
+    results = []
+    # 缓存上限可以放下 2 张图片，放入第 3 张时淘汰最久未使用的一张
+    cache = RemoteImageCache(cache_dir, max_size_mb=9000 / 1024 / 1024, max_age=60)
+    try:
+        # 并发请求合并：同一 URL 同时请求 5 次只下载一次
+        paths = await asyncio.gather(*(cache.fetch(f"{base}/a.png") for _ in range(5)))
+        results.append(check(server.requests.get("/a.png") == 1, "同一 URL 的 5 个并发请求只下载 1 次"))
+        results.append(check(len(set(paths)) == 1 and os.path.exists(paths[0]), "并发请求得到同一个本地文件"))
+
+        # 条件请求：过期后重新验证，服务器返回 304 时保留原文件
+        cache.entries[f"{base}/a.png"]["checked_at"] = 0
+        path = await cache.fetch(f"{base}/a.png")
+        results.append(check(server.not_modified == 1 and cache.revalidated == 1, "过期的缓存收到 304 后只重新验证"))
+        results.append(check(path == paths[0] and os.path.exists(path), "重新验证后仍使用原来的文件"))
+
+        # 内容相同的两个 URL 同时下载，共用同一个文件，不留下临时文件
+        same = await asyncio.gather(cache.fetch(f"{base}/same1.png"), cache.fetch(f"{base}/same2.png"))
+        results.append(check(same[0] == same[1] and os.path.exists(same[0]), "内容相同的 URL 共用同一个文件"))
+        leftovers = [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+        results.append(check(not leftovers, "并发写入后没有遗留的临时文件"))
+
+        # LRU 淘汰：先访问 a，使 same 成为最久未使用，再下载 b 和 c
+        cache.get_local(f"{base}/a.png")
+        await cache.fetch(f"{base}/b.png")
+        await cache.fetch(f"{base}/c.png")
+        results.append(check(cache.total_size() <= cache.max_bytes, "缓存总大小不超过上限"))
+        results.append(check(f"{base}/same1.png" not in cache.entries, "最久未使用的 URL 被淘汰"))
+        results.append(check(f"{base}/c.png" in cache.entries, "最近下载的 URL 保留在缓存中"))
+        files = {entry["file"] for entry in cache.entries.values()}
+        on_disk = {name for name in os.listdir(cache_dir) if name != "index.json"}
+        results.append(check(on_disk == files, "被淘汰的文件已从磁盘删除"))
+
+        # 后台预取：未命中时返回 None，预取任务完成后命中
+        before = server.requests.get("/same1.png", 0)
+        results.append(check(cache.get_local(f"{base}/same1.png") is None, "未缓存的 URL 不等待网络，直接返回 None"))
+        await asyncio.sleep(0)
+        results.append(check(len(cache.prefetch_tasks) == 1, "后台预取任务保留了引用"))
+        await asyncio.gather(*cache.prefetch_tasks)
+        results.append(check(server.requests.get("/same1.png", 0) == before + 1, "后台预取完成了下载"))
+        results.append(check(cache.get_local(f"{base}/same1.png") is not None, "预取完成后命中缓存"))
+    finally:
+        await cache.close()
+    return all(results)
+
+
+def main():
+    install_stubs()
+    server = ImageServer()
+    threading.Thread(target=server.serve_forever, name="image-server", daemon=True).start()
+    cache_dir = tempfile.mkdtemp(prefix="my-qq-bot-remote-images-")
+    try:
+        ok = asyncio.run(run_checks(server, cache_dir))
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    if not ok:
+        raise SystemExit(1)
+    print("全部检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+AstrBot 替身 - 在没有 AstrBot 运行环境时驱动插件代码，用于性能测试
+
+提供:
+    install_stubs(): 未安装 AstrBot 时注册一组最小的 astrbot.api 替身模块
+    FakeProvider: 可配置延迟分布和错误率的 LLM 提供商
+    FakeConversationManager: 内存中的会话管理器
+    FakeContext: 插件上下文
+    FakeEvent / EventGenerator: 消息事件及按比例生成的合成流量
+"""
+
+import asyncio
+import importlib
+import json
+import logging
+import math
+import random
+import sys
+import types
+
+
+def install_stubs():
+    """
+    AstrBot 不可导入时，注册插件用到的 astrbot.api 替身模块
+
+    返回:
+        bool: 是否安装了替身（已安装 AstrBot 时返回 False，直接使用真实模块）
+    """
+    try:
+        importlib.import_module("astrbot.api")
+        return False
+    except ImportError:
+        pass
+
+    def decorator(*args, **kwargs):
+        return lambda func: func
+
+    class MessageChain:
+        def __init__(self, chain=None):
+            self.chain = list(chain or [])
+
+    class Plain:
+        def __init__(self, text, **kwargs):
+            self.text = text
+
+    class Image:
+        def __init__(self, file, **kwargs):
+            self.file = file
+
+        @classmethod
+        def fromURL(cls, url, **kwargs):
+            return cls(url)
+
+        @classmethod
+        def fromFileSystem(cls, path, **kwargs):
+            return cls(f"file:///{path}")
+
+        @classmethod
+        def fromLocal(cls, path, **kwargs):
+            return cls(f"file:///{path}")
+
+    class At:
+        def __init__(self, qq, **kwargs):
+            self.qq = qq
+
+    class EventMessageType:
+        ALL = "all"
+
+    class PermissionType:
+        ADMIN = "admin"
+        MEMBER = "member"
+
+    class Star:
+        def __init__(self, context):
+            self.context = context
+
+    placeholders = {name: type(name, (), {}) for name in ("AstrMessageEvent", "MessageEventResult", "Context")}
+    modules = {
+        "astrbot": {},
+        "astrbot.api": {"logger": logging.getLogger("astrbot"), "llm_tool": decorator},
+        "astrbot.api.event": {
+            "AstrMessageEvent": placeholders["AstrMessageEvent"],
+            "MessageEventResult": placeholders["MessageEventResult"],
+            "MessageChain": MessageChain,
+        },
+        "astrbot.api.event.filter": {
+            "command": decorator,
+            "permission_type": decorator,
+            "on_llm_response": decorator,
+            "PermissionType": PermissionType,
+            "event_message_type": decorator,
+            "EventMessageType": EventMessageType,
+        },
+        "astrbot.api.all": {"event_message_type": decorator, "EventMessageType": EventMessageType, "command": decorator},
+        "astrbot.api.star": {"Context": placeholders["Context"], "Star": Star, "register": decorator},
+        "astrbot.api.message_components": {"Plain": Plain, "Image": Image, "At": At},
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        module.__path__ = []  # 作为包注册，允许导入子模块
+        sys.modules[name] = module
+    for name in modules:
+        if "." in name:
+            parent, child = name.rsplit(".", 1)
+            setattr(sys.modules[parent], child, sys.modules[name])
+    return True
+
+
+class ProviderError(Exception):
+    """模拟的提供商错误（超时、限流等）"""
+
+
+class FakeLLMResponse:
+    def __init__(self, completion_text, role="assistant", is_chunk=False):
+        self.role = role
+        self.completion_text = completion_text
+        self.is_chunk = is_chunk
+
+
+# 按关键词模拟分类结果
+CLASSIFY_RULES = (
+    ("豆豆", "豆豆照片请求"),
+    ("小豆", "小豆照片请求"),
+    ("早", "早安"),
+    ("午", "午安"),
+    ("晚安", "晚安"),
+)
+
+
+class FakeProvider:
+    """LLM 提供商替身，延迟服从对数正态分布，可按比例抛出错误"""
+
+    def __init__(self, latency_ms=300.0, sigma=0.5, error_rate=0.0, reply_length=60, seed=0,
+                 first_token_ratio=0.2, stream_piece=4):
+        """
+        参数:
+            latency_ms: 延迟的中位数（毫秒）
+            sigma: 对数正态分布的形状参数，越大长尾越明显，0 表示固定延迟
+            error_rate: 请求失败的比例
+            reply_length: 自由回复的字数
+            seed: 随机种子
+            first_token_ratio: 流式输出时第一段文字到达的时间占总延迟的比例
+            stream_piece: 流式输出时每段的字数
+        """
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.reply_length = reply_length
+        self.first_token_ratio = first_token_ratio
+        self.stream_piece = max(1, stream_piece)
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def sample_latency(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.latency_ms / 1000
+        return self.rng.lognormvariate(math.log(self.latency_ms), self.sigma) / 1000
+
+    def classify(self, prompt):
+        for keyword, label in CLASSIFY_RULES:
+            if keyword in prompt:
+                return label
+        return "其他"
+
+    def make_reply(self, prompt):
+        sentences = [f"收到{prompt[:10]}。"]
+        while sum(map(len, sentences)) < self.reply_length:
+            sentences.append(f"这是回复的第{len(sentences)}句话，内容稍微长一些。")
+        return "".join(sentences)[: self.reply_length]
+
+    async def _respond(self, prompt, system_prompt):
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency())
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise ProviderError("模拟的提供商错误")
+        if system_prompt and '"分类"' in system_prompt:
+            label = self.classify(prompt)
+            result = {"分类": label, "理由": "模拟"}
+            if '"回复"' in system_prompt:
+                result["回复"] = self.make_reply(prompt) if label == "其他" else ""
+            return json.dumps(result, ensure_ascii=False)
+        return self.make_reply(prompt)
+
+    async def text_chat(self, prompt="", session_id=None, image_urls=None, func_tool=None, contexts=None,
+                        system_prompt=None, **kwargs):
+        return FakeLLMResponse(await self._respond(prompt, system_prompt))
+
+    async def text_chat_stream(self, prompt="", session_id=None, image_urls=None, func_tool=None, contexts=None,
+                               system_prompt=None, **kwargs):
+        """与 AstrBot 的流式接口一致：先逐段产出 is_chunk 的增量文本，最后产出一次完整结果"""
+        self.calls += 1
+        latency = self.sample_latency()
+        await asyncio.sleep(latency * self.first_token_ratio)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise ProviderError("模拟的提供商错误")
+        text = self.make_reply(prompt)
+        pieces = [text[i:i + self.stream_piece] for i in range(0, len(text), self.stream_piece)]
+        interval = latency * (1 - self.first_token_ratio) / max(1, len(pieces) - 1)
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(interval)
+            yield FakeLLMResponse(piece, is_chunk=True)
+        yield FakeLLMResponse(text)
+
+
+class FakeConversation:
+    def __init__(self, cid, history="[]"):
+        self.cid = cid
+        self.history = history
+
+
+class FakeConversationManager:
+    """内存中的会话管理器，可以预先填充指定轮数的历史"""
+
+    def __init__(self, history_turns=0, latency_ms=1.0):
+        self.history_turns = history_turns
+        self.latency = latency_ms / 1000
+        self.current = {}  # 会话 -> 当前对话 ID
+        self.conversations = {}  # (会话, 对话 ID) -> FakeConversation
+
+    def seed_history(self):
+        history = []
+        for i in range(self.history_turns):
+            history.append({"role": "user", "content": f"之前的第{i}个问题，" + "内容" * 20})
+            history.append({"role": "assistant", "content": f"之前的第{i}个回答，" + "内容" * 40})
+        return json.dumps(history)
+
+    async def new_conversation(self, unified_msg_origin):
+        cid = f"cid-{len(self.conversations)}"
+        self.conversations[(unified_msg_origin, cid)] = FakeConversation(cid, self.seed_history())
+        self.current[unified_msg_origin] = cid
+        return cid
+
+    async def get_curr_conversation_id(self, unified_msg_origin):
+        await asyncio.sleep(self.latency)
+        if unified_msg_origin not in self.current:
+            await self.new_conversation(unified_msg_origin)
+        return self.current[unified_msg_origin]
+
+    async def get_conversation(self, unified_msg_origin, conversation_id):
+        await asyncio.sleep(self.latency)
+        return self.conversations.get((unified_msg_origin, conversation_id))
+
+    async def update_conversation(self, unified_msg_origin, conversation_id, history=None):
+        await asyncio.sleep(self.latency)
+        conversation = self.conversations.get((unified_msg_origin, conversation_id))
+        if conversation and history is not None:
+            conversation.history = json.dumps(history)
+
+
+class FakeContext:
+    """插件上下文替身"""
+
+    def __init__(self, provider, conversation_manager, send_latency_ms=20.0, send_error_rate=0.0, seed=0):
+        self.provider = provider
+        self.conversation_manager = conversation_manager
+        self.send_latency = send_latency_ms / 1000
+        self.send_error_rate = send_error_rate
+        self.rng = random.Random(seed)
+        self.sent = 0
+
+    def get_using_provider(self):
+        return self.provider
+
+    def get_llm_tool_manager(self):
+        return None
+
+    async def send_message(self, session, chain):
+        await asyncio.sleep(self.send_latency)
+        if self.send_error_rate and self.rng.random() < self.send_error_rate:
+            raise ProviderError("模拟的发送失败")
+        self.sent += 1
+        return True
+
+
+class FakeMessageObject:
+    def __init__(self, message_type, self_id, session_id, message_id, group_id, sender, message):
+        self.type = message_type
+        self.self_id = self_id
+        self.session_id = session_id
+        self.message_id = message_id
+        self.group_id = group_id
+        self.sender = sender
+        self.message = message
+
+
+class FakeLLMRequest:
+    """event.request_llm 的返回值，由测试驱动模拟 AstrBot 流水线中的 LLM 请求"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+class FakeEvent:
+    """消息事件替身，实现插件用到的 AstrMessageEvent 接口"""
+
+    def __init__(self, message_str, unified_msg_origin, sender_id, group_id=None, at_bot=False,
+                 self_id="10000", message_id="0", image_urls=None):
+        from astrbot.api.message_components import At, Plain
+
+        components = [At(qq=self_id)] if at_bot else []
+        components.append(Plain(text=message_str))
+        self.message_str = message_str
+        self.unified_msg_origin = unified_msg_origin
+        self.sender_id = sender_id
+        self.image_urls = image_urls or []
+        self.extras = {}
+        self.call_llm = False
+        self.stopped = False
+        self.message_obj = FakeMessageObject(
+            "GroupMessage" if group_id else "FriendMessage", self_id, group_id or sender_id, message_id,
+            group_id, sender_id, components,
+        )
+
+    def get_sender_id(self):
+        return self.sender_id
+
+    def set_extra(self, key, value):
+        self.extras[key] = value
+
+    def get_extra(self, key):
+        return self.extras.get(key)
+
+    def should_call_llm(self, call_llm):
+        self.call_llm = call_llm
+
+    def stop_event(self):
+        self.stopped = True
+
+    def is_stopped(self):
+        return self.stopped
+
+    def get_image_urls(self):
+        return self.image_urls
+
+    def plain_result(self, text):
+        return ("plain", text)
+
+    def chain_result(self, chain):
+        return ("chain", chain)
+
+    def request_llm(self, **kwargs):
+        return FakeLLMRequest(**kwargs)
+
+
+# 合成消息中的固定短语，大部分可以被本地分类器识别
+CANNED_MESSAGES = ["早安", "早上好", "午安", "晚安", "给我看看豆豆", "小豆的照片", "来张豆豆", "晚安啦"]
+
+# 生成随机消息的常用汉字
+CHARSET = "的一是在不了有和人这中大为上个我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说种面而方后多定行学法所得经"
+
+
+class EventGenerator:
+    """按比例生成群聊/私聊、是否@机器人、长度各不相同的合成消息"""
+
+    def __init__(self, group_ratio=0.7, at_ratio=0.8, canned_ratio=0.3, mean_length=20, length_sigma=0.8,
+                 groups=20, users=200, keywords=(), keyword_ratio=0.0, self_id="10000", seed=0):
+        """
+        参数:
+            group_ratio: 群聊消息的比例
+            at_ratio: 群聊消息中@机器人的比例
+            canned_ratio: 固定短语（问候、要照片）的比例
+            mean_length: 随机消息长度的中位数，长度服从对数正态分布
+            length_sigma: 长度分布的形状参数
+            groups / users: 群和用户的数量
+            keywords: 可嵌入消息中的关键词
+            keyword_ratio: 嵌入关键词的比例
+        """
+        self.group_ratio = group_ratio
+        self.at_ratio = at_ratio
+        self.canned_ratio = canned_ratio
+        self.mean_length = mean_length
+        self.length_sigma = length_sigma
+        self.groups = groups
+        self.users = users
+        self.keywords = list(keywords)
+        self.keyword_ratio = keyword_ratio
+        self.self_id = self_id
+        self.rng = random.Random(seed)
+        self.count = 0
+
+    def message_text(self):
+        rng = self.rng
+        if rng.random() < self.canned_ratio:
+            return rng.choice(CANNED_MESSAGES)
+        length = max(1, int(rng.lognormvariate(math.log(self.mean_length), self.length_sigma)))
+        text = "".join(rng.choice(CHARSET) for _ in range(length))
+        if self.keywords and rng.random() < self.keyword_ratio:
+            position = rng.randint(0, len(text))
+            text = text[:position] + rng.choice(self.keywords) + text[position:]
+        return text
+
+    def next_event(self):
+        rng = self.rng
+        self.count += 1
+        sender_id = str(100000 + rng.randrange(self.users))
+        if rng.random() < self.group_ratio:
+            group_id = str(900000 + rng.randrange(self.groups))
+            umo = f"fake:GroupMessage:{group_id}"
+            at_bot = rng.random() < self.at_ratio
+        else:
+            group_id = None
+            umo = f"fake:FriendMessage:{sender_id}"
+            at_bot = False
+        return FakeEvent(self.message_text(), umo, sender_id, group_id, at_bot, self.self_id, str(self.count))
@@ -1,12 +1,16 @@
+import asyncio
 import os
 import random
 import sys
 import json
+import time
+from contextlib import asynccontextmanager
 
 # 导入AstrBot框架相关API
-from astrbot.api import llm_tool  # 导入大语言模型工具
+from astrbot.api import llm_tool, logger  # 导入大语言模型工具和日志记录器
 from astrbot.api.event import AstrMessageEvent  # 导入消息事件相关类
 from astrbot.api.all import event_message_type, EventMessageType  # 导入事件类型和过滤器
+from astrbot.api.event.filter import command, permission_type, PermissionType, on_llm_response  # 导入指令、权限过滤器和LLM响应钩子
 from astrbot.api.star import Context, Star, register  # 导入插件注册和上下文管理相关类
 
 # 获取当前脚本所在目录的绝对路径
@@ -15,7 +19,102 @@ source_dir = os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, source_dir)
 
 # 导入自定义功能模块
-from my_qq_bot import DoudouImageModule, KeywordReplyModule, ScheduledTaskModule
+from my_qq_bot.config import load_plugin_config, get_section
+from my_qq_bot.config_snapshot import ConfigSnapshot
+from my_qq_bot.intent_classifier import IntentClassifier, INTENT_LABELS
+from my_qq_bot.classify_cache import ClassificationCache
+from my_qq_bot.config_watcher import FileWatcher
+from my_qq_bot.remote_image_cache import create_remote_image_cache
+from my_qq_bot.metrics import MetricsRegistry
+from my_qq_bot.history import HistoryCache, DEFAULT_HISTORY_CONFIG
+from my_qq_bot.streaming import SentenceChunker, stream_completion, DEFAULT_STREAMING_CONFIG
+from my_qq_bot.prefilter import MessagePrefilter, DEFAULT_PREFILTER_CONFIG, SKIP, KEYWORD_ONLY, DENIED
+from my_qq_bot.session_dispatcher import SessionDispatcher, DEFAULT_DISPATCHER_CONFIG, MERGED, REJECTED, DROPPED
+from my_qq_bot.admission import (
+    AdmissionController, Overloaded, DEFAULT_ADMISSION_CONFIG, KIND_CLASSIFY, KIND_REPLY, request_priority,
+)
+
+# 本地意图分类器的默认配置
+DEFAULT_CLASSIFIER_CONFIG = {
+    "enabled": True,  # 是否启用本地快速分类
+    "threshold": 0.75,  # 置信度阈值，低于该值时交给 LLM 判断
+    "max_length": 20,  # 超过该长度（归一化后）的消息直接交给 LLM
+    "stats_interval": 100,  # 每处理多少条消息输出一次分类统计
+}
+
+# LLM分类结果缓存的默认配置
+DEFAULT_CLASSIFY_CACHE_CONFIG = {
+    "max_size": 2048,  # 最多缓存的条目数，超出后按LRU淘汰
+    "ttl": 86400,  # 每条缓存的有效期（秒）
+    "persist": True,  # 是否持久化到 data/ 目录，重启后继续使用
+    "save_interval": 50,  # 每新增多少条缓存写一次磁盘
+}
+
+# 配置热更新的默认配置
+DEFAULT_HOT_RELOAD_CONFIG = {
+    "enabled": True,  # 是否监视 data/ 下的配置文件并自动重新加载
+    "use_inotify": True,  # Linux 下优先使用 inotify，否则轮询文件修改时间
+    "poll_interval": 2.0,  # 轮询检查的间隔（秒）
+    "debounce": 0.5,  # 文件变化后等待多久再重新加载（秒）
+}
+
+# 处理耗时统计的默认配置
+DEFAULT_METRICS_CONFIG = {
+    "max_samples": 2048,  # 每个阶段保留最近多少个样本计算分位数
+    "flush_interval": 60,  # 每隔多少秒把统计写入 data/metrics.json，0 表示不写文件
+}
+
+# 插件加载速度的默认配置
+DEFAULT_STARTUP_CONFIG = {
+    "lazy_modules": True,  # 功能模块在第一次使用时才初始化，定时任务模块在插件加载完成后初始化
+    "config_snapshot": True,  # 把编译好的配置保存到 data/snapshots/，文件未变化时直接加载
+}
+
+# 消息处理流水线的默认配置
+DEFAULT_PIPELINE_CONFIG = {
+    # sequential: 先分类，需要自由回复时再获取会话历史
+    # concurrent: 分类的同时获取会话历史
+    # single_call: 一次LLM调用同时返回分类和自由回复
+    "mode": "sequential",
+}
+
+PIPELINE_MODES = ("sequential", "concurrent", "single_call")
+
+# 管理员查看处理耗时统计的指令
+STATS_COMMAND = "botstats"
+
+# 事件附加数据的键：由 AstrBot 请求LLM的自由回复完成后需要写回的会话历史
+PENDING_HISTORY_EXTRA = "my_qq_bot_pending_history"
+
+
+# 指导LLM如何分类用户消息的系统提示
+CLASSIFY_SYSTEM_PROMPT = """
+你是一个消息分类助手，需要判断用户消息是否符合以下预定义类型之一：
+1. "豆豆照片请求" - 用户想看豆豆(一只猫)的照片
+2. "小豆照片请求" - 用户想看小豆(一只猫)的照片
+3. "早安" - 消息是早晨打招呼
+4. "午安" - 消息是中午打招呼
+5. "晚安" - 消息是晚上打招呼
+6. "其他" - 不符合以上任何类型
+
+必须严格按照以下JSON格式返回，不要添加其他内容：
+{"分类":"类型名称","理由":"简短理由"}
+"""
+
+# single_call 模式下同时完成分类和回复的系统提示
+CLASSIFY_AND_REPLY_SYSTEM_PROMPT = """
+你是一个QQ聊天机器人。请先判断用户消息是否符合以下预定义类型之一：
+1. "豆豆照片请求" - 用户想看豆豆(一只猫)的照片
+2. "小豆照片请求" - 用户想看小豆(一只猫)的照片
+3. "早安" - 消息是早晨打招呼
+4. "午安" - 消息是中午打招呼
+5. "晚安" - 消息是晚上打招呼
+6. "其他" - 不符合以上任何类型
+
+如果类型是"其他"，请结合之前的对话像平常聊天一样回复用户，把回复内容写在"回复"中；其他类型的"回复"留空。
+必须严格按照以下JSON格式返回，不要添加其他内容：
+{"分类":"类型名称","理由":"简短理由","回复":"回复内容"}
+"""
 
 
 # 使用register装饰器注册插件，提供插件ID、作者、描述和版本信息
@@ -33,15 +132,246 @@ class MyQQBotPlugin(Star):
             context: 插件上下文对象，提供与AstrBot框架交互的接口
         """
         super().__init__(context)  # 调用父类初始化方法
+        started_at = time.perf_counter()
+
+        # 加载插件运行参数配置
+        self.config = load_plugin_config(source_dir)
+        self.startup_config = get_section(self.config, "startup", DEFAULT_STARTUP_CONFIG)
+
+        # 配置快照 - 关键词回复和定时任务配置编译后保存为快照，配置文件未变化时跳过解析和编译
+        self.snapshots = ConfigSnapshot(
+            os.path.join(source_dir, "data", "snapshots") if self.startup_config["config_snapshot"] else None
+        )
+
+        # 初始化处理耗时统计 - 记录每个处理阶段的耗时分布和各分类结果的数量
+        self.metrics_config = get_section(self.config, "metrics", DEFAULT_METRICS_CONFIG)
+        self.metrics = MetricsRegistry(max_samples=self.metrics_config["max_samples"])
+        self.metrics_path = os.path.join(source_dir, "data", "metrics.json")
+
+        # 初始化消息预过滤 - 群聊中未@机器人的消息在最前面直接丢弃，不记录日志
+        prefilter_config = get_section(self.config, "prefilter", DEFAULT_PREFILTER_CONFIG)
+        self.prefilter = MessagePrefilter(
+            allow_groups=prefilter_config["allow_groups"],
+            deny_groups=prefilter_config["deny_groups"],
+            keyword_groups=prefilter_config["keyword_groups"],
+        )
+
+        # 初始化本地意图分类器 - 在调用 LLM 之前快速识别明确的消息类型
+        self.classifier_config = get_section(self.config, "classifier", DEFAULT_CLASSIFIER_CONFIG)
+        self.classifier = IntentClassifier(
+            threshold=self.classifier_config["threshold"],
+            max_length=self.classifier_config["max_length"],
+        )
+
+        # 初始化LLM分类结果缓存 - 重复出现的短消息直接复用之前的分类结果
+        cache_config = get_section(self.config, "classify_cache", DEFAULT_CLASSIFY_CACHE_CONFIG)
+        self.classify_cache = ClassificationCache(
+            max_size=cache_config["max_size"],
+            ttl=cache_config["ttl"],
+            path=os.path.join(source_dir, "data", "classify_cache.json") if cache_config["persist"] else None,
+            save_interval=cache_config["save_interval"],
+        )
 
-        # 初始化豆豆照片模块 - 用于处理与猫咪照片相关的请求
-        self.doudou_module = DoudouImageModule(context)
+        # 消息处理流水线模式 - 分类与获取会话历史的方式，可以对比各模式的耗时统计
+        self.pipeline_config = get_section(self.config, "pipeline", DEFAULT_PIPELINE_CONFIG)
+        if self.pipeline_config["mode"] not in PIPELINE_MODES:
+            logger.error(f"未知的流水线模式: {self.pipeline_config['mode']}，使用 sequential")
+            self.pipeline_config["mode"] = "sequential"
 
-        # 初始化关键词回复模块 - 用于处理特定关键词的自动回复
-        self.keyword_module = KeywordReplyModule(context, source_dir)
+        # 流式回复 - 自由回复边生成边按句子分条发送，缩短用户看到第一条回复的时间
+        self.streaming_config = get_section(self.config, "streaming", DEFAULT_STREAMING_CONFIG)
 
-        # 初始化定时任务模块 - 用于处理定时执行的任务
-        self.scheduled_module = ScheduledTaskModule(context, source_dir)
+        # 初始化会话调度器 - 合并同一会话连续发送的消息片段，并按顺序回复
+        self.dispatcher_config = get_section(self.config, "dispatcher", DEFAULT_DISPATCHER_CONFIG)
+        self.dispatcher = None
+        if self.dispatcher_config["enabled"]:
+            self.dispatcher = SessionDispatcher(
+                debounce=self.dispatcher_config["debounce"],
+                max_fragments=self.dispatcher_config["max_fragments"],
+                max_queue=self.dispatcher_config["max_queue"],
+                shed_policy=self.dispatcher_config["shed_policy"],
+            )
+
+        # 初始化准入控制 - 限制同时进行的LLM请求数，过载时快速回复而不是让所有请求一起变慢
+        self.admission_config = get_section(self.config, "admission", DEFAULT_ADMISSION_CONFIG)
+        self.admission = None
+        if self.admission_config["enabled"]:
+            self.admission = AdmissionController(
+                max_concurrency=self.admission_config["max_concurrency"],
+                max_queue=self.admission_config["max_queue"],
+                max_wait=self.admission_config["max_wait"],
+                user_rate=self.admission_config["user_rate"],
+                user_burst=self.admission_config["user_burst"],
+                group_rate=self.admission_config["group_rate"],
+                group_burst=self.admission_config["group_burst"],
+                max_buckets=self.admission_config["max_buckets"],
+            )
+
+        # 初始化会话历史缓存 - 只在需要LLM自由回复时解析历史，并只保留最近的若干轮对话
+        history_config = get_section(self.config, "history", DEFAULT_HISTORY_CONFIG)
+        self.history_cache = HistoryCache(
+            max_turns=history_config["max_turns"],
+            max_tokens=history_config["max_tokens"],
+            max_sessions=history_config["max_sessions"],
+        )
+
+        # 初始化配置文件监视器 - 配置文件修改后自动重新加载，无需重载插件
+        hot_reload_config = get_section(self.config, "hot_reload", DEFAULT_HOT_RELOAD_CONFIG)
+        self.watcher = None
+        if hot_reload_config["enabled"]:
+            self.watcher = FileWatcher(
+                poll_interval=hot_reload_config["poll_interval"],
+                debounce=hot_reload_config["debounce"],
+                use_inotify=hot_reload_config["use_inotify"],
+            )
+
+        # 初始化远程图片缓存 - 关键词回复和定时任务中的网络图片提前下载到本地
+        self.remote_images = create_remote_image_cache(source_dir, self.config.get("remote_images"))
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = asyncio.get_event_loop()
+
+        # 功能模块通过同名属性访问，第一次访问时才导入并初始化
+        self._doudou_module = None
+        self._keyword_module = None
+        self._scheduled_module = None
+        self.scheduled_start = None
+        self.keyword_start = None
+        self.doudou_start = None
+        if self.startup_config["lazy_modules"]:
+            # 定时任务需要按时触发，不能等到第一次使用，在插件加载完成后由事件循环初始化
+            self.scheduled_start = loop.call_soon(self.start_scheduled_module)
+            # 关键词回复中的网络图片需要在第一条关键词消息之前预取，同样在插件加载完成后初始化
+            self.keyword_start = loop.call_soon(self.start_keyword_module)
+            # 图片索引和压缩缓存在插件加载完成后于后台线程中初始化，避免第一次请求照片时等待扫描图片库
+            self.doudou_start = loop.create_task(self.start_doudou_module())
+        else:
+            self.init_modules()
+
+        # 启动监视线程，之后初始化的模块注册的监视路径同样生效
+        if self.watcher:
+            self.watcher.start()
+
+        # 定期把耗时统计写入本地文件
+        self.metrics_task = None
+        if self.metrics_config["flush_interval"]:
+            self.metrics_task = loop.create_task(self.flush_metrics_periodically())
+
+        self.metrics.observe("startup", time.perf_counter() - started_at)
+
+    @property
+    def doudou_module(self):
+        """豆豆照片模块 - 用于处理与猫咪照片相关的请求"""
+        if self._doudou_module is None:
+            from my_qq_bot import DoudouImageModule
+
+            with self.metrics.timer("startup.doudou_module"):
+                self._doudou_module = DoudouImageModule(
+                    self.context, source_dir, self.config.get("doudou_image"), self.watcher
+                )
+        return self._doudou_module
+
+    @property
+    def keyword_module(self):
+        """关键词回复模块 - 用于处理特定关键词的自动回复"""
+        if self._keyword_module is None:
+            from my_qq_bot import KeywordReplyModule
+
+            if self.keyword_start:
+                self.keyword_start.cancel()
+                self.keyword_start = None
+            with self.metrics.timer("startup.keyword_module"):
+                self._keyword_module = KeywordReplyModule(
+                    self.context, source_dir, self.watcher, self.remote_images, self.snapshots
+                )
+        return self._keyword_module
+
+    @property
+    def scheduled_module(self):
+        """定时任务模块 - 用于处理定时执行的任务"""
+        if self._scheduled_module is None:
+            from my_qq_bot import ScheduledTaskModule
+
+            if self.scheduled_start:
+                self.scheduled_start.cancel()
+                self.scheduled_start = None
+            with self.metrics.timer("startup.scheduled_module"):
+                self._scheduled_module = ScheduledTaskModule(
+                    self.context, source_dir, self.config.get("scheduler"), self.watcher, self.remote_images,
+                    self.snapshots,
+                )
+        return self._scheduled_module
+
+    def init_modules(self):
+        """立即初始化所有功能模块"""
+        return self.doudou_module, self.keyword_module, self.scheduled_module
+
+    def start_scheduled_module(self):
+        """插件加载完成后初始化定时任务模块并启动调度器"""
+        self.scheduled_start = None
+        try:
+            module = self.scheduled_module
+        except Exception as e:
+            logger.error(f"初始化定时任务模块失败: {e}")
+            return
+        logger.info(f"定时任务模块已启动，共 {len(module.jobs)} 个任务")
+
+    def start_keyword_module(self):
+        """插件加载完成后初始化关键词回复模块，开始预取回复中的网络图片"""
+        self.keyword_start = None
+        try:
+            module = self.keyword_module
+        except Exception as e:
+            logger.error(f"初始化关键词回复模块失败: {e}")
+            return
+        logger.info(f"关键词回复模块已启动，共 {len(module.triggers)} 个触发器")
+
+    async def start_doudou_module(self):
+        """插件加载完成后在线程中初始化豆豆照片模块，开始构建图片索引"""
+        from my_qq_bot import DoudouImageModule
+
+        try:
+            with self.metrics.timer("startup.doudou_module"):
+                module = await asyncio.to_thread(
+                    DoudouImageModule, self.context, source_dir, self.config.get("doudou_image"), self.watcher
+                )
+        except Exception as e:
+            logger.error(f"初始化豆豆照片模块失败: {e}")
+            return
+        finally:
+            self.doudou_start = None
+        self._doudou_module = module
+        logger.info("豆豆照片模块已启动")
+
+    async def get_doudou_module(self):
+        """返回豆豆照片模块，后台初始化尚未完成时等待其完成"""
+        if self.doudou_start is not None:
+            await asyncio.shield(self.doudou_start)
+        return self.doudou_module
+
+    async def terminate(self):
+        """插件被禁用或重载时调用，停止后台线程并保存需要持久化的数据"""
+        if self.metrics_task:
+            self.metrics_task.cancel()
+            self.flush_metrics()
+        if self.watcher:
+            self.watcher.stop()
+        if self.scheduled_start:
+            self.scheduled_start.cancel()
+        if self.keyword_start:
+            self.keyword_start.cancel()
+        if self.doudou_start:
+            # 初始化在线程中进行，无法中途取消，等待完成后再关闭
+            await asyncio.shield(self.doudou_start)
+        if self._scheduled_module:
+            self._scheduled_module.shutdown()
+        if self._doudou_module:
+            self._doudou_module.shutdown()
+        if self.remote_images:
+            await self.remote_images.close()
+        self.classify_cache.save()
 
     def is_at_me(self, message_obj):
         """
@@ -53,23 +383,389 @@ class MyQQBotPlugin(Star):
         返回:
             bool: 如果消息@了机器人则返回True，否则返回False
         """
-        for i, msg_component in enumerate(message_obj.message):
-            # 打印每个消息组件的详细信息，帮助调试
-            component_type = msg_component.__class__.__name__
-            print(f"消息组件[{i}]: 类型={component_type}, 内容={msg_component}")
+        return self.prefilter.is_at_me(message_obj)
+
+    def log_classifier_stats(self):
+        """按配置的间隔输出本地分类与LLM分类的统计信息"""
+        stats = self.classifier.stats()
+        interval = self.classifier_config["stats_interval"]
+        total = stats["local_hits"] + stats["not_local"]
+        if interval and total % interval == 0:
+            # 未能本地分类的消息中，命中分类缓存的不会调用LLM，实际的LLM分类次数以 classify.llm 计数为准
+            counters = self.metrics.counters
+            logger.info(
+                f"本地分类统计: 本地命中 {stats['local_hits']}, 未能本地分类 {stats['not_local']} "
+                f"(分类缓存命中 {counters['classify.cache']}, 调用LLM {counters['classify.llm']}), "
+                f"本地命中率 {stats['local_ratio']:.1%}, 各类型命中 {stats['label_hits']}"
+            )
+            logger.info(f"分类缓存统计: {self.classify_cache.stats()}")
+
+    def flush_metrics(self):
+        """把耗时统计写入 data/metrics.json"""
+        try:
+            self.metrics.dump(self.metrics_path)
+        except OSError as e:
+            logger.error(f"保存耗时统计失败: {e}")
+
+    async def flush_metrics_periodically(self):
+        """按配置的间隔定期写出耗时统计，插件卸载时取消"""
+        while True:
+            await asyncio.sleep(self.metrics_config["flush_interval"])
+            self.flush_metrics()
+
+    # 管理员指令：查看各处理阶段的耗时分布和分类统计
+    @command(STATS_COMMAND)
+    @permission_type(PermissionType.ADMIN)
+    async def show_stats(self, event: AstrMessageEvent):
+        """查看消息处理各阶段的耗时统计（仅管理员）"""
+        yield event.plain_result(f"{self.metrics.format_report()}\n预过滤: {self.prefilter.stats()}")
+
+    async def load_conversation(self, unified_msg_origin: str):
+        """
+        获取当前会话及裁剪后的历史记录
+        
+        参数:
+            unified_msg_origin: 会话标识
             
-            # 检查消息组件是否为At类型，且@的是机器人自己
-            if component_type == "At":
-                try:
-                    at_qq = getattr(msg_component, "qq", None)
-                    print(f"发现At组件，目标QQ: {at_qq}, 机器人QQ: {message_obj.self_id}")
-                    if str(at_qq) == str(message_obj.self_id):
-                        print("确认@了机器人自己")
-                        return True
-                except Exception as e:
-                    print(f"处理At组件时出错: {e}")
+        返回:
+            (curr_cid, conversation, context): 当前会话ID、会话对象和历史上下文
+        """
+        conversation_manager = self.context.conversation_manager
+        curr_cid = await conversation_manager.get_curr_conversation_id(unified_msg_origin)
+        if not curr_cid:
+            return None, None, []
+        conversation = await conversation_manager.get_conversation(unified_msg_origin, curr_cid)
+        if not conversation or not conversation.history:
+            return curr_cid, conversation, []
+        # 只解析新追加的历史，并按轮数和 token 上限裁剪
+        context = self.history_cache.load(unified_msg_origin, curr_cid, conversation.history)
+        return curr_cid, conversation, context
+
+    async def classify_with_llm(self, message_str: str, image_urls: list):
+        """
+        调用LLM判断消息类型
+        
+        参数:
+            message_str: 用户消息文本
+            image_urls: 消息中的图片URL列表
+            
+        返回:
+            (message_type, reason): 分类结果及理由，LLM响应无效时分类结果为None
+        """
+        # 调用LLM服务进行消息类型判断
+        # 这里使用text_chat方法向LLM发送请求，不保存会话历史(session_id=None)
+        with self.metrics.timer("classify_llm"):
+            llm_response = await self.context.get_using_provider().text_chat(
+                prompt=message_str,  # 用户消息作为提示
+                session_id=None,  # 不使用持久会话ID，这是一次性分类请求
+                contexts=[{"role": "system", "content": CLASSIFY_SYSTEM_PROMPT}],  # 设置系统提示作为上下文
+                image_urls=image_urls,  # 如果消息包含图片，传递图片URL
+                func_tool=None,  # 不使用函数工具
+                system_prompt=CLASSIFY_SYSTEM_PROMPT  # 设置系统提示
+            )
+        logger.debug("LLM分类响应: %s", llm_response)  # 完整的LLM响应，用于调试
+        
+        # 检查LLM判断结果是否有效，确认响应来自助手角色
+        if llm_response.role != "assistant":
+            return None, ""
+        
+        # 获取LLM回复的文本内容
+        response_text = llm_response.completion_text or ""
+        
+        # 输出LLM判断结果供调试
+        logger.debug("LLM判断结果: %s", response_text)
+        
+        # 从解析结果中获取分类和理由，如果不存在则使用默认值
+        result = self.parse_llm_result(response_text)
+        message_type = result.get("分类", "其他")  # 默认分类为"其他"
+        reason = result.get("理由", "")  # 分类理由
         
-        return False
+        # 输出最终分类结果，用于调试
+        logger.debug("分类结果: %s, 理由: %s", message_type, reason)
+        return message_type, reason
+
+    def parse_llm_result(self, response_text: str):
+        """
+        解析LLM返回的JSON格式分类结果
+        
+        参数:
+            response_text: LLM回复的文本
+            
+        返回:
+            dict: 解析出的JSON对象；无法解析时返回按文本推断的分类，或空字典
+        """
+        with self.metrics.timer("json_parse"):
+            try:
+                # 提取JSON部分（如果回复中混合了其他内容）
+                json_start = response_text.find("{")  # 查找JSON开始位置
+                json_end = response_text.rfind("}") + 1  # 查找JSON结束位置
+                if json_start >= 0 and json_end > json_start:
+                    # 提取JSON文本并解析
+                    result = json.loads(response_text[json_start:json_end])
+                    if isinstance(result, dict):
+                        return result
+            except json.JSONDecodeError:
+                # 如果JSON解析失败，尝试直接从文本中提取分类信息
+                # 这是一个后备方案，防止LLM没有严格按照JSON格式返回
+                if "豆豆照片请求" in response_text:
+                    return {"分类": "豆豆照片请求"}
+                elif "小豆照片请求" in response_text:
+                    return {"分类": "小豆照片请求"}
+        return {}
+
+    @asynccontextmanager
+    async def llm_permit(self, event: AstrMessageEvent, kind: int, check_rate: bool = False):
+        """
+        取得一次LLM请求的准入许可，未启用准入控制时直接放行
+        
+        参数:
+            event: 消息事件对象
+            kind: 请求类型，KIND_CLASSIFY / KIND_REPLY
+            check_rate: 是否按用户和群限流，每条消息只在第一次调用LLM前检查一次
+            
+        异常:
+            Overloaded: 发送过于频繁、排队已满或等待超时
+        """
+        if not self.admission:
+            yield
+            return
+        if check_rate:
+            self.admission.check_rate(event.get_sender_id(), event.message_obj.group_id)
+        priority = request_priority(kind, bool(event.message_obj.group_id))
+        async with self.admission.admit(priority) as permit:
+            self.metrics.observe("admission_wait", permit.wait)
+            yield
+
+    @staticmethod
+    def suppress_default_llm(event: AstrMessageEvent, stop: bool = False):
+        """
+        阻止 AstrBot 为这条消息发起默认的 LLM 请求（插件已经处理或有意不回复的消息）
+        
+        参数:
+            event: 消息事件对象
+            stop: 是否同时终止事件传播，只能在没有产出任何回复时使用，否则回复不会被发送
+        """
+        # should_call_llm(True) 表示禁止默认的 LLM 请求
+        event.should_call_llm(True)
+        if stop:
+            event.stop_event()
+
+    def busy_result(self, event: AstrMessageEvent, error: Overloaded):
+        """
+        记录被准入控制拒绝的请求，返回快速回复（未配置回复时返回None）
+
+        被拒绝的消息不能再由 AstrBot 默认的 LLM 请求回复，否则准入控制形同虚设；
+        没有快速回复时同时终止事件传播。
+        """
+        self.metrics.inc(f"admission.rejected.{error.reason}")
+        logger.info(f"LLM请求被准入控制拒绝({error.reason}): {event.unified_msg_origin}")
+        busy_reply = self.admission_config["busy_reply"]
+        self.suppress_default_llm(event, stop=not busy_reply)
+        return event.plain_result(busy_reply) if busy_reply else None
+
+    async def classify_message(self, event: AstrMessageEvent, message_str: str, image_urls: list):
+        """
+        判断消息类型，优先使用分类缓存
+        
+        返回:
+            (message_type, reason, from_llm): 分类结果、理由及是否调用了LLM，LLM响应无效时分类结果为None
+        """
+        # 相同的短消息无需重复调用LLM（带图片的消息不缓存）
+        cached = self.classify_cache.get(message_str) if not image_urls else None
+        if cached:
+            self.metrics.inc("classify.cache")
+            logger.debug("分类缓存命中: %s, 理由: %s", *cached)
+            return cached[0], cached[1], False
+        # 分类是这条消息的第一次LLM调用，先按用户和群限流
+        async with self.llm_permit(event, KIND_CLASSIFY, check_rate=True):
+            message_type, reason = await self.classify_with_llm(message_str, image_urls)
+        self.metrics.inc("classify.llm")
+        if message_type and not image_urls:
+            self.classify_cache.put(message_str, message_type, reason)
+        return message_type, reason, True
+
+    async def classify_and_reply(self, message_str: str, image_urls: list, context: list):
+        """
+        一次LLM调用同时完成分类和自由回复（single_call 模式）
+        
+        参数:
+            message_str: 用户消息文本
+            image_urls: 消息中的图片URL列表
+            context: 会话历史上下文
+            
+        返回:
+            (message_type, reason, reply): 分类结果、理由及分类为"其他"时的回复，LLM响应无效时分类结果为None
+        """
+        with self.metrics.timer("classify_llm"):
+            llm_response = await self.context.get_using_provider().text_chat(
+                prompt=message_str,
+                session_id=None,  # 会话历史由插件自己写回
+                contexts=context,
+                image_urls=image_urls,
+                func_tool=None,
+                system_prompt=CLASSIFY_AND_REPLY_SYSTEM_PROMPT
+            )
+        if llm_response.role != "assistant":
+            return None, "", ""
+
+        response_text = llm_response.completion_text or ""
+        logger.debug("LLM分类及回复结果: %s", response_text)
+        result = self.parse_llm_result(response_text)
+        message_type = result.get("分类", "其他")
+        reply = result.get("回复", "") if message_type == "其他" else ""
+        return message_type, result.get("理由", ""), str(reply or "")
+
+    async def stream_reply(self, message_str: str, image_urls: list, context: list, parts: list, permit):
+        """
+        以流式方式生成自由回复，在句子或段落结束处切分，按配置的间隔逐条产出
+        
+        参数:
+            message_str: 用户消息文本
+            image_urls: 消息中的图片URL列表
+            context: 会话历史上下文
+            parts: 收集LLM输出的原始文本，拼接起来就是完整的回复
+            permit: 准入许可（llm_permit 返回的上下文管理器），只在读取 LLM 输出期间持有，
+                输出读完即释放，之后按间隔逐条发送不再占用并发名额
+            
+        返回:
+            异步生成器，产生每条消息的文本
+            
+        异常:
+            Overloaded: 没有取得准入许可
+        """
+        config = self.streaming_config
+        chunker = SentenceChunker(config["min_chars"], config["max_chars"])
+        max_messages = max(1, config["max_messages"])
+        started = time.perf_counter()
+        last_sent = None
+        held = ""  # 还没有发送的文本，达到消息条数上限后全部合并到最后一条
+
+        async def wait_interval():
+            # 与上一条消息保持配置的间隔，第一条消息立即发送
+            if last_sent is None:
+                self.metrics.observe("stream.first_chunk", time.perf_counter() - started)
+                return
+            delay = last_sent + config["interval"] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        # 在单独的任务中读取 LLM 输出，与按间隔发送消息互不阻塞
+        queue = asyncio.Queue()
+
+        async def read_deltas():
+            try:
+                async with permit:
+                    deltas = stream_completion(
+                        self.context.get_using_provider(),
+                        prompt=message_str,
+                        session_id=None,  # 会话历史由插件自己写回
+                        contexts=context,
+                        image_urls=image_urls,
+                        func_tool=None,
+                        system_prompt="",
+                    )
+                    async for delta in deltas:
+                        parts.append(delta)
+                        queue.put_nowait(delta)
+            except Exception as e:
+                # 异常交给产出消息的一方抛出
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(None)
+
+        reader = asyncio.create_task(read_deltas())
+        sent = 0
+        try:
+            while True:
+                delta = await queue.get()
+                if delta is None:
+                    break
+                if isinstance(delta, Exception):
+                    raise delta
+                for chunk in chunker.feed(delta):
+                    held += chunk
+                    if sent + 1 >= max_messages or not held.strip():
+                        continue
+                    await wait_interval()
+                    yield held.strip()
+                    held = ""
+                    sent += 1
+                    last_sent = time.perf_counter()
+
+            held += chunker.flush()
+            if held.strip():
+                await wait_interval()
+                yield held.strip()
+                sent += 1
+        finally:
+            # 消息没有发送完就被中止时，停止读取 LLM 输出并释放准入许可
+            reader.cancel()
+        self.metrics.inc("stream.messages", sent)
+
+    async def save_reply_to_history(self, unified_msg_origin: str, conversation_info: tuple, message_str: str, reply: str):
+        """把插件自己请求LLM得到的一问一答（single_call 模式、流式回复、自由回复）追加到会话历史中"""
+        curr_cid, conversation, _ = conversation_info
+        conversation_manager = self.context.conversation_manager
+        if not curr_cid:
+            curr_cid = await conversation_manager.new_conversation(unified_msg_origin)
+        # 写回完整历史（不是裁剪后的上下文），在缓存中已解析的历史后面追加，这一步在回复发出之后执行，不影响回复延迟
+        history = self.history_cache.append(
+            unified_msg_origin, curr_cid, conversation.history if conversation else "",
+            [{"role": "user", "content": message_str}, {"role": "assistant", "content": reply}],
+        )
+        await conversation_manager.update_conversation(unified_msg_origin, curr_cid, history=history)
+
+    @on_llm_response()
+    async def save_llm_reply(self, event: AstrMessageEvent, response):
+        """由 AstrBot 请求LLM的自由回复完成后，把一问一答写回会话历史"""
+        pending = event.get_extra(PENDING_HISTORY_EXTRA)
+        reply = (getattr(response, "completion_text", None) or "").strip()
+        # 其他插件或 AstrBot 自己发起的请求没有记录；调用工具的中间响应没有文本，等待最终回复
+        if not pending or not reply:
+            return
+        event.set_extra(PENDING_HISTORY_EXTRA, None)
+        try:
+            await self.save_reply_to_history(*pending, reply)
+        except Exception as e:
+            logger.error(f"保存会话历史失败: {e}")
+
+    async def timed_load_conversation(self, unified_msg_origin: str):
+        """获取会话及历史记录，并记录耗时"""
+        with self.metrics.timer("conversation_lookup"):
+            return await self.load_conversation(unified_msg_origin)
+
+    async def handle_intent(self, event: AstrMessageEvent, message_type: str):
+        """
+        根据分类结果调用相应的处理模块
+        
+        参数:
+            event: 消息事件对象
+            message_type: 分类结果，必须是预定义类型之一
+            
+        返回:
+            异步生成器，产生消息处理结果
+        """
+        if message_type == "豆豆照片请求":
+            # 使用通用的get_image方法处理豆豆照片请求，传递"豆豆"类别
+            doudou_module = await self.get_doudou_module()
+            async for result in doudou_module.get_image(event, "豆豆"):
+                yield result
+
+        elif message_type == "小豆照片请求":
+            # 使用通用的get_image方法处理小豆照片请求，传递"小豆"类别
+            doudou_module = await self.get_doudou_module()
+            async for result in doudou_module.get_image(event, "小豆"):
+                yield result
+
+        elif message_type == "早安":
+            # 根据具体问候类型向用户发送相应反馈
+            yield event.plain_result(random.choice(["早安~", "早上好~"]))
+
+        elif message_type == "午安":
+            yield event.plain_result(random.choice(["午安~", "中午好~"]))
+
+        elif message_type == "晚安":
+            yield event.plain_result(random.choice(["晚安~", "晚上好~"]))
 
     # 使用装饰器注册消息处理函数，处理所有类型的消息事件
     @event_message_type(EventMessageType.ALL)
@@ -86,144 +782,233 @@ class MyQQBotPlugin(Star):
         返回:
             异步生成器，产生消息处理结果
         """
+        # 获取消息对象
+        message_obj = event.message_obj
+
+        # 预过滤：群消息没有@机器人（且所在群没有开启免@关键词回复）时直接返回
+        started_at = time.perf_counter()
+        route = self.prefilter.check(message_obj)
+        if route == SKIP:
+            return
+        if route == DENIED:
+            # 黑白名单排除的群中@了机器人，AstrBot 仍会唤醒默认的 LLM 请求，必须终止事件
+            self.suppress_default_llm(event, stop=True)
+            return
+        if message_obj.group_id:
+            # 丢弃的消息不记录耗时，保持热路径上没有额外开销
+            self.metrics.observe("at_check", time.perf_counter() - started_at)
+
         # 获取用户发送的原始消息文本
         message_str = event.message_str
 
-        # 获取消息对象
-        message_obj = event.message_obj
-        
-        # 调试信息：打印消息结构
-        print(f"消息类型: {message_obj.type}")
-        print(f"机器人ID: {message_obj.self_id}")
-        print(f"会话ID: {message_obj.session_id}")
-        print(f"消息ID: {message_obj.message_id}")
-        print(f"群组ID: {message_obj.group_id}")
-        print(f"发送者: {message_obj.sender}")
-        print(f"消息内容: {message_str}")
-        print(f"消息组件列表: {message_obj.message}")
+        # 调试信息：输出消息结构（仅在 DEBUG 级别下格式化）
+        logger.debug(
+            "收到消息: 类型=%s, 机器人ID=%s, 会话ID=%s, 消息ID=%s, 群组ID=%s, 发送者=%s, 内容=%s, 组件=%s",
+            message_obj.type, message_obj.self_id, message_obj.session_id, message_obj.message_id,
+            message_obj.group_id, message_obj.sender, message_str, message_obj.message,
+        )
+
+        if route == KEYWORD_ONLY:
+            # 没有@机器人的群消息只做关键词回复
+            async for result in self.keyword_module.handle_keyword_reply(event):
+                yield result
+            return
+
+        # 管理员统计指令由 show_stats 处理
+        if message_str.strip() == STATS_COMMAND:
+            return
+
+        image_urls = event.get_image_urls() if hasattr(event, "get_image_urls") else []
+        if not self.dispatcher:
+            async for result in self.process_message(event, message_str, image_urls):
+                yield result
+            return
+
+        # 同一会话连续发送的消息片段合并后处理，并保证按顺序回复
+        ticket = await self.dispatcher.submit(event.unified_msg_origin, message_str, image_urls)
+        # 合并、拒绝或丢弃的消息片段不能再由 AstrBot 默认的 LLM 请求单独回复
+        if ticket.status == MERGED:
+            logger.debug("消息已合并到同一会话的后续消息中: %s", message_str)
+            self.suppress_default_llm(event, stop=True)
+            return
+        if ticket.status == REJECTED:
+            self.metrics.inc("dispatcher.rejected")
+            logger.info(f"会话 {event.unified_msg_origin} 排队的消息过多，拒绝处理: {message_str[:50]}")
+            busy_reply = self.dispatcher_config["busy_reply"]
+            self.suppress_default_llm(event, stop=not busy_reply)
+            if busy_reply:
+                yield event.plain_result(busy_reply)
+            return
+        if ticket.status == DROPPED:
+            self.metrics.inc("dispatcher.dropped")
+            logger.info(f"会话 {event.unified_msg_origin} 排队的消息过多，丢弃较早的消息: {message_str[:50]}")
+            self.suppress_default_llm(event, stop=True)
+            return
+
+        self.metrics.observe("session_queue_wait", ticket.wait)
+        if ticket.fragments > 1:
+            self.metrics.inc("dispatcher.merged", ticket.fragments - 1)
+        try:
+            async for result in self.process_message(event, ticket.text, ticket.image_urls):
+                yield result
+        finally:
+            self.dispatcher.done(ticket)
+
+    async def process_message(self, event: AstrMessageEvent, message_str: str, image_urls: list):
+        """
+        分类并回复一条（或合并后的一批）消息
         
-        if message_obj.group_id:
-            # 检查群消息是否@了机器人
-            is_at_me = self.is_at_me(message_obj)
+        参数:
+            event: 消息事件对象
+            message_str: 消息文本，合并多条消息时为合并后的文本
+            image_urls: 消息中的图片URL列表
             
-            # 如果是群消息且没有@机器人，则不处理该消息
-            if not is_at_me:
-                print(f"群消息未@机器人，忽略处理: {message_str}")
-                return
-        
-        # 获取LLM工具管理器，用于后续可能的LLM工具调用
-        func_tools_mgr = self.context.get_llm_tool_manager()
-        
-        # 获取当前会话ID及上下文历史记录，用于维持对话连贯性
-        curr_cid = await self.context.conversation_manager.get_curr_conversation_id(event.unified_msg_origin)
-        conversation = None  # 会话对象
-        context = []  # 会话历史上下文
-        if curr_cid:
-            # 如果存在当前会话ID，获取会话对象
-            conversation = await self.context.conversation_manager.get_conversation(event.unified_msg_origin, curr_cid)
-            # 从会话对象中解析历史记录，如果不存在则使用空列表
-            context = json.loads(conversation.history) if conversation and conversation.history else []
-        
-        # 构建系统提示，指导LLM如何分类用户消息
-        system_prompt = """
-        你是一个消息分类助手，需要判断用户消息是否符合以下预定义类型之一：
-        1. "豆豆照片请求" - 用户想看豆豆(一只猫)的照片
-        2. "小豆照片请求" - 用户想看小豆(一只猫)的照片
-        3. "早安" - 消息是早晨打招呼
-        4. "午安" - 消息是中午打招呼
-        5. "晚安" - 消息是晚上打招呼
-        6. "其他" - 不符合以上任何类型
-        
-        必须严格按照以下JSON格式返回，不要添加其他内容：
-        {"分类":"类型名称","理由":"简短理由"}
+        返回:
+            异步生成器，产生消息处理结果
         """
-        
-        # 调用LLM服务进行消息类型判断
-        # 这里使用text_chat方法向LLM发送请求，不保存会话历史(session_id=None)
-        llm_response = await self.context.get_using_provider().text_chat(
-            prompt=message_str,  # 用户消息作为提示
-            session_id=None,  # 不使用持久会话ID，这是一次性分类请求
-            contexts=[{"role": "system", "content": system_prompt}],  # 设置系统提示作为上下文
-            image_urls=event.get_image_urls() if hasattr(event, "get_image_urls") else [],  # 如果消息包含图片，传递图片URL
-            func_tool=None,  # 不使用函数工具
-            system_prompt=system_prompt  # 设置系统提示
-        )
-        print(llm_response)  # 打印完整的LLM响应，用于调试
-        
-        # 初始化消息类型判断结果变量
-        message_type = "其他"  # 默认分类为"其他"
-        reason = ""  # 分类理由
-        
-        # 检查LLM判断结果是否有效
-        if llm_response.role == "assistant":  # 确认响应来自助手角色
-            try:
-                # 获取LLM回复的文本内容
-                response_text = llm_response.completion_text
-                
-                # 输出LLM判断结果供调试
-                print(f"LLM判断结果: {response_text}")
-                
-                # 尝试解析JSON格式的分类结果
-                try:
-                    # 提取JSON部分（如果回复中混合了其他内容）
-                    json_start = response_text.find("{")  # 查找JSON开始位置
-                    json_end = response_text.rfind("}") + 1  # 查找JSON结束位置
-                    if json_start >= 0 and json_end > json_start:
-                        # 提取JSON文本并解析
-                        json_text = response_text[json_start:json_end]
-                        result = json.loads(json_text)
-                        # 从解析结果中获取分类和理由，如果不存在则使用默认值
-                        message_type = result.get("分类", "其他")
-                        reason = result.get("理由", "")
-                except json.JSONDecodeError:
-                    # 如果JSON解析失败，尝试直接从文本中提取分类信息
-                    # 这是一个后备方案，防止LLM没有严格按照JSON格式返回
-                    if "豆豆照片请求" in response_text:
-                        message_type = "豆豆照片请求"
-                    elif "小豆照片请求" in response_text:
-                        message_type = "小豆照片请求"
-                
-                # 输出最终分类结果，用于调试
-                print(f"分类结果: {message_type}, 理由: {reason}")
-                
-                # 根据分类结果调用相应的处理模块
-                if message_type == "豆豆照片请求":
-                    # 使用通用的get_image方法处理豆豆照片请求，传递"豆豆"类别
-                    async for result in self.doudou_module.get_image(event, "豆豆"):
+        # 本地快速分类：能够确定类型的消息直接处理，无需调用LLM
+        if self.classifier_config["enabled"]:
+            local_type = self.classifier.classify(message_str, has_image=bool(image_urls))
+            self.log_classifier_stats()
+            if local_type:
+                logger.debug("本地分类结果: %s", local_type)
+                self.metrics.inc("classify.local")
+                self.metrics.inc(f"label.{local_type}")
+                with self.metrics.timer("dispatch"):
+                    async for result in self.handle_intent(event, local_type):
                         yield result
-                    return  # 处理完成后返回，不执行后续代码
-                
-                elif message_type == "小豆照片请求":
-                    # 使用通用的get_image方法处理小豆照片请求，传递"小豆"类别
-                    async for result in self.doudou_module.get_image(event, "小豆"):
+                return
+
+        # 按配置的流水线模式完成分类，并记录从分类开始到回复完成的耗时
+        mode = self.pipeline_config["mode"]
+        umo = event.unified_msg_origin
+        started = time.perf_counter()
+        conversation_info = None  # (当前会话ID, 会话对象, 历史上下文)
+        conversation_task = None
+        reply = ""
+        # 准入控制按用户和群限流，只在这条消息第一次调用LLM之前检查；命中分类缓存的消息不消耗令牌
+        rate_checked = False
+        classified = False
+
+        try:
+            if mode == "single_call":
+                # 一次LLM调用同时返回分类和自由回复，省去一次完整的请求往返
+                cached = self.classify_cache.get(message_str) if not image_urls else None
+                if cached:
+                    message_type, reason = cached
+                    self.metrics.inc("classify.cache")
+                else:
+                    conversation_info = await self.timed_load_conversation(umo)
+                    rate_checked = True
+                    async with self.llm_permit(event, KIND_REPLY, check_rate=True):
+                        message_type, reason, reply = await self.classify_and_reply(
+                            message_str, image_urls, conversation_info[2]
+                        )
+                    self.metrics.inc("classify.llm")
+                    if message_type and not image_urls:
+                        self.classify_cache.put(message_str, message_type, reason)
+            else:
+                if mode == "concurrent":
+                    # 分类的同时获取会话历史，分类结果为"其他"时无需再等待
+                    conversation_task = asyncio.create_task(self.timed_load_conversation(umo))
+                message_type, reason, rate_checked = await self.classify_message(event, message_str, image_urls)
+            classified = True
+        except Overloaded as e:
+            busy = self.busy_result(event, e)
+            if busy:
+                yield busy
+            return
+        finally:
+            # 分类被拒绝或出错时不会再用到会话历史，取消并发获取的任务，避免其无人等待
+            if conversation_task and not classified:
+                conversation_task.cancel()
+        self.metrics.inc(f"label.{message_type or '无效响应'}")
+
+        try:
+            # 根据分类结果调用相应的处理模块
+            if message_type in INTENT_LABELS:
+                with self.metrics.timer("dispatch"):
+                    async for result in self.handle_intent(event, message_type):
                         yield result
-                    return  # 处理完成后返回，不执行后续代码
-
-                elif message_type == "早安":
-                    # 根据具体问候类型向用户发送相应反馈
-                    yield event.plain_result(random.choice(["早安~", "早上好~"]))
-                    return  # 处理完成后返回，不执行后续代码
-                
-                elif message_type == "午安":
-                    yield event.plain_result(random.choice(["午安~", "中午好~"]))
-                    return  # 处理完成后返回，不执行后续代码
-                
-                elif message_type == "晚安":
-                    yield event.plain_result(random.choice(["晚安~", "晚上好~"]))
-                    return  # 处理完成后返回，不执行后续代码
-                
+                if conversation_task:
+                    conversation_task.cancel()
+                self.metrics.observe(f"pipeline.{mode}", time.perf_counter() - started)
+                return  # 处理完成后返回，不执行后续代码
+        except Exception as e:
+            # 记录处理过程中的任何异常
+            logger.error(f"处理LLM判断结果时出错: {e}")
+
+        if reply:
+            # single_call 模式已经得到回复，发送后再写回会话历史
+            yield event.plain_result(reply)
+            self.metrics.observe(f"pipeline.{mode}", time.perf_counter() - started)
+            try:
+                await self.save_reply_to_history(umo, conversation_info, message_str, reply)
             except Exception as e:
-                # 捕获并打印处理过程中的任何异常
-                print(f"处理LLM判断结果时出错: {e}")
+                logger.error(f"保存会话历史失败: {e}")
+            return
         
         # 如果没有匹配到预定义类型或处理过程出错，使用LLM生成自由回复
         # 这是一个兜底方案，确保用户总能得到回复
-        yield event.request_llm(
-            prompt=message_str,  # 用户原始消息作为提示
-            func_tool_manager=func_tools_mgr,  # 传递LLM工具管理器
-            session_id=curr_cid,  # 使用当前会话ID保持对话连贯性
-            contexts=context,  # 传递历史上下文
-            system_prompt="",  # 不使用特定系统提示
-            image_urls=event.get_image_urls() if hasattr(event, "get_image_urls") else [],  # 如果消息包含图片，传递图片URL
-            conversation=conversation  # 传递会话对象
-        )
+        # 获取LLM工具管理器，用于后续可能的LLM工具调用
+        func_tools_mgr = self.context.get_llm_tool_manager()
+
+        # 只有自由回复需要会话历史：获取当前会话ID及最近的上下文，用于维持对话连贯性
+        if conversation_task:
+            conversation_info = await conversation_task
+        elif conversation_info is None:
+            conversation_info = await self.timed_load_conversation(umo)
+        curr_cid, _, context = conversation_info
+
+        if self.streaming_config["enabled"]:
+            # 流式回复：每生成一句或一段就发送一条消息，全部发送后再把完整回复写回会话历史
+            parts = []
+            sent = False
+            try:
+                # 准入许可在 stream_reply 中只覆盖读取 LLM 输出的阶段，按间隔发送消息时已经释放
+                permit = self.llm_permit(event, KIND_REPLY, check_rate=not rate_checked)
+                with self.metrics.timer("stream.total"):
+                    async for text in self.stream_reply(message_str, image_urls, context, parts, permit):
+                        sent = True
+                        yield event.plain_result(text)
+            except Overloaded as e:
+                busy = self.busy_result(event, e)
+                if busy:
+                    yield busy
+                return
+            except Exception as e:
+                logger.error(f"流式回复失败: {e}")
+            rate_checked = True
+            if sent:
+                self.metrics.observe(f"pipeline.{mode}", time.perf_counter() - started)
+                reply = "".join(parts).strip()
+                try:
+                    await self.save_reply_to_history(umo, conversation_info, message_str, reply)
+                except Exception as e:
+                    logger.error(f"保存会话历史失败: {e}")
+                return
+            # 还没有发送任何内容就失败了，改为由 AstrBot 请求LLM，保证用户能得到回复
+            self.metrics.inc("stream.fallback")
+
+        # yield 返回时 LLM 请求已由后续流水线处理完成，因此这里记录的是整个回复的耗时
+        # 准入许可一直持有到 LLM 回复完成
+        # 不传递会话对象：AstrBot 收到会话对象时会用完整的历史替换裁剪后的上下文，
+        # 同时也不会写回会话历史，回复由 save_llm_reply 写回
+        event.set_extra(PENDING_HISTORY_EXTRA, (umo, conversation_info, message_str))
+        try:
+            async with self.llm_permit(event, KIND_REPLY, check_rate=not rate_checked):
+                with self.metrics.timer("request_llm"):
+                    yield event.request_llm(
+                        prompt=message_str,  # 用户原始消息作为提示
+                        func_tool_manager=func_tools_mgr,  # 传递LLM工具管理器
+                        session_id=curr_cid,  # 使用当前会话ID保持对话连贯性
+                        contexts=context,  # 传递历史上下文
+                        system_prompt="",  # 不使用特定系统提示
+                        image_urls=image_urls,  # 如果消息包含图片，传递图片URL
+                    )
+        except Overloaded as e:
+            busy = self.busy_result(event, e)
+            if busy:
+                yield busy
+            return
+        self.metrics.observe(f"pipeline.{mode}", time.perf_counter() - started)
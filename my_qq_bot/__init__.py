@@ -2,8 +2,20 @@
 my_qq_bot 包 - 我的QQ机器人插件模块
 """
 
-from .doudou_image import DoudouImageModule
-from .keyword_reply import KeywordReplyModule
-from .scheduled_task import ScheduledTaskModule
+import importlib
+
+# 功能模块按需导入：不依赖 AstrBot 的工具模块（如关键词匹配器）可以单独使用
+_MODULES = {
+    "DoudouImageModule": ".doudou_image",
+    "KeywordReplyModule": ".keyword_reply",
+    "ScheduledTaskModule": ".scheduled_task",
+}
 
 __all__ = ["DoudouImageModule", "KeywordReplyModule", "ScheduledTaskModule"]
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        module = importlib.import_module(_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,179 @@
+"""
+准入控制模块 - 限制同时进行的 LLM 请求数量，按优先级排队，并按用户/群限流
+
+所有 LLM 请求（分类和自由回复）都需要先取得许可。许可数达到上限时请求按优先级
+排队：私聊优先于群聊，分类这类短请求优先于完整回复。排队过长或等待超时时直接
+拒绝，由调用方快速回复用户，而不是让所有请求一起变慢。
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+
+from .rate_limit import TokenBucket
+
+# 准入控制的默认配置
+DEFAULT_ADMISSION_CONFIG = {
+    "enabled": True,  # 是否启用准入控制
+    "max_concurrency": 8,  # 同时进行的 LLM 请求数上限
+    "max_queue": 32,  # 最多排队等待的请求数，超出后直接拒绝
+    "max_wait": 5.0,  # 排队等待的最长时间（秒），超时后拒绝
+    "user_rate": 0.2,  # 每个用户每秒允许的消息数，0 表示不限流
+    "user_burst": 3,  # 每个用户允许的突发消息数
+    "group_rate": 1.0,  # 每个群每秒允许的消息数，0 表示不限流
+    "group_burst": 10,  # 每个群允许的突发消息数
+    "max_buckets": 4096,  # 最多记录多少个用户/群的令牌桶
+    "busy_reply": "稍等一下~",  # 拒绝请求时的回复，留空则不回复
+}
+
+# 请求类型：分类请求短而便宜，优先于完整回复
+KIND_CLASSIFY = 0
+KIND_REPLY = 1
+
+
+def request_priority(kind, is_group):
+    """计算请求优先级，数值越小越优先：同类请求中私聊优先于群聊"""
+    return kind * 2 + (1 if is_group else 0)
+
+
+class Overloaded(Exception):
+    """请求被准入控制拒绝"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason  # rate / queue / timeout
+
+
+class Permit:
+    """一个 LLM 请求许可，进入 async with 时排队取得，离开时自动归还"""
+
+    def __init__(self, controller, priority):
+        self.controller = controller
+        self.priority = priority
+        self.wait = 0.0  # 排队等待的秒数
+        self.acquired = False
+
+    def release(self):
+        if self.acquired:
+            self.acquired = False
+            self.controller._release()
+
+    async def __aenter__(self):
+        await self.controller._acquire(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AdmissionController:
+    """全局并发上限 + 优先级排队 + 按用户/群的令牌桶"""
+
+    def __init__(self, max_concurrency=8, max_queue=32, max_wait=5.0, user_rate=0.2, user_burst=3,
+                 group_rate=1.0, group_burst=10, max_buckets=4096):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_limit = (user_rate, user_burst)
+        self.group_limit = (group_rate, group_burst)
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()  # ("user"/"group", ID) -> TokenBucket，按最近使用排序
+
+        self.active = 0
+        self.waiters = []  # (优先级, 序号, Future) 的最小堆
+        self.counter = itertools.count()
+
+        # 统计计数器
+        self.admitted = 0
+        self.rejected = {"rate": 0, "queue": 0, "timeout": 0}
+
+    def _bucket(self, kind, key, limit):
+        bucket = self.buckets.get((kind, key))
+        if bucket is None:
+            bucket = self.buckets[(kind, key)] = TokenBucket(*limit)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end((kind, key))
+        return bucket
+
+    def check_rate(self, user=None, group=None):
+        """
+        按用户和群限流，每条消息调用一次
+
+        异常:
+            Overloaded: 用户或群发送过于频繁
+        """
+        user_bucket = self._bucket("user", user, self.user_limit) if user and self.user_limit[0] else None
+        if user_bucket and not user_bucket.try_acquire():
+            self.rejected["rate"] += 1
+            raise Overloaded("rate")
+        group_bucket = self._bucket("group", group, self.group_limit) if group and self.group_limit[0] else None
+        if group_bucket and not group_bucket.try_acquire():
+            if user_bucket:
+                # 群的令牌不足时退回用户的令牌
+                user_bucket.tokens = min(user_bucket.capacity, user_bucket.tokens + 1)
+            self.rejected["rate"] += 1
+            raise Overloaded("rate")
+
+    def admit(self, priority):
+        """
+        申请一个请求许可，用法: async with controller.admit(priority) as permit
+
+        进入 async with 时若排队已满或等待超时，抛出 Overloaded
+        """
+        return Permit(self, priority)
+
+    async def _acquire(self, permit):
+        start = time.monotonic()
+        if self.active < self.max_concurrency and not self.waiters:
+            self.active += 1
+        else:
+            if len(self.waiters) >= self.max_queue:
+                self.rejected["queue"] += 1
+                raise Overloaded("queue")
+
+            entry = (permit.priority, next(self.counter), asyncio.get_running_loop().create_future())
+            heapq.heappush(self.waiters, entry)
+            future = entry[2]
+            try:
+                await asyncio.wait({future}, timeout=self.max_wait)
+            except asyncio.CancelledError:
+                # 已经分到许可时归还，否则放弃排队
+                if future.done() and not future.cancelled():
+                    self._release()
+                else:
+                    self._abandon(entry)
+                raise
+            if not future.done():
+                self._abandon(entry)
+                self.rejected["timeout"] += 1
+                raise Overloaded("timeout")
+        permit.acquired = True
+        permit.wait = time.monotonic() - start
+        self.admitted += 1
+
+    def _abandon(self, entry):
+        entry[2].cancel()
+        if entry in self.waiters:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+
+    def _release(self):
+        # 把许可直接交给优先级最高的等待者
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,142 @@
+"""
+群发模块 - 并发、限流、带重试地把消息发送给多个目标
+"""
+
+import asyncio
+import random
+import time
+
+from astrbot.api import logger
+
+from .metrics import summarize
+from .rate_limit import TokenBucket
+
+# 群发的默认配置
+DEFAULT_BROADCAST_CONFIG = {
+    "concurrency": 8,  # 同时发送的目标数量上限
+    "rate": 2.0,  # 每个平台每秒最多发送的消息数，0 表示不限流
+    "burst": 5,  # 每个平台允许的突发消息数
+    "platform_rates": {},  # 按平台单独设置，例如 {"aiocqhttp": {"rate": 1, "burst": 3}}
+    "max_retries": 3,  # 临时性失败的最大重试次数
+    "retry_base_delay": 1.0,  # 第一次重试前的等待时间（秒），之后按指数增长
+    "retry_max_delay": 30.0,  # 重试等待时间的上限（秒）
+}
+
+# 这些错误说明请求本身有问题（例如目标格式错误），重试也不会成功
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError)
+
+
+class DeliveryError(Exception):
+    """发送失败且不应重试"""
+
+
+class DeliveryReport:
+    """一次群发的投递报告"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.monotonic()
+        self.duration = 0.0
+        self.targets = 0
+        self.delivered = 0
+        self.retries = 0
+        self.latencies = []  # 每条消息从群发开始到送达的耗时
+        self.failures = []  # (目标, 错误信息)
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started_at
+
+    def summary(self):
+        """返回报告摘要"""
+        return {
+            "name": self.name,
+            "targets": self.targets,
+            "delivered": self.delivered,
+            "failed": len(self.failures),
+            "retries": self.retries,
+            "duration": round(self.duration, 3),
+            "latency": {k: round(v, 3) if isinstance(v, float) else v for k, v in summarize(self.latencies).items()},
+        }
+
+
+class BroadcastEngine:
+    """群发引擎：限制并发数，按平台令牌桶限流，临时性失败按带抖动的指数退避重试"""
+
+    def __init__(self, send_func, config=None):
+        """
+        参数:
+            send_func: 发送函数 async (target, chain) -> bool，返回 False 表示找不到目标平台
+            config: 群发配置，见 DEFAULT_BROADCAST_CONFIG
+        """
+        self.send_func = send_func
+        self.config = dict(DEFAULT_BROADCAST_CONFIG, **(config or {}))
+        self.buckets = {}  # 平台名 -> TokenBucket
+
+    def bucket_for(self, target):
+        """按目标所在的平台取得令牌桶，目标格式为 平台名:消息类型:会话ID"""
+        platform = target.split(":", 1)[0]
+        bucket = self.buckets.get(platform)
+        if bucket is None:
+            override = self.config["platform_rates"].get(platform) or {}
+            bucket = TokenBucket(
+                override.get("rate", self.config["rate"]),
+                override.get("burst", self.config["burst"]),
+            )
+            self.buckets[platform] = bucket
+        return bucket
+
+    async def broadcast(self, name, targets, chains):
+        """
+        把一组消息发送给所有目标，每个目标内按顺序发送，不同目标之间并发
+
+        参数:
+            name: 本次群发的名称，用于日志
+            targets: 目标列表
+            chains: 要发送的消息链列表
+
+        返回:
+            DeliveryReport: 投递报告
+        """
+        report = DeliveryReport(name)
+        report.targets = len(targets)
+        semaphore = asyncio.Semaphore(self.config["concurrency"])
+
+        async def deliver(target):
+            async with semaphore:
+                for chain in chains:
+                    try:
+                        await self.send_with_retry(target, chain, report)
+                    except Exception as e:
+                        report.failures.append((target, str(e)))
+                        logger.error(f"发送定时消息失败: {target}, 错误: {str(e)}")
+                        # 同一目标的后续消息不再发送，避免顺序错乱
+                        return
+                    report.delivered += 1
+                    report.latencies.append(time.monotonic() - report.started_at)
+
+        await asyncio.gather(*(deliver(target) for target in targets))
+        report.finish()
+        return report
+
+    async def send_with_retry(self, target, chain, report):
+        """发送一条消息，临时性失败时重试"""
+        bucket = self.bucket_for(target)
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                if await self.send_func(target, chain) is False:
+                    raise DeliveryError("找不到目标所在的平台")
+                return
+            except (DeliveryError, *PERMANENT_ERRORS):
+                raise
+            except Exception as e:
+                if attempt >= self.config["max_retries"]:
+                    raise
+                # 带抖动的指数退避，避免大量目标同时重试
+                delay = min(self.config["retry_max_delay"], self.config["retry_base_delay"] * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+                attempt += 1
+                report.retries += 1
+                logger.warning(f"发送到 {target} 失败，{delay:.1f} 秒后第 {attempt} 次重试: {str(e)}")
+                await asyncio.sleep(delay)
@@ -0,0 +1,136 @@
+"""
+分类缓存模块 - 缓存 LLM 的消息分类结果，避免重复的短消息反复调用 LLM
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+
+from astrbot.api import logger
+
+from .intent_classifier import normalize_text
+
+
+class ClassificationCache:
+    """以归一化消息文本为键、带 TTL 的 LRU 分类结果缓存"""
+
+    def __init__(self, max_size=2048, ttl=86400, path=None, save_interval=50):
+        """
+        参数:
+            max_size: 最多缓存的条目数，超出后淘汰最久未使用的条目
+            ttl: 每条缓存的有效期（秒）
+            path: 持久化文件路径，为 None 时只缓存在内存中
+            save_interval: 每新增多少条缓存写一次磁盘
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.save_interval = save_interval
+        # 键 -> (分类, 理由, 过期时间戳)
+        self.entries = OrderedDict()
+        self.dirty = 0
+
+        # 统计计数器
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.path:
+            self.load()
+
+    def get(self, message_str):
+        """
+        查询消息的分类结果
+
+        返回:
+            (message_type, reason): 命中时返回缓存的分类及理由，未命中返回 None
+        """
+        key = normalize_text(message_str)
+        entry = self.entries.get(key) if key else None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        message_type, reason, expires_at = entry
+        if expires_at <= time.time():
+            # 已过期，删除后视为未命中
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        # 命中后移到队尾，表示最近使用过
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return message_type, reason
+
+    def put(self, message_str, message_type, reason=""):
+        """写入一条分类结果，超出容量时按 LRU 淘汰"""
+        key = normalize_text(message_str)
+        if not key:
+            return
+
+        self.entries[key] = (message_type, reason, time.time() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+        # 累计到一定数量的新条目后持久化
+        self.dirty += 1
+        if self.path and self.save_interval and self.dirty >= self.save_interval:
+            self.save()
+
+    def load(self):
+        """从磁盘加载未过期的缓存条目"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载分类缓存失败，将使用空缓存: {e}")
+            return
+
+        now = time.time()
+        for key, message_type, reason, expires_at in data.get("entries", []):
+            if expires_at > now:
+                self.entries[key] = (message_type, reason, expires_at)
+        # 文件中按 LRU 顺序保存，只保留最近使用的部分
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        """将缓存写入磁盘（先写临时文件再替换，避免写坏文件）"""
+        if not self.path or not self.dirty:
+            return
+        now = time.time()
+        data = {
+            "entries": [
+                [key, message_type, reason, expires_at]
+                for key, (message_type, reason, expires_at) in self.entries.items()
+                if expires_at > now
+            ]
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = 0
+        except OSError as e:
+            logger.error(f"保存分类缓存失败: {e}")
+
+    def stats(self):
+        """返回缓存命中、未命中、淘汰等统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
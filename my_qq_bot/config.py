@@ -0,0 +1,42 @@
+"""
+插件配置模块 - 加载 data/config.yaml 中的运行参数
+"""
+
+import os
+import yaml
+
+# 优先使用 libyaml 提供的 C 解析器，未编译 libyaml 时回退为纯 Python 实现
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(stream):
+    """以 safe_load 的规则解析 YAML 文本或文件对象"""
+    return yaml.load(stream, Loader=YamlLoader)
+
+
+def load_plugin_config(source_dir):
+    """加载插件运行参数配置，文件不存在时创建一个空配置"""
+    # 构建配置文件路径
+    yaml_path = os.path.join(source_dir, "data", "config.yaml")
+    directory = os.path.dirname(yaml_path)
+
+    # 若目录不存在则创建
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # 若 YAML 文件不存在，创建一个空配置
+    if not os.path.exists(yaml_path):
+        with open(yaml_path, "w", encoding="utf-8") as f:
+            yaml.dump({}, f, allow_unicode=True, indent=2)
+
+    # 从 YAML 文件加载配置
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        data = load_yaml(f)
+    return data or {}
+
+
+def get_section(config, name, defaults):
+    """取出配置中的某一节，并用默认值补全缺失的字段"""
+    section = dict(defaults)
+    section.update(config.get(name) or {})
+    return section
@@ -0,0 +1,122 @@
+"""
+配置快照模块 - 把解析、校验并编译后的配置结果保存为二进制快照，配置文件未变化时直接加载
+
+快照以配置文件内容的哈希为键，保存在 data/snapshots/ 下。文件内容、编译参数或
+生成快照的代码有任何变化时键随之变化，快照失效并重新编译。快照使用 pickle，
+只读取插件自己写入的文件。
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+
+from astrbot.api import logger
+
+from .config import load_yaml
+
+# 快照格式版本，格式变化时递增，旧快照自动失效
+SNAPSHOT_VERSION = 1
+
+
+def code_signature(*modules):
+    """根据模块源文件的大小和修改时间生成签名，代码更新后旧快照失效"""
+    parts = [f"py{sys.version_info[0]}.{sys.version_info[1]}"]
+    for module in modules:
+        path = getattr(module, "__file__", None)
+        try:
+            st = os.stat(path)
+            parts.append(f"{module.__name__}:{st.st_size}:{st.st_mtime_ns}")
+        except (OSError, TypeError):
+            parts.append(f"{module.__name__}:{getattr(module, '__version__', '')}")
+    return "|".join(parts)
+
+
+class ConfigSnapshot:
+    """按配置文件内容哈希缓存编译结果"""
+
+    def __init__(self, snapshot_dir=None):
+        """
+        参数:
+            snapshot_dir: 快照目录，为 None 时不读写快照，每次都重新编译
+        """
+        self.snapshot_dir = snapshot_dir
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+        # 统计计数器
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, name, path, compile_func, salt=""):
+        """
+        读取配置文件并返回编译结果
+
+        参数:
+            name: 快照名称，同一个名称只保留最新的一份快照
+            path: 配置文件路径
+            compile_func: 接收解析后的 YAML 数据、返回编译结果的函数，结果需要可以 pickle
+            salt: 影响编译结果的其他参数（默认选项、代码签名等），变化时快照失效
+
+        返回:
+            compile_func 的返回值
+
+        异常:
+            OSError / yaml.YAMLError: 读取或解析配置文件失败
+            ValueError: compile_func 校验配置失败
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+        key = self.make_key(raw, salt)
+        snapshot_path = os.path.join(self.snapshot_dir, f"{name}.pickle") if self.snapshot_dir else None
+
+        if snapshot_path:
+            found, result = self._read(snapshot_path, key)
+            if found:
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        result = compile_func(load_yaml(raw.decode("utf-8")))
+        if snapshot_path:
+            self._write(snapshot_path, key, result)
+        return result
+
+    @staticmethod
+    def make_key(raw, salt):
+        digest = hashlib.sha256()
+        digest.update(f"{SNAPSHOT_VERSION}|{salt}|".encode("utf-8"))
+        digest.update(raw)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _read(snapshot_path, key):
+        """快照的第一个对象是键，键一致时才反序列化后面的编译结果"""
+        try:
+            with open(snapshot_path, "rb") as f:
+                if pickle.load(f) != key:
+                    return False, None
+                return True, pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logger.warning(f"配置快照无法读取，重新编译: {snapshot_path}, 错误: {e}")
+            return False, None
+
+    @staticmethod
+    def _write(snapshot_path, key, result):
+        temp_path = f"{snapshot_path}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, snapshot_path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning(f"保存配置快照失败: {snapshot_path}, 错误: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,237 @@
+"""
+文件监视模块 - 监视配置文件和目录的变化，支持 inotify，其他平台回退为轮询 mtime
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from astrbot.api import logger
+
+# inotify 事件掩码
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+# Linux 上的取值（等于 O_NONBLOCK / O_CLOEXEC），写成常量以便在没有这些标志的平台上也能导入本模块
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """通过 ctypes 调用 Linux inotify 接口的简单封装"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch 失败: {path}")
+        return wd
+
+    def read_events(self, timeout):
+        """等待并读取事件，返回 (wd, mask, name) 列表"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """
+    监视文件或目录的变化并回调
+
+    监视文件时，文件被修改、替换或删除都会触发回调；监视目录时，目录中的条目
+    增删改都会触发回调（不递归子目录）。短时间内的连续变化会合并为一次回调。
+    回调在监视线程中执行。
+    """
+
+    def __init__(self, poll_interval=1.0, debounce=0.5, use_inotify=True):
+        """
+        参数:
+            poll_interval: 轮询模式下检查 mtime 的间隔（秒）
+            debounce: 变化后等待多久再回调，用于合并编辑器的多次写入（秒）
+            use_inotify: 是否优先使用 inotify
+        """
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+
+        self.lock = threading.Lock()
+        self.callbacks = {}  # 监视的路径 -> 回调列表
+        self.signatures = {}  # 轮询模式下每个路径的 (mtime, size)
+        self.pending = {}  # 已变化待回调的路径 -> 最后一次变化的时间
+        self.inotify = None
+        self.watch_dirs = {}  # inotify 模式下监视的目录 -> wd
+        self.wd_dirs = {}  # wd -> 目录
+
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def watch(self, path, callback):
+        """开始监视一个文件或目录，变化时以路径为参数调用 callback"""
+        path = os.path.abspath(path)
+        with self.lock:
+            self.callbacks.setdefault(path, []).append(callback)
+            self.signatures[path] = self._signature(path)
+            if self.inotify:
+                self._add_inotify_watch(path)
+
+    def unwatch(self, path):
+        """停止监视一个文件或目录"""
+        path = os.path.abspath(path)
+        with self.lock:
+            self.callbacks.pop(path, None)
+            self.signatures.pop(path, None)
+            self.pending.pop(path, None)
+
+    def start(self):
+        """启动监视线程"""
+        if self.thread:
+            return
+        if self.use_inotify:
+            try:
+                self.inotify = _Inotify()
+                with self.lock:
+                    for path in self.callbacks:
+                        self._add_inotify_watch(path)
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify 不可用，改为轮询检查文件变化: {e}")
+                self.inotify = None
+
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="my-qq-bot-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止监视线程并释放 inotify 句柄"""
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+            self.watch_dirs.clear()
+            self.wd_dirs.clear()
+
+    def _add_inotify_watch(self, path):
+        # 文件通过其所在目录监视，这样编辑器"写临时文件再改名"的保存方式也能被捕获
+        directory = path if os.path.isdir(path) else os.path.dirname(path)
+        if directory in self.watch_dirs or not os.path.isdir(directory):
+            return
+        try:
+            wd = self.inotify.add_watch(directory)
+        except OSError as e:
+            logger.warning(f"无法监视目录 {directory}: {e}")
+            return
+        self.watch_dirs[directory] = wd
+        self.wd_dirs[wd] = directory
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                if self.inotify:
+                    self._collect_inotify()
+                else:
+                    self._collect_polling()
+                self._fire_pending()
+            except Exception as e:
+                logger.error(f"文件监视出错: {e}")
+                self.stopping.wait(self.poll_interval)
+
+    def _collect_inotify(self):
+        timeout = self.debounce / 2 if self.pending else self.poll_interval
+        events = self.inotify.read_events(timeout)
+        now = time.monotonic()
+        with self.lock:
+            for wd, mask, name in events:
+                directory = self.wd_dirs.get(wd)
+                if directory is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    # 目录本身被删除或移走，之后重新添加监视
+                    self.watch_dirs.pop(directory, None)
+                    self.wd_dirs.pop(wd, None)
+                changed = os.path.join(directory, name) if name else directory
+                for path in self.callbacks:
+                    if path == changed or path == directory:
+                        self.pending[path] = now
+
+            # 补上此前不存在的目录（例如新建的图片类别目录）
+            for path in self.callbacks:
+                directory = path if os.path.isdir(path) else os.path.dirname(path)
+                if directory not in self.watch_dirs and os.path.isdir(directory):
+                    self._add_inotify_watch(path)
+                    if directory in self.watch_dirs:
+                        self.pending[path] = now
+
+    def _collect_polling(self):
+        self.stopping.wait(self.debounce / 2 if self.pending else self.poll_interval)
+        now = time.monotonic()
+        with self.lock:
+            for path, old_signature in list(self.signatures.items()):
+                signature = self._signature(path)
+                if signature != old_signature:
+                    self.signatures[path] = signature
+                    self.pending[path] = now
+
+    def _fire_pending(self):
+        now = time.monotonic()
+        with self.lock:
+            ready = [path for path, changed_at in self.pending.items() if now - changed_at >= self.debounce]
+            for path in ready:
+                del self.pending[path]
+            callbacks = [(path, list(self.callbacks.get(path, ()))) for path in ready]
+
+        for path, path_callbacks in callbacks:
+            for callback in path_callbacks:
+                try:
+                    callback(path)
+                except Exception as e:
+                    logger.error(f"处理文件变化回调出错: {path}, 错误: {e}")
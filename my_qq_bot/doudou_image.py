@@ -2,53 +2,95 @@
 豆豆照片模块 - 处理返回豆豆照片的请求
 """
 
-import os
+import asyncio
 import random
+import threading
 
+from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent, MessageEventResult
 from astrbot.api.message_components import Image
 
+from .image_cache import create_image_cache
+from .image_catalog import ImageCatalog, ImageSelector
+
+# 豆豆照片模块的默认配置
+DEFAULT_DOUDOU_IMAGE_CONFIG = {
+    "root_dir": r"C:\my robot\pictures",  # 图片库根目录，每个子目录是一个类别
+    "selection": "shuffle",  # 图片选取方式: random / shuffle / no_repeat
+    "no_repeat_window": 3,  # no_repeat 模式下最近多少张图片不重复
+    "max_sessions": 1024,  # 最多记录多少个会话的选取历史
+    "ready_timeout": 10,  # 图片索引尚未构建完成时最多等待的秒数
+    "cache": {},  # 图片压缩缓存配置，见 image_cache.DEFAULT_IMAGE_CACHE_CONFIG
+}
+
 
 class DoudouImageModule:
     """豆豆照片功能模块"""
 
-    def __init__(self, context):
+    def __init__(self, context, source_dir, config=None, watcher=None):
         self.context = context
+        self.source_dir = source_dir
+        self.config = dict(DEFAULT_DOUDOU_IMAGE_CONFIG, **(config or {}))
         # self.root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../images'))
-        self.root_dir = r'C:\my robot\pictures'
+        self.root_dir = self.config["root_dir"]
+
+        # 在后台线程中构建图片索引，目录变化时自动刷新
+        self.catalog = ImageCatalog(self.root_dir, watcher)
+        self.catalog.start()
+        self.selector = ImageSelector(
+            mode=self.config["selection"],
+            window=self.config["no_repeat_window"],
+            max_sessions=self.config["max_sessions"],
+        )
+
+        # 图片压缩缓存：发送缩小后的副本，避免大图上传缓慢或超时
+        self.image_cache = create_image_cache(source_dir, self.config["cache"])
+        if self.image_cache and self.image_cache.available and self.config["cache"].get("warm_on_start", True):
+            threading.Thread(target=self.warm_image_cache, name="my-qq-bot-image-warm", daemon=True).start()
+
+    def warm_image_cache(self):
+        """等待图片索引构建完成后，在后台为整个图片库生成压缩副本"""
+        self.catalog.wait_ready()
+        for category, images in list(self.catalog.categories.items()):
+            # 插件卸载后停止预热，避免重新创建进程池
+            if self.image_cache.closed:
+                return
+            generated = self.image_cache.warm(images)
+            if generated:
+                logger.info(f"已为图片类别 '{category}' 生成 {generated} 个压缩副本")
+
+    def shutdown(self):
+        """停止图片压缩进程池并保存缓存索引"""
+        if self.image_cache:
+            self.image_cache.close()
 
     async def get_image(self, event: AstrMessageEvent, category: str) -> MessageEventResult:
         """返回指定类别的一张图片。"""
-        # 验证 category 防止注入攻击
-        if (not os.path.isdir(self.root_dir)) or (category not in os.listdir(self.root_dir)):
-            yield event.plain_result(f"类别 '{category}' 不存在。")
-            return
-
-        # 构建类别目录路径
-        category_dir = os.path.join(self.root_dir, category)
+        # 首次扫描尚未完成时，在线程中等待，不阻塞事件循环
+        if not self.catalog.ready.is_set():
+            ready = await asyncio.to_thread(self.catalog.wait_ready, self.config["ready_timeout"])
+            if not ready:
+                # 索引还没有建好，此时无法判断类别是否存在
+                yield event.plain_result(f"{category}的照片还在整理中，请稍后再试~")
+                return
 
-        # 验证类别目录是否存在
-        if not os.path.isdir(category_dir):
+        # 验证 category 防止注入攻击：只接受索引中存在的类别目录
+        if not self.catalog.has_category(category):
             yield event.plain_result(f"类别 '{category}' 不存在。")
             return
 
         # 随机决定是发送图片还是文字
         if random.random() < 0.8:
-            # 获取类别图片
-            image_files = [
-                f
-                for f in os.listdir(category_dir)
-                if f.lower().endswith((".jpg", ".png", ".gif", ".webp"))
-            ]
-            if not image_files:
+            # 为当前会话选择一张图片，避免同一张图片反复出现
+            image = self.selector.pick(event.unified_msg_origin, category, self.catalog.images(category))
+            if image is None:
                 yield event.plain_result(f"没有找到任何 '{category}' 的图片。")
                 return
 
-            # 随机选择一张图片
-            random_image = random.choice(image_files)
-            image_path = os.path.join(category_dir, random_image)
+            # 优先发送压缩副本，未命中时发送原图并在后台生成副本
+            image_path = self.image_cache.lookup(image) if self.image_cache else None
             chain = [
-                Image.fromFileSystem(image_path),
+                Image.fromFileSystem(image_path or image.path),
             ]
             yield event.chain_result(chain)
         else:
@@ -0,0 +1,177 @@
+"""
+会话历史模块 - 按需解析会话历史，只保留最近的若干轮对话
+
+会话历史以 JSON 数组的形式保存，新的对话只会追加在末尾。缓存中记录每个会话上一次
+解析的原始文本，再次读取时如果旧文本是新文本的前缀，只解析新增的部分。
+"""
+
+import json
+from collections import OrderedDict
+
+# 会话历史的默认配置
+DEFAULT_HISTORY_CONFIG = {
+    "max_turns": 20,  # 最多保留最近多少轮对话（以用户消息计），0 表示不限制
+    "max_tokens": 4000,  # 历史记录的估算 token 上限，0 表示不限制
+    "max_sessions": 256,  # 最多缓存多少个会话的解析结果
+}
+
+# 估算 token 时每张图片计入的数量
+IMAGE_TOKENS = 100
+
+
+def estimate_tokens(message):
+    """粗略估算一条消息的 token 数：中文大约一个字一个 token，按字符数计算"""
+    content = message.get("content")
+    if isinstance(content, str):
+        return len(content)
+    tokens = 0
+    if isinstance(content, list):
+        for part in content:
+            if isinstance(part, dict) and part.get("type") == "text":
+                tokens += len(part.get("text") or "")
+            else:
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+def trim_history(messages, max_turns=0, max_tokens=0):
+    """
+    从末尾开始保留不超过轮数和 token 上限的历史记录
+
+    参数:
+        messages: 历史消息列表
+        max_turns: 最多保留的轮数（以用户消息计），0 表示不限制
+        max_tokens: 估算 token 上限，0 表示不限制
+
+    返回:
+        裁剪后的消息列表，总是从一条用户消息开始
+    """
+    if not max_turns and not max_tokens:
+        return messages
+    start = len(messages)
+    turns = 0
+    tokens = 0
+    for index in range(len(messages) - 1, -1, -1):
+        tokens += estimate_tokens(messages[index])
+        if max_tokens and tokens > max_tokens:
+            break
+        start = index
+        if messages[index].get("role") == "user":
+            turns += 1
+            if max_turns and turns >= max_turns:
+                break
+
+    # 保证上下文从用户消息开始，避免以助手回复或工具结果开头
+    while start < len(messages) and messages[start].get("role") != "user":
+        start += 1
+    return messages[start:]
+
+
+class HistoryCache:
+    """按会话缓存解析并裁剪后的历史记录"""
+
+    def __init__(self, max_turns=20, max_tokens=4000, max_sessions=256):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        # 会话 -> (对话 ID, 原始 JSON 文本, 完整的消息列表, 裁剪后的消息列表)，按最近使用排序
+        # 保留完整列表是为了把插件自己得到的回复追加写回时不必重新解析整个历史
+        self.sessions = OrderedDict()
+
+        # 统计计数器
+        self.full_parses = 0
+        self.incremental_parses = 0
+        self.unchanged = 0
+
+    def load(self, session, cid, raw):
+        """
+        返回会话裁剪后的历史记录
+
+        参数:
+            session: 会话标识（unified_msg_origin）
+            cid: 当前对话 ID，切换对话后重新解析
+            raw: 会话历史的原始 JSON 文本
+
+        返回:
+            裁剪后的消息列表（调用方不应修改）
+        """
+        cached = self.sessions.get(session)
+        messages = None
+        if cached and cached[0] == cid:
+            if raw == cached[1]:
+                self.unchanged += 1
+                self.sessions.move_to_end(session)
+                return cached[3]
+            messages = self._parse_appended(cached[1], raw, cached[2])
+        if messages is None:
+            messages = self._parse_full(raw)
+        return self._store(session, cid, raw, messages)
+
+    def append(self, session, cid, raw, messages):
+        """
+        在会话历史末尾追加消息，复用缓存中已解析的历史
+
+        参数:
+            session: 会话标识（unified_msg_origin）
+            cid: 当前对话 ID
+            raw: 追加之前会话历史的原始 JSON 文本，没有历史时为空
+            messages: 要追加的消息列表
+
+        返回:
+            追加后的完整消息列表，用于写回会话
+        """
+        self.load(session, cid, raw or "[]")
+        history = self.sessions[session][2] + messages
+        # 按 json.dumps 的格式推算写回后的原始文本，下次读取时文本相同即可直接使用缓存
+        appended = json.dumps(messages)
+        body = raw.rstrip()[:-1].rstrip() if raw and len(history) > len(messages) else ""
+        new_raw = f"{body}, {appended[1:]}" if body else appended
+        self._store(session, cid, new_raw, history)
+        return history
+
+    def _store(self, session, cid, raw, messages):
+        trimmed = trim_history(messages, self.max_turns, self.max_tokens)
+        self.sessions[session] = (cid, raw, messages, trimmed)
+        self.sessions.move_to_end(session)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return trimmed
+
+    def _parse_full(self, raw):
+        self.full_parses += 1
+        try:
+            messages = json.loads(raw)
+        except ValueError:
+            return []
+        return messages if isinstance(messages, list) else []
+
+    def _parse_appended(self, old_raw, raw, old_messages):
+        """旧文本是新文本去掉末尾 ] 后的前缀时，只解析新增的消息；否则返回 None"""
+        body = old_raw.rstrip()
+        if not old_messages or not body.endswith("]"):
+            return None
+        body = body[:-1]
+        if not raw.startswith(body):
+            return None
+        suffix = raw[len(body):].lstrip()
+        if not suffix.startswith(","):
+            return None
+        try:
+            appended = json.loads("[" + suffix[1:])
+        except ValueError:
+            return None
+        if not isinstance(appended, list):
+            return None
+        self.incremental_parses += 1
+        return old_messages + appended
+
+    def invalidate(self, session):
+        self.sessions.pop(session, None)
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "full_parses": self.full_parses,
+            "incremental_parses": self.incremental_parses,
+            "unchanged": self.unchanged,
+        }
@@ -0,0 +1,324 @@
+"""
+图片缓存模块 - 为图片库中的每张图片预先生成缩小/重新编码的副本，发送时直接读取副本
+
+也可以作为维护命令单独运行，预热整个图片库:
+    python -m my_qq_bot.image_cache [--source-dir 插件目录]
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import partial
+
+try:
+    from astrbot.api import logger
+except ImportError:  # 作为维护命令单独运行（python -m my_qq_bot.image_cache）时可以不安装 AstrBot
+    logger = logging.getLogger(__name__)
+
+from .image_render import OUTPUT_FORMATS, render_image
+
+# 图片缓存的默认配置
+DEFAULT_IMAGE_CACHE_CONFIG = {
+    "enabled": True,  # 是否启用图片压缩缓存（需要安装 Pillow）
+    "max_edge": 1280,  # 长边的最大像素
+    "quality": 85,  # 有损格式的编码质量
+    "format": "jpeg",  # 静态图片的输出格式: jpeg / webp / png
+    "passthrough_kb": 512,  # 原图不超过该大小且尺寸足够小时直接发送原图
+    "max_size_mb": 512,  # 缓存目录的总大小上限，超出后按 LRU 淘汰
+    "workers": 2,  # 生成副本的进程数
+    "warm_on_start": True,  # 启动后是否在后台为整个图片库生成副本
+}
+
+
+class DerivedImageCache:
+    """
+    图片压缩副本缓存
+
+    副本以"原图内容哈希 + 压缩参数"命名并保存在磁盘上。查询时按原图的路径、
+    大小和修改时间找到内容哈希，命中则返回副本路径；未命中时返回 None，
+    并把原图加入进程池生成副本。
+    """
+
+    def __init__(self, cache_dir, max_edge=1280, quality=85, image_format="jpeg",
+                 passthrough_kb=512, max_size_mb=512, workers=2):
+        if image_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的图片输出格式: {image_format}")
+        self.cache_dir = cache_dir
+        self.max_edge = max_edge
+        self.quality = quality
+        self.image_format = image_format
+        self.passthrough_bytes = passthrough_kb * 1024
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.workers = workers
+        self.profile_key = f"{max_edge}_{quality}_{image_format}"
+        self.index_path = os.path.join(cache_dir, f"index_{self.profile_key}.json")
+
+        # Pillow 为可选依赖，未安装时缓存不生效，始终发送原图
+        self.available = importlib.util.find_spec("PIL") is not None
+        if not self.available:
+            logger.warning("未安装 Pillow，图片压缩缓存不可用，将直接发送原图")
+
+        self.lock = threading.Lock()
+        self.sources = {}  # 原图 "路径|大小|修改时间" -> 内容哈希
+        self.derived = OrderedDict()  # 内容哈希 -> (副本文件名或 None, 大小)，按最近使用排序
+        self.total_size = 0
+        self.pending = {}  # 正在生成的原图键 -> Future
+        self.failed = set()  # 无法生成副本的原图键（文件修改后键会变化，届时重新尝试）
+        self.dirty = 0
+        self.executor = None
+        self.closed = False  # close() 之后不再创建进程池、生成副本
+
+        # 统计计数器
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load()
+
+    @staticmethod
+    def source_key(image):
+        return f"{image.path}|{image.size}|{image.mtime}"
+
+    def lookup(self, image):
+        """
+        查询图片的压缩副本
+
+        参数:
+            image: 图片索引条目 ImageEntry
+
+        返回:
+            可直接发送的文件路径（副本，或无需压缩的原图）；未命中时返回 None 并排队生成
+        """
+        key = self.source_key(image)
+        with self.lock:
+            content_hash = self.sources.get(key)
+            record = self.derived.get(content_hash) if content_hash else None
+            if record is not None:
+                file_name, _ = record
+                path = os.path.join(self.cache_dir, file_name) if file_name else image.path
+                if os.path.exists(path):
+                    self.derived.move_to_end(content_hash)
+                    self.hits += 1
+                    return path
+                # 副本已被删除，重新生成
+                self._remove(content_hash)
+            self.misses += 1
+
+        self.enqueue(image)
+        return None
+
+    def enqueue(self, image):
+        """把原图加入生成队列，返回对应的 Future（不可用或已在队列中时返回已有的）"""
+        if not self.available:
+            return None
+        key = self.source_key(image)
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key]
+            if key in self.failed or self.closed:
+                return None
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            future = self.executor.submit(
+                render_image, image.path, self.cache_dir, self.profile_key,
+                self.max_edge, self.quality, self.image_format, self.passthrough_bytes,
+            )
+            self.pending[key] = future
+        future.add_done_callback(partial(self._on_rendered, key))
+        return future
+
+    def warm(self, images):
+        """为一批图片生成副本，已有副本的跳过，返回新生成的数量"""
+        futures = []
+        for image in images:
+            if self.closed:
+                break
+            key = self.source_key(image)
+            with self.lock:
+                content_hash = self.sources.get(key)
+                if content_hash in self.derived:
+                    continue
+            future = self.enqueue(image)
+            if future is not None:
+                futures.append(future)
+        wait(futures)
+        return sum(1 for future in futures if not future.cancelled() and future.exception() is None)
+
+    def _on_rendered(self, key, future):
+        with self.lock:
+            self.pending.pop(key, None)
+            if future.cancelled():
+                return
+            try:
+                content_hash, file_name, size = future.result()
+            except Exception as e:
+                self.failed.add(key)
+                logger.error(f"生成图片副本失败: {key.split('|')[0]}, 错误: {e}")
+                return
+
+            self.sources[key] = content_hash
+            record = self.derived.get(content_hash)
+            if record is not None and record[0] == file_name:
+                # 内容相同的另一张原图（或修改时间变化但内容未变的原图）生成的是同一个副本文件，保留已有记录
+                self.derived.move_to_end(content_hash)
+            else:
+                if record is not None:
+                    self._remove(content_hash)
+                self.derived[content_hash] = (file_name, size if file_name else 0)
+                self.total_size += size if file_name else 0
+                self._evict()
+            self.dirty += 1
+            if self.dirty >= 20:
+                self._save()
+
+    def _remove(self, content_hash):
+        file_name, size = self.derived.pop(content_hash)
+        self.total_size -= size
+        if file_name:
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                pass
+
+    def _evict(self):
+        # 超出总大小上限时淘汰最久未使用的副本
+        while self.total_size > self.max_bytes and self.derived:
+            self._remove(next(iter(self.derived)))
+            self.evictions += 1
+
+    def load(self):
+        """
+        加载索引，并清理索引中没有记录的副本文件（例如压缩参数变更后遗留的文件）
+
+        只清理比索引文件更早的文件：上次保存索引之后生成的副本（例如进程在保存前退出）
+        仍然有效，保留下来等待下次保存；没有索引文件时不清理任何文件。
+        """
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.sources = data.get("sources", {})
+            for content_hash, file_name, size in data.get("derived", []):
+                self.derived[content_hash] = (file_name, size)
+                self.total_size += size
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载图片缓存索引失败，将重新生成: {e}")
+            self.sources, self.derived, self.total_size = {}, OrderedDict(), 0
+
+        try:
+            index_mtime = os.stat(self.index_path).st_mtime
+        except OSError:
+            return
+        known = {file_name for file_name, _ in self.derived.values() if file_name}
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith("index_") and entry.name not in known:
+                try:
+                    if entry.stat().st_mtime >= index_mtime:
+                        continue
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def _save(self):
+        data = {
+            "sources": self.sources,
+            "derived": [[h, file_name, size] for h, (file_name, size) in self.derived.items()],
+        }
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+            self.dirty = 0
+        except OSError as e:
+            logger.error(f"保存图片缓存索引失败: {e}")
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def close(self):
+        """停止进程池并保存索引，之后的查询不再排队生成副本"""
+        with self.lock:
+            self.closed = True
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.save()
+
+    def stats(self):
+        """返回缓存命中率、占用空间等统计信息"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.derived),
+            "size_mb": self.total_size / 1024 / 1024,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "pending": len(self.pending),
+        }
+
+
+def create_image_cache(source_dir, config):
+    """根据配置创建图片缓存，未启用时返回 None"""
+    config = dict(DEFAULT_IMAGE_CACHE_CONFIG, **(config or {}))
+    if not config["enabled"]:
+        return None
+    return DerivedImageCache(
+        os.path.join(source_dir, "data", "image_cache"),
+        max_edge=config["max_edge"],
+        quality=config["quality"],
+        image_format=config["format"],
+        passthrough_kb=config["passthrough_kb"],
+        max_size_mb=config["max_size_mb"],
+        workers=config["workers"],
+    )
+
+
+def main():
+    """维护命令：为整个图片库生成压缩副本"""
+    from .config import load_plugin_config
+    from .image_catalog import scan_category
+
+    parser = argparse.ArgumentParser(description="为图片库预先生成压缩副本")
+    parser.add_argument(
+        "--source-dir",
+        default=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")),
+        help="插件目录（包含 data/config.yaml）",
+    )
+    parser.add_argument("--root-dir", help="图片库根目录，默认读取配置中的 doudou_image.root_dir")
+    args = parser.parse_args()
+
+    config = load_plugin_config(args.source_dir).get("doudou_image") or {}
+    root_dir = args.root_dir or config.get("root_dir")
+    if not root_dir:
+        # 豆豆照片模块依赖 AstrBot，只有配置中没有图片库根目录时才导入它读取默认值
+        from .doudou_image import DEFAULT_DOUDOU_IMAGE_CONFIG
+
+        root_dir = DEFAULT_DOUDOU_IMAGE_CONFIG["root_dir"]
+    cache_config = dict(config.get("cache") or {}, enabled=True)
+    cache = create_image_cache(args.source_dir, cache_config)
+    if not cache.available:
+        raise SystemExit("未安装 Pillow，无法生成图片副本")
+
+    try:
+        for entry in sorted(os.scandir(root_dir), key=lambda e: e.name):
+            if entry.is_dir():
+                images = scan_category(entry.path)
+                generated = cache.warm(images)
+                print(f"{entry.name}: {len(images)} 张图片, 新生成 {generated} 个副本")
+        print(f"缓存统计: {cache.stats()}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+图片目录索引模块 - 在后台线程中扫描图片库，按类别建立内存索引
+"""
+
+import logging
+import os
+import random
+import threading
+from collections import OrderedDict, deque, namedtuple
+
+try:
+    from astrbot.api import logger
+except ImportError:  # 作为维护命令单独运行（python -m my_qq_bot.image_cache）时可以不安装 AstrBot
+    logger = logging.getLogger(__name__)
+
+# 支持的图片扩展名及对应格式
+IMAGE_FORMATS = {
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".png": "png",
+    ".gif": "gif",
+    ".webp": "webp",
+}
+
+# 图片选取方式
+SELECT_RANDOM = "random"  # 每次完全随机
+SELECT_SHUFFLE = "shuffle"  # 洗牌袋：一轮内每张图片只出现一次
+SELECT_NO_REPEAT = "no_repeat"  # 随机，但最近出现过的若干张不会重复
+SELECT_MODES = (SELECT_RANDOM, SELECT_SHUFFLE, SELECT_NO_REPEAT)
+
+ImageEntry = namedtuple("ImageEntry", ["path", "size", "mtime", "format"])
+
+
+def scan_category(category_dir):
+    """扫描一个类别目录，返回其中所有图片的索引条目"""
+    entries = []
+    with os.scandir(category_dir) as it:
+        for entry in it:
+            image_format = IMAGE_FORMATS.get(os.path.splitext(entry.name)[1].lower())
+            if not image_format or not entry.is_file():
+                continue
+            st = entry.stat()
+            entries.append(ImageEntry(entry.path, st.st_size, st.st_mtime, image_format))
+    return entries
+
+
+class ImageCatalog:
+    """
+    图片库的内存索引
+
+    启动时在后台线程中扫描一次，之后根据目录变化通知按类别增量刷新。
+    刷新时构建新的字典再整体替换，读取方无需加锁。
+    """
+
+    def __init__(self, root_dir, watcher=None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.watcher = watcher
+        self.categories = {}  # 类别名 -> ImageEntry 列表
+        self.watched = set()  # 已注册监视的类别目录
+        self.ready = threading.Event()
+        self.lock = threading.Lock()  # 保证同一时间只有一个线程在刷新索引
+
+    def start(self):
+        """在后台线程中构建索引"""
+        thread = threading.Thread(target=self.build, name="my-qq-bot-image-catalog", daemon=True)
+        thread.start()
+
+    def wait_ready(self, timeout=None):
+        """等待首次扫描完成"""
+        return self.ready.wait(timeout)
+
+    def build(self):
+        """扫描整个图片库"""
+        try:
+            self.refresh_root()
+            total = sum(len(entries) for entries in self.categories.values())
+            logger.info(f"图片索引构建完成: {len(self.categories)} 个类别, {total} 张图片")
+        finally:
+            self.ready.set()
+
+    def refresh_root(self, path=None):
+        """重新扫描根目录下的类别列表，新增的类别完整扫描，已有类别保持不变"""
+        with self.lock:
+            if self.watcher and self.root_dir not in self.watched:
+                self.watcher.watch(self.root_dir, self.refresh_root)
+                self.watched.add(self.root_dir)
+
+            try:
+                with os.scandir(self.root_dir) as it:
+                    names = [entry.name for entry in it if entry.is_dir()]
+            except OSError as e:
+                logger.error(f"扫描图片目录失败: {self.root_dir}, 错误: {e}")
+                self.categories = {}
+                return
+
+            categories = {}
+            for name in names:
+                category_dir = os.path.join(self.root_dir, name)
+                entries = self.categories.get(name)
+                if entries is None:
+                    entries = self._scan(category_dir)
+                categories[name] = entries
+                if self.watcher and category_dir not in self.watched:
+                    self.watcher.watch(category_dir, self.refresh_category)
+                    self.watched.add(category_dir)
+            self.categories = categories
+
+    def refresh_category(self, category_dir):
+        """类别目录发生变化时，只重新扫描这一个类别"""
+        name = os.path.basename(category_dir)
+        with self.lock:
+            categories = dict(self.categories)
+            if os.path.isdir(category_dir):
+                categories[name] = self._scan(category_dir)
+            else:
+                categories.pop(name, None)
+            self.categories = categories
+        logger.info(f"已刷新图片类别 '{name}': {len(categories.get(name, []))} 张图片")
+
+    def _scan(self, category_dir):
+        try:
+            return scan_category(category_dir)
+        except OSError as e:
+            logger.error(f"扫描图片类别失败: {category_dir}, 错误: {e}")
+            return []
+
+    def has_category(self, category):
+        return category in self.categories
+
+    def images(self, category):
+        """返回类别中的图片列表（不存在时为空列表）"""
+        return self.categories.get(category, [])
+
+
+class ImageSelector:
+    """按会话记录选取历史，避免同一张图片连续出现"""
+
+    def __init__(self, mode=SELECT_SHUFFLE, window=3, max_sessions=1024):
+        """
+        参数:
+            mode: 选取方式，"random" / "shuffle" / "no_repeat"
+            window: no_repeat 模式下不重复的最近图片数量
+            max_sessions: 最多保留多少个会话的选取状态，超出后按 LRU 淘汰
+        """
+        if mode not in SELECT_MODES:
+            raise ValueError(f"不支持的图片选取方式: {mode}")
+        self.mode = mode
+        self.window = window
+        self.max_sessions = max_sessions
+        self.states = OrderedDict()  # (会话, 类别) -> 选取状态
+
+    def pick(self, session, category, images):
+        """从图片列表中为会话选取一张图片，列表为空时返回 None"""
+        if not images:
+            return None
+        if self.mode == SELECT_RANDOM or len(images) == 1:
+            return random.choice(images)
+
+        key = (session, category)
+        state = self.states.get(key)
+        if state is None or state[0] is not images:
+            # 首次选取或图片列表已刷新，重建状态
+            state = (images, [], deque(maxlen=self.window))
+        self.states[key] = state
+        self.states.move_to_end(key)
+        while len(self.states) > self.max_sessions:
+            self.states.popitem(last=False)
+
+        _, bag, recent = state
+        if self.mode == SELECT_SHUFFLE:
+            if not bag:
+                bag.extend(range(len(images)))
+                random.shuffle(bag)
+                # 新一轮的第一张不要与上一轮最后一张相同
+                if recent and len(bag) > 1 and bag[-1] == recent[-1]:
+                    bag[0], bag[-1] = bag[-1], bag[0]
+            index = bag.pop()
+        else:
+            # 最多留出一张可选，保证总能选到
+            window = min(self.window, len(images) - 1)
+            excluded = set(list(recent)[-window:]) if window > 0 else set()
+            index = random.randrange(len(images))
+            while index in excluded:
+                index = random.randrange(len(images))
+        recent.append(index)
+        return images[index]
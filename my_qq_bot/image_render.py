@@ -0,0 +1,93 @@
+"""
+图片压缩模块 - 在子进程中生成缩小/重新编码后的图片副本
+
+本模块只依赖标准库和 Pillow，便于在进程池的子进程中导入。
+"""
+
+import hashlib
+import os
+import tempfile
+
+# 输出格式对应的扩展名和 Pillow 格式名
+OUTPUT_FORMATS = {
+    "jpeg": (".jpg", "JPEG"),
+    "webp": (".webp", "WEBP"),
+    "png": (".png", "PNG"),
+}
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """计算文件内容的 SHA1"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_image(src_path, dst_dir, profile_key, max_edge, quality, image_format, passthrough_bytes):
+    """
+    为一张图片生成压缩后的副本
+
+    参数:
+        src_path: 原图路径
+        dst_dir: 副本存放目录
+        profile_key: 压缩参数的标识，作为文件名的一部分
+        max_edge: 长边的最大像素
+        quality: 有损格式的编码质量
+        image_format: 静态图片的输出格式，见 OUTPUT_FORMATS
+        passthrough_bytes: 原图不超过该大小且尺寸已经足够小时，不生成副本
+
+    返回:
+        (content_hash, file_name, size): 原图内容哈希、副本文件名及大小；
+        不需要副本时 file_name 为 None，size 为原图大小
+    """
+    from PIL import Image, ImageSequence
+
+    content_hash = file_hash(src_path)
+    src_size = os.path.getsize(src_path)
+
+    with Image.open(src_path) as img:
+        width, height = img.size
+        if max(width, height) <= max_edge and src_size <= passthrough_bytes:
+            return content_hash, None, src_size
+
+        scale = min(1.0, max_edge / max(width, height))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        animated = getattr(img, "is_animated", False)
+
+        if animated:
+            # 动图逐帧缩放后仍保存为 GIF
+            extension = ".gif"
+            frames = [frame.convert("RGBA").resize(size, Image.LANCZOS) for frame in ImageSequence.Iterator(img)]
+            save_args = {
+                "format": "GIF",
+                "save_all": True,
+                "append_images": frames[1:],
+                "loop": img.info.get("loop", 0),
+                "duration": img.info.get("duration", 100),
+                "disposal": 2,
+            }
+            output = frames[0]
+        else:
+            extension, pil_format = OUTPUT_FORMATS[image_format]
+            output = img.convert("RGBA" if pil_format != "JPEG" and img.mode in ("RGBA", "LA", "P") else "RGB")
+            output = output.resize(size, Image.LANCZOS)
+            save_args = {"format": pil_format, "quality": quality, "optimize": True}
+
+        file_name = f"{content_hash}_{profile_key}{extension}"
+        dst_path = os.path.join(dst_dir, file_name)
+        # 每次生成使用各自的临时文件，内容相同的原图同时生成副本时不会互相覆盖
+        fd, tmp_path = tempfile.mkstemp(dir=dst_dir, prefix=file_name + ".", suffix=".tmp")
+        os.close(fd)
+        try:
+            output.save(tmp_path, **save_args)
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    return content_hash, file_name, os.path.getsize(dst_path)
@@ -0,0 +1,157 @@
+"""
+本地意图分类模块 - 在调用 LLM 之前用规则和 n-gram 打分快速判断消息类型
+"""
+
+import math
+import re
+import unicodedata
+
+# 与 LLM 分类提示词保持一致的分类标签
+DOUDOU_PHOTO = "豆豆照片请求"
+XIAODOU_PHOTO = "小豆照片请求"
+GOOD_MORNING = "早安"
+GOOD_NOON = "午安"
+GOOD_NIGHT = "晚安"
+OTHER = "其他"
+
+INTENT_LABELS = (DOUDOU_PHOTO, XIAODOU_PHOTO, GOOD_MORNING, GOOD_NOON, GOOD_NIGHT)
+
+# 高置信度规则：整句匹配即直接命中
+DEFAULT_RULES = {
+    DOUDOU_PHOTO: [r"(给我|让我|我想|我要)?(看看?|来一?张|发一?张|要|想看)豆豆(的)?(照片|图片|图|照)?(吧|呗|呀|嘛)?"],
+    XIAODOU_PHOTO: [r"(给我|让我|我想|我要)?(看看?|来一?张|发一?张|要|想看)小豆(的)?(照片|图片|图|照)?(吧|呗|呀|嘛)?"],
+    GOOD_MORNING: [r"(早|早安|早上好|早啊|早呀|早哦|goodmorning|morning)"],
+    GOOD_NOON: [r"(午安|中午好|午好)"],
+    GOOD_NIGHT: [r"(晚安|晚上好|睡了|睡觉了|goodnight|night)"],
+}
+
+# n-gram 打分所用的种子语料
+DEFAULT_SEEDS = {
+    DOUDOU_PHOTO: [
+        "看看豆豆", "豆豆的照片", "来张豆豆", "发张豆豆的图", "想看豆豆",
+        "豆豆呢", "豆豆图片", "给我看豆豆", "豆豆在干嘛",
+    ],
+    XIAODOU_PHOTO: [
+        "看看小豆", "小豆的照片", "来张小豆", "发张小豆的图", "想看小豆",
+        "小豆呢", "小豆图片", "给我看小豆", "小豆在干嘛",
+    ],
+    GOOD_MORNING: ["早", "早安", "早上好", "早啊", "大家早", "早安呀", "good morning"],
+    GOOD_NOON: ["午安", "中午好", "大家中午好", "午安呀"],
+    GOOD_NIGHT: ["晚安", "晚上好", "大家晚安", "晚安呀", "我去睡了", "good night"],
+}
+
+# 归一化时去掉的标点与空白
+_STRIP_RE = re.compile(r"[\s~～!！?？。.,，、…·'\"“”‘’()（）\[\]【】]+")
+
+
+def normalize_text(text):
+    """归一化消息文本：全角转半角、统一小写并去掉空白和标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _STRIP_RE.sub("", text)
+
+
+def _ngrams(text, max_n=2):
+    """提取字符级 1..max_n gram"""
+    grams = []
+    for n in range(1, max_n + 1):
+        for i in range(len(text) - n + 1):
+            grams.append(text[i:i + n])
+    return grams
+
+
+class IntentClassifier:
+    """基于规则和 n-gram 关键词打分的本地意图分类器"""
+
+    def __init__(self, threshold=0.75, max_length=20, rules=None, seeds=None):
+        self.threshold = threshold
+        self.max_length = max_length
+
+        # 编译整句匹配规则
+        rules = rules if rules is not None else DEFAULT_RULES
+        self.rules = {
+            label: [re.compile(rf"^(?:{pattern})$") for pattern in patterns]
+            for label, patterns in rules.items()
+        }
+
+        # 统计每个 gram 出现在哪些标签的种子语料中
+        seeds = seeds if seeds is not None else DEFAULT_SEEDS
+        self.vocab = {}
+        doc_freq = {}
+        for label, phrases in seeds.items():
+            grams = set()
+            for phrase in phrases:
+                grams.update(_ngrams(normalize_text(phrase)))
+            self.vocab[label] = grams
+            for gram in grams:
+                doc_freq[gram] = doc_freq.get(gram, 0) + 1
+
+        # 区分度权重：只出现在少数标签中的 gram 权重更高，未见过的 gram 权重最高
+        label_count = max(len(self.vocab), 1)
+        self.unknown_weight = math.log(1 + label_count)
+        self.weights = {
+            gram: math.log(1 + label_count / df) for gram, df in doc_freq.items()
+        }
+
+        # 统计计数器
+        self.local_hits = 0
+        self.not_local = 0  # 本地无法确定、交给后续流程（分类缓存或LLM）的消息数
+        self.label_hits = {label: 0 for label in self.vocab}
+
+    def score(self, text):
+        """
+        计算消息的分类结果
+
+        返回:
+            (label, confidence): 最可能的标签及置信度(0~1)，无法判断时标签为"其他"
+        """
+        normalized = normalize_text(text)
+        if not normalized or len(normalized) > self.max_length:
+            return OTHER, 0.0
+
+        # 规则优先：整句命中即视为完全确定
+        for label, patterns in self.rules.items():
+            for pattern in patterns:
+                if pattern.match(normalized):
+                    return label, 1.0
+
+        # n-gram 覆盖率打分
+        grams = _ngrams(normalized)
+        total = sum(self.weights.get(g, self.unknown_weight) for g in grams)
+        coverages = []
+        for label, vocab in self.vocab.items():
+            covered = sum(self.weights[g] for g in grams if g in vocab)
+            coverages.append((covered / total, label))
+        coverages.sort(reverse=True)
+
+        best_score, best_label = coverages[0]
+        second_score = coverages[1][0] if len(coverages) > 1 else 0.0
+        # 置信度同时考虑覆盖率和与次优标签的差距
+        return best_label, max(best_score - second_score / 2, 0.0)
+
+    def classify(self, text, has_image=False):
+        """
+        本地快速分类，置信度不足时返回 None，表示需要交给 LLM 判断
+
+        参数:
+            text: 用户消息文本
+            has_image: 消息是否带有图片（带图消息一律交给 LLM）
+        """
+        if not has_image:
+            label, confidence = self.score(text)
+            if label != OTHER and confidence >= self.threshold:
+                self.local_hits += 1
+                self.label_hits[label] += 1
+                return label
+
+        self.not_local += 1
+        return None
+
+    def stats(self):
+        """返回本地命中与未能本地分类的统计信息"""
+        total = self.local_hits + self.not_local
+        return {
+            "local_hits": self.local_hits,
+            "not_local": self.not_local,
+            "local_ratio": self.local_hits / total if total else 0.0,
+            "label_hits": dict(self.label_hits),
+        }
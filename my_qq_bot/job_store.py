@@ -0,0 +1,144 @@
+"""
+定时任务存储模块 - 在本地 SQLite 数据库中记录每个定时任务最近的触发时间和执行历史
+
+插件重启后根据记录的触发时间找出停机期间错过的触发，在补执行窗口内的重新执行一次。
+所有方法都在插件的事件循环中调用，数据库出错时只记录日志，不影响定时任务本身的运行。
+"""
+
+import sqlite3
+import time
+
+from astrbot.api import logger
+
+# 执行结果
+RUN_RUNNING = "running"
+RUN_OK = "ok"
+RUN_FAILED = "failed"
+RUN_CANCELLED = "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,  -- 第一次注册的时间，从未触发过的任务从这时开始计算错过的触发
+    last_fire REAL             -- 最近一次触发对应的计划时间
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    scheduled REAL NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    status TEXT NOT NULL,
+    catch_up INTEGER NOT NULL DEFAULT 0,
+    delivered INTEGER,
+    failed INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+"""
+
+
+class JobStore:
+    """定时任务的触发记录和执行历史"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+        # 上次运行时未正常结束的记录（进程被强制退出）
+        self._execute("UPDATE runs SET status = ? WHERE status = ?", (RUN_CANCELLED, RUN_RUNNING))
+
+    def _execute(self, sql, params=()):
+        if self.db is None:
+            return None
+        try:
+            with self.db:
+                return self.db.execute(sql, params)
+        except sqlite3.Error as e:
+            logger.error(f"定时任务数据库操作失败: {e}")
+            return None
+
+    def register(self, job_ids, now=None):
+        """登记任务，已登记的任务保留原有记录"""
+        now = time.time() if now is None else now
+        if self.db is None or not job_ids:
+            return
+        try:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO jobs (job_id, first_seen) VALUES (?, ?)",
+                    [(job_id, now) for job_id in job_ids],
+                )
+        except sqlite3.Error as e:
+            logger.error(f"定时任务数据库操作失败: {e}")
+
+    def forget(self, job_ids):
+        """删除已从配置中移除的任务的触发记录"""
+        if self.db is None or not job_ids:
+            return
+        try:
+            with self.db:
+                self.db.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+        except sqlite3.Error as e:
+            logger.error(f"定时任务数据库操作失败: {e}")
+
+    def last_fire_times(self):
+        """
+        返回:
+            job_id -> 计算错过的触发时应从哪个时间点之后开始（最近一次触发时间，从未触发过时为登记时间）
+        """
+        cursor = self._execute("SELECT job_id, COALESCE(last_fire, first_seen) FROM jobs")
+        return dict(cursor.fetchall()) if cursor else {}
+
+    def start_run(self, job_id, scheduled, catch_up=False):
+        """记录一次开始执行，返回执行记录 ID"""
+        if self.db is None:
+            return None
+        try:
+            with self.db:
+                self.db.execute(
+                    "UPDATE jobs SET last_fire = MAX(COALESCE(last_fire, 0), ?) WHERE job_id = ?",
+                    (scheduled, job_id),
+                )
+                cursor = self.db.execute(
+                    "INSERT INTO runs (job_id, scheduled, started, status, catch_up) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, scheduled, time.time(), RUN_RUNNING, int(catch_up)),
+                )
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            logger.error(f"定时任务数据库操作失败: {e}")
+            return None
+
+    def finish_run(self, run_id, status, delivered=None, failed=None):
+        """记录执行结果"""
+        if run_id is None:
+            return
+        self._execute(
+            "UPDATE runs SET finished = ?, status = ?, delivered = ?, failed = ? WHERE id = ?",
+            (time.time(), status, delivered, failed, run_id),
+        )
+
+    def prune(self, before):
+        """删除开始时间早于 before 的执行历史"""
+        self._execute("DELETE FROM runs WHERE started < ?", (before,))
+
+    def recent_runs(self, limit=20):
+        """返回最近的执行记录，最新的在前"""
+        cursor = self._execute(
+            "SELECT job_id, scheduled, started, finished, status, catch_up, delivered, failed "
+            "FROM runs ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )
+        columns = ("job_id", "scheduled", "started", "finished", "status", "catch_up", "delivered", "failed")
+        return [dict(zip(columns, row)) for row in cursor.fetchall()] if cursor else []
+
+    def close(self):
+        """关闭数据库连接，可以重复调用"""
+        if self.db is not None:
+            try:
+                self.db.close()
+            except sqlite3.Error as e:
+                logger.error(f"关闭定时任务数据库失败: {e}")
+            self.db = None
@@ -0,0 +1,157 @@
+"""
+关键词匹配模块 - 将关键词触发器编译为多模式匹配自动机，一次扫描找出所有命中的触发器
+"""
+
+import re
+from collections import deque
+
+# 支持的匹配模式
+MATCH_SUBSTRING = "substring"  # 消息包含关键词（默认）
+MATCH_EXACT = "exact"  # 消息与关键词完全相同
+MATCH_PREFIX = "prefix"  # 消息以关键词开头
+MATCH_REGEX = "regex"  # 关键词为正则表达式，在消息中搜索
+MATCH_CASEFOLD = "casefold"  # 忽略大小写的包含匹配
+MATCH_MODES = (MATCH_SUBSTRING, MATCH_EXACT, MATCH_PREFIX, MATCH_REGEX, MATCH_CASEFOLD)
+
+# 命中多个触发器时的回复策略
+POLICY_ALL = "all"  # 回复所有命中的触发器
+POLICY_FIRST = "first"  # 只回复优先级最高的一个
+MATCH_POLICIES = (POLICY_ALL, POLICY_FIRST)
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式字符串匹配自动机"""
+
+    def __init__(self, patterns):
+        """
+        参数:
+            patterns: (pattern, value) 列表，匹配到 pattern 时产出对应的 value
+        """
+        # 状态转移表、失败指针以及每个状态的输出（pattern 长度, value）
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        # 构建 trie
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((len(pattern), value))
+
+        # 按 BFS 顺序计算失败指针，并合并失败链上的输出
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """扫描文本，产出 (起始位置, value)"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, value in output[state]:
+                yield index - length + 1, value
+
+
+class KeywordMatcher:
+    """根据 keyreply.yaml 的触发器配置编译出的关键词匹配器"""
+
+    def __init__(self, triggers, policy=POLICY_ALL):
+        """
+        参数:
+            triggers: 触发器配置列表，每项包含 keyword、answers，可选 mode、priority
+            policy: 命中多个触发器时的回复策略，"all" 或 "first"
+
+        异常:
+            ValueError: 触发器配置不合法
+        """
+        if policy not in MATCH_POLICIES:
+            raise ValueError(f"不支持的匹配策略: {policy}")
+        self.policy = policy
+        self.triggers = list(triggers)
+
+        # 排序键：优先级高的在前，同优先级按配置顺序
+        self.order = {}
+        substring_patterns = []
+        casefold_patterns = []
+        self.exact = {}
+        self.regexes = []
+
+        for index, trigger in enumerate(self.triggers):
+            if not isinstance(trigger, dict):
+                raise ValueError(f"第 {index + 1} 个触发器格式不正确")
+            keyword = trigger.get("keyword")
+            if not isinstance(keyword, str) or not keyword:
+                raise ValueError(f"第 {index + 1} 个触发器缺少 keyword")
+            if not trigger.get("answers"):
+                raise ValueError(f"触发器 '{keyword}' 缺少 answers")
+            mode = trigger.get("mode", MATCH_SUBSTRING)
+            priority = trigger.get("priority", 0)
+            if not isinstance(priority, (int, float)):
+                raise ValueError(f"触发器 '{keyword}' 的 priority 必须是数字")
+            self.order[index] = (-priority, index)
+
+            if mode in (MATCH_SUBSTRING, MATCH_PREFIX):
+                substring_patterns.append((keyword, (index, mode == MATCH_PREFIX)))
+            elif mode == MATCH_CASEFOLD:
+                casefold_patterns.append((keyword.casefold(), (index, False)))
+            elif mode == MATCH_EXACT:
+                self.exact.setdefault(keyword, []).append(index)
+            elif mode == MATCH_REGEX:
+                try:
+                    self.regexes.append((re.compile(keyword), index))
+                except re.error as e:
+                    raise ValueError(f"触发器 '{keyword}' 的正则表达式不合法: {e}")
+            else:
+                raise ValueError(f"触发器 '{keyword}' 的匹配模式 '{mode}' 不支持")
+
+        self.substring_automaton = AhoCorasick(substring_patterns) if substring_patterns else None
+        self.casefold_automaton = AhoCorasick(casefold_patterns) if casefold_patterns else None
+
+    def match(self, message_str):
+        """
+        查找消息命中的触发器
+
+        返回:
+            命中的触发器列表，按优先级从高到低排序；策略为 "first" 时最多一个
+        """
+        matched = set(self.exact.get(message_str, ()))
+
+        if self.substring_automaton:
+            for start, (index, prefix_only) in self.substring_automaton.iter_matches(message_str):
+                if not prefix_only or start == 0:
+                    matched.add(index)
+
+        if self.casefold_automaton:
+            for _, (index, _) in self.casefold_automaton.iter_matches(message_str.casefold()):
+                matched.add(index)
+
+        for pattern, index in self.regexes:
+            if index not in matched and pattern.search(message_str):
+                matched.add(index)
+
+        if not matched:
+            return []
+        ordered = sorted(matched, key=self.order.__getitem__)
+        if self.policy == POLICY_FIRST:
+            ordered = ordered[:1]
+        return [self.triggers[index] for index in ordered]
@@ -9,23 +9,36 @@ import yaml
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.all import event_message_type, EventMessageType
-from astrbot.api.message_components import Image, Plain
+from astrbot.api.message_components import Plain
+
+from . import keyword_matcher
+from .config_snapshot import ConfigSnapshot, code_signature
+from .keyword_matcher import KeywordMatcher, POLICY_ALL
+from .remote_image_cache import collect_image_urls, image_component
 
 
 class KeywordReplyModule:
     """关键词回复功能模块"""
 
-    def __init__(self, context, source_dir):
+    def __init__(self, context, source_dir, watcher=None, image_cache=None, snapshots=None):
         self.context = context
         self.source_dir = source_dir
+        self.image_cache = image_cache  # 远程图片缓存，回复中的网络图片优先发送本地副本
+        self.snapshots = snapshots or ConfigSnapshot()  # 配置快照，配置文件未变化时跳过解析和编译
+        self.yaml_path = os.path.join(source_dir, "data", "keyreply.yaml")
         self.triggers = []
+        self.matcher = KeywordMatcher([])
         # 加载关键词回复配置
         self.load_keyword_reply_config()
 
+        # 配置文件变化时自动重新加载
+        if watcher:
+            watcher.watch(self.yaml_path, self.reload_keyword_reply_config)
+
     def load_keyword_reply_config(self):
         """加载关键词回复配置"""
         # 构建存储问答对的 YAML 文件路径
-        yaml_path = os.path.join(self.source_dir, "data", "keyreply.yaml")
+        yaml_path = self.yaml_path
         directory = os.path.dirname(yaml_path)
 
         # 若目录不存在则创建
@@ -38,33 +51,65 @@ class KeywordReplyModule:
             with open(yaml_path, "w", encoding="utf-8") as f:
                 yaml.dump(default_triggers, f, allow_unicode=True, indent=2)
 
-        # 从 YAML 文件加载问答对
-        with open(yaml_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            self.triggers = data.get("triggers", [])
+        # 从 YAML 文件加载问答对并编译，文件内容与上次编译时相同则直接读取快照
+        triggers, matcher = self.snapshots.load(
+            "keyreply", yaml_path, self.compile_keyword_reply_config, code_signature(keyword_matcher)
+        )
+
+        # 配置没有变化时无需替换匹配器
+        if triggers == self.triggers and matcher.policy == self.matcher.policy:
+            return False
+
+        # 编译成功后再整体替换，正在处理的消息仍使用旧的匹配器
+        self.matcher = matcher
+        self.triggers = triggers
+
+        # 预先下载回复中引用的网络图片，回复时直接读取本地文件
+        if self.image_cache:
+            urls = [url for trigger in triggers for url in collect_image_urls(trigger.get("answers"))]
+            self.image_cache.schedule_prefetch(urls)
+        return True
+
+    @staticmethod
+    def compile_keyword_reply_config(data):
+        """
+        校验关键词回复配置，并将所有触发器编译为一个多模式匹配器，一次扫描即可找出全部命中的触发器
+
+        返回:
+            (triggers, matcher): 触发器列表和编译后的匹配器
+        """
+        data = data or {}
+        if not isinstance(data, dict) or not isinstance(data.get("triggers", []), list):
+            raise ValueError("keyreply.yaml 格式不正确，triggers 必须是列表")
+        triggers = data.get("triggers") or []
+        return triggers, KeywordMatcher(triggers, data.get("match_policy", POLICY_ALL))
+
+    def reload_keyword_reply_config(self, path=None):
+        """重新加载关键词回复配置，配置有误时保留当前配置继续使用"""
+        try:
+            if self.load_keyword_reply_config():
+                logger.info(f"已重新加载关键词回复配置，共 {len(self.triggers)} 个触发器")
+        except (OSError, yaml.YAMLError, ValueError) as e:
+            logger.error(f"关键词回复配置有误，继续使用之前的配置: {e}")
 
     async def handle_keyword_reply(self, event: AstrMessageEvent):
         """处理关键词回复功能"""
         message_str = event.message_str
-        logger.info(f"收到消息: {event.unified_msg_origin}: {message_str[:100]}")
-
-        # 遍历所有触发器进行匹配和回复
-        for trigger in self.triggers:
-            keyword = trigger["keyword"]
-            answers = trigger["answers"]
-
-            # 如果消息包含关键词则随机选择一个回答进行回复
-            if keyword in message_str:
-                # 随机选择一个回答
-                answer = random.choice(answers)
-
-                reply_chain = []
-                if answer.get("text"):
-                    reply_chain.append(Plain(text=answer["text"]))
-                if answer.get("images"):
-                    for image_url in answer["images"]:
-                        if image_url.startswith(("http://", "https://")):
-                            reply_chain.append(Image.fromURL(url=image_url))
-                        else:
-                            reply_chain.append(Image.fromLocal(path=image_url))
-                yield event.chain_result(reply_chain)
+
+        # 对命中的触发器按优先级依次回复（先取出当前匹配器，避免处理过程中被热更新替换）
+        # 免@关键词回复的群中大部分消息不会命中，只在命中时记录日志
+        matcher = self.matcher
+        triggers = matcher.match(message_str)
+        if triggers:
+            logger.info(f"关键词回复: {event.unified_msg_origin}: {message_str[:100]}")
+        for trigger in triggers:
+            # 随机选择一个回答
+            answer = random.choice(trigger["answers"])
+
+            reply_chain = []
+            if answer.get("text"):
+                reply_chain.append(Plain(text=answer["text"]))
+            if answer.get("images"):
+                for image_url in answer["images"]:
+                    reply_chain.append(image_component(image_url, self.image_cache))
+            yield event.chain_result(reply_chain)
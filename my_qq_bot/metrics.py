@@ -0,0 +1,109 @@
+"""
+统计模块 - 延迟分位数、耗时直方图和计数器
+"""
+
+import json
+import math
+import os
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+
+def percentile(values, q):
+    """计算分位数（最近秩法），values 需已排序，q 取 0~100"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(values):
+    """返回一组耗时的数量、p50/p95/p99 和最大值"""
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+class Histogram:
+    """耗时直方图，保留最近 max_samples 个样本计算分位数，总次数和总耗时按全部样本累计"""
+
+    def __init__(self, max_samples=2048):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        summary = summarize(self.samples)
+        summary["count"] = self.count
+        summary["mean"] = self.total / self.count if self.count else 0.0
+        return summary
+
+
+class MetricsRegistry:
+    """按名称记录各处理阶段的耗时直方图和计数器"""
+
+    def __init__(self, max_samples=2048):
+        self.max_samples = max_samples
+        self.histograms = {}
+        self.counters = Counter()
+        self.started_at = time.time()
+
+    def observe(self, name, seconds):
+        """记录一次耗时（秒）"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.max_samples)
+        histogram.observe(seconds)
+
+    def inc(self, name, value=1):
+        """计数器加一"""
+        self.counters[name] += value
+
+    @contextmanager
+    def timer(self, name):
+        """记录 with 代码块的耗时，代码块抛出异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """返回当前所有统计数据"""
+        return {
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+        }
+
+    def format_report(self):
+        """生成便于在聊天中阅读的统计文本，耗时以毫秒显示"""
+        lines = [f"统计时长: {time.time() - self.started_at:.0f} 秒"]
+        for name, summary in self.snapshot()["histograms"].items():
+            lines.append(
+                f"{name}: n={summary['count']} p50={summary['p50'] * 1000:.1f}ms "
+                f"p95={summary['p95'] * 1000:.1f}ms p99={summary['p99'] * 1000:.1f}ms "
+                f"max={summary['max'] * 1000:.1f}ms"
+            )
+        if self.counters:
+            lines.append("计数: " + ", ".join(f"{name}={value}" for name, value in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """把统计数据写入 JSON 文件（先写临时文件再替换）"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
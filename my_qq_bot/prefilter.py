@@ -0,0 +1,99 @@
+"""
+消息预过滤模块 - 在处理消息之前快速判断是否需要处理，群聊中未@机器人的消息直接丢弃
+
+群聊中的绝大多数消息既没有@机器人，也不需要回复。预过滤位于消息处理的最前面，
+不记录日志、不格式化字符串，只做集合查找和组件类型判断。
+"""
+
+from astrbot.api.message_components import At
+
+# 消息预过滤的默认配置
+DEFAULT_PREFILTER_CONFIG = {
+    "allow_groups": [],  # 只处理这些群的消息，留空表示不限制
+    "deny_groups": [],  # 忽略这些群的消息
+    "keyword_groups": [],  # 这些群中的消息不需要@机器人也会触发关键词回复
+}
+
+# 预过滤结果
+SKIP = 0  # 不处理
+ADDRESSED = 1  # 私聊消息，或@了机器人的群消息，完整处理
+KEYWORD_ONLY = 2  # 没有@机器人，但所在群开启了免@关键词回复，只做关键词回复
+DENIED = 3  # @了机器人，但所在群被黑白名单排除，不回复，也不能交给 AstrBot 默认的 LLM 请求
+
+
+class MessagePrefilter:
+    """按群的黑白名单和是否@机器人过滤消息"""
+
+    __slots__ = ("allow_groups", "deny_groups", "keyword_groups", "_self_id", "_self_id_str",
+                 "skipped", "addressed", "keyword_only", "denied")
+
+    def __init__(self, allow_groups=(), deny_groups=(), keyword_groups=()):
+        """
+        参数:
+            allow_groups: 只处理这些群的消息，为空表示不限制
+            deny_groups: 忽略这些群的消息
+            keyword_groups: 不需要@机器人也会触发关键词回复的群
+        """
+        self.allow_groups = frozenset(str(group) for group in allow_groups or ()) or None
+        self.deny_groups = frozenset(str(group) for group in deny_groups or ())
+        self.keyword_groups = frozenset(str(group) for group in keyword_groups or ())
+        # 机器人 ID 及其字符串形式，ID 变化（例如切换账号）时才重新转换
+        self._self_id = None
+        self._self_id_str = ""
+
+        # 统计计数器
+        self.skipped = 0
+        self.addressed = 0
+        self.keyword_only = 0
+        self.denied = 0
+
+    def check(self, message_obj):
+        """
+        判断一条消息是否需要处理
+
+        返回:
+            SKIP / ADDRESSED / KEYWORD_ONLY / DENIED
+        """
+        group_id = message_obj.group_id
+        if not group_id:
+            self.addressed += 1
+            return ADDRESSED
+        if type(group_id) is not str:
+            group_id = str(group_id)
+        if group_id in self.deny_groups or (self.allow_groups is not None and group_id not in self.allow_groups):
+            # 被排除的群中@机器人的消息需要单独区分，调用方据此终止事件
+            if self.is_at_me(message_obj):
+                self.denied += 1
+                return DENIED
+            self.skipped += 1
+            return SKIP
+        if self.is_at_me(message_obj):
+            self.addressed += 1
+            return ADDRESSED
+        if group_id in self.keyword_groups:
+            self.keyword_only += 1
+            return KEYWORD_ONLY
+        self.skipped += 1
+        return SKIP
+
+    def is_at_me(self, message_obj):
+        """检查消息中是否有@机器人自己的 At 组件"""
+        self_id = message_obj.self_id
+        if self_id != self._self_id:
+            self._self_id = self_id
+            self._self_id_str = str(self_id)
+        self_id_str = self._self_id_str
+        for component in message_obj.message:
+            if isinstance(component, At):
+                qq = component.qq
+                if qq == self_id or str(qq) == self_id_str:
+                    return True
+        return False
+
+    def stats(self):
+        return {
+            "skipped": self.skipped,
+            "addressed": self.addressed,
+            "keyword_only": self.keyword_only,
+            "denied": self.denied,
+        }
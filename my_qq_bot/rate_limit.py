@@ -0,0 +1,49 @@
+"""
+限流模块 - 令牌桶限流器
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，允许一定的突发量；速率不大于 0 时不限流"""
+
+    def __init__(self, rate, burst=None):
+        """
+        参数:
+            rate: 每秒补充的令牌数，不大于 0 表示不限流（总是立即取得令牌）
+            burst: 桶容量，即允许的最大突发量，默认与 rate 相同（至少为 1）
+        """
+        self.rate = rate
+        self.unlimited = rate <= 0
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """尝试立即取得令牌，成功返回 True，令牌不足时返回 False"""
+        if self.unlimited:
+            return True
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens=1):
+        """等待直到取得令牌，返回等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        start = time.monotonic()
+        # 加锁保证等待者按先来后到的顺序取得令牌
+        async with self.lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+        return time.monotonic() - start
@@ -0,0 +1,287 @@
+"""
+远程图片缓存模块 - 把回复和定时任务中引用的网络图片缓存到本地磁盘
+
+图片文件按内容的 SHA256 命名，不同 URL 指向同一张图片时只保存一份；索引按 URL
+记录对应的文件、ETag 和 Last-Modified，过期后使用条件请求重新验证。
+"""
+
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+from astrbot.api import logger
+from astrbot.api.message_components import Image
+
+# 远程图片缓存的默认配置
+DEFAULT_REMOTE_IMAGE_CONFIG = {
+    "enabled": True,  # 是否启用远程图片缓存
+    "max_size_mb": 256,  # 缓存目录的总大小上限，超出后按 LRU 淘汰
+    "max_age": 86400,  # 缓存多久后需要向服务器重新验证（秒）
+    "max_file_mb": 20,  # 单张图片的大小上限
+    "timeout": 15,  # 下载超时时间（秒）
+}
+
+
+def is_remote_url(url):
+    return url.startswith(("http://", "https://"))
+
+
+def collect_image_urls(items):
+    """从回复内容列表（每项可包含 images 列表）中取出所有网络图片地址"""
+    urls = []
+    for item in items or []:
+        if isinstance(item, dict):
+            urls.extend(url for url in item.get("images") or [] if isinstance(url, str) and is_remote_url(url))
+    return urls
+
+
+def image_component(image_url, cache=None):
+    """生成图片消息组件，网络图片已缓存时直接发送本地文件，否则仍按 URL 发送"""
+    if not is_remote_url(image_url):
+        return Image.fromLocal(path=image_url)
+    local_path = cache.get_local(image_url) if cache else None
+    if local_path:
+        return Image.fromFileSystem(local_path)
+    return Image.fromURL(url=image_url)
+
+
+class RemoteImageCache:
+    """按 URL 缓存网络图片，支持条件请求重新验证、LRU 淘汰和并发请求合并"""
+
+    def __init__(self, cache_dir, max_size_mb=256, max_age=86400, max_file_mb=20, timeout=15):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.max_age = max_age
+        self.max_file_bytes = max_file_mb * 1024 * 1024
+        self.timeout = timeout
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+        # URL -> {"file", "etag", "last_modified", "size", "checked_at"}，按最近使用排序
+        self.entries = OrderedDict()
+        self.inflight = {}  # URL -> 正在进行的下载任务，用于合并并发请求
+        self.prefetch_tasks = set()  # 后台预取任务，保留引用以免任务在完成前被回收
+        self.session = None
+
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = asyncio.get_event_loop()
+
+        # 统计计数器
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load()
+
+    def get_local(self, url):
+        """
+        返回已缓存图片的本地路径，发送消息时使用，不会等待网络
+
+        未缓存时返回 None 并在后台下载；缓存已过期时仍返回本地文件，同时在后台重新验证。
+        """
+        entry = self.entries.get(url)
+        path = os.path.join(self.cache_dir, entry["file"]) if entry else None
+        if not path or not os.path.exists(path):
+            self.misses += 1
+            self.schedule_prefetch([url])
+            return None
+
+        self.entries.move_to_end(url)
+        self.hits += 1
+        if time.time() - entry["checked_at"] > self.max_age:
+            self.schedule_prefetch([url])
+        return path
+
+    def schedule_prefetch(self, urls):
+        """在事件循环中安排后台预取，可以在任意线程中调用"""
+        urls = [url for url in dict.fromkeys(urls) if is_remote_url(url)]
+        if not urls or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._start_prefetch, urls)
+
+    def _start_prefetch(self, urls):
+        task = self.loop.create_task(self.prefetch(urls))
+        self.prefetch_tasks.add(task)
+        task.add_done_callback(self.prefetch_tasks.discard)
+
+    async def prefetch(self, urls):
+        """下载尚未缓存的图片，并重新验证已过期的缓存"""
+        now = time.time()
+        pending = []
+        for url in dict.fromkeys(urls):
+            entry = self.entries.get(url)
+            if entry is None or now - entry["checked_at"] > self.max_age:
+                pending.append(self.fetch(url))
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def fetch(self, url):
+        """下载或重新验证一张图片，返回本地路径；同一 URL 的并发请求只会发起一次下载"""
+        task = self.inflight.get(url)
+        if task is None:
+            task = self.loop.create_task(self._fetch(url))
+            self.inflight[url] = task
+            task.add_done_callback(lambda _: self.inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url):
+        if self.session is None or self.session.closed:
+            # aiohttp 导入较慢，第一次下载时才导入
+            import aiohttp
+
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        # 已有缓存时发送条件请求，服务器返回 304 则无需重新下载
+        entry = self.entries.get(url)
+        headers = {}
+        if entry and os.path.exists(os.path.join(self.cache_dir, entry["file"])):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        else:
+            entry = None
+
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304 and entry:
+                    entry["checked_at"] = time.time()
+                    self.revalidated += 1
+                    self.save()
+                    return os.path.join(self.cache_dir, entry["file"])
+                response.raise_for_status()
+
+                chunks = []
+                size = 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_file_bytes:
+                        raise ValueError(f"图片超过大小上限 {self.max_file_bytes} 字节")
+                    chunks.append(chunk)
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except Exception as e:
+            logger.warning(f"下载图片失败: {url}, 错误: {e}")
+            return os.path.join(self.cache_dir, entry["file"]) if entry else None
+
+        data = b"".join(chunks)
+        extension = mimetypes.guess_extension(content_type) or os.path.splitext(url.split("?")[0])[1] or ".img"
+        file_name = hashlib.sha256(data).hexdigest() + extension
+        path = os.path.join(self.cache_dir, file_name)
+        if not os.path.exists(path):
+            await asyncio.to_thread(self._write_file, path, data)
+
+        old_file = self.entries[url]["file"] if url in self.entries else None
+        self.entries[url] = {
+            "file": file_name,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": len(data),
+            "checked_at": time.time(),
+        }
+        self.entries.move_to_end(url)
+        if old_file and old_file != file_name:
+            self._remove_file_if_unused(old_file)
+        self._evict()
+        self.save()
+        return path
+
+    @staticmethod
+    def _write_file(path, data):
+        # 不同 URL 的内容相同时可能同时写入同一个文件，每次写入使用各自的临时文件
+        directory, file_name = os.path.split(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=file_name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _remove_file_if_unused(self, file_name):
+        if any(entry["file"] == file_name for entry in self.entries.values()):
+            return
+        try:
+            os.remove(os.path.join(self.cache_dir, file_name))
+        except OSError:
+            pass
+
+    def total_size(self):
+        """按文件去重后的缓存总大小"""
+        files = {entry["file"]: entry["size"] for entry in self.entries.values()}
+        return sum(files.values())
+
+    def _evict(self):
+        # 超出总大小上限时淘汰最久未使用的 URL，文件不再被引用时删除
+        while len(self.entries) > 1 and self.total_size() > self.max_bytes:
+            _, entry = self.entries.popitem(last=False)
+            self._remove_file_if_unused(entry["file"])
+            self.evictions += 1
+
+    def load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for url, entry in data.get("entries", []):
+                self.entries[url] = entry
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载远程图片缓存索引失败，将重新下载: {e}")
+            self.entries.clear()
+
+    def save(self):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": list(self.entries.items())}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.error(f"保存远程图片缓存索引失败: {e}")
+
+    async def close(self):
+        """取消进行中的下载并关闭 HTTP 会话"""
+        for task in list(self.prefetch_tasks) + list(self.inflight.values()):
+            task.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "size_mb": self.total_size() / 1024 / 1024,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+        }
+
+
+def create_remote_image_cache(source_dir, config):
+    """根据配置创建远程图片缓存，未启用时返回 None"""
+    config = dict(DEFAULT_REMOTE_IMAGE_CONFIG, **(config or {}))
+    if not config["enabled"]:
+        return None
+    return RemoteImageCache(
+        os.path.join(source_dir, "data", "remote_images"),
+        max_size_mb=config["max_size_mb"],
+        max_age=config["max_age"],
+        max_file_mb=config["max_file_mb"],
+        timeout=config["timeout"],
+    )
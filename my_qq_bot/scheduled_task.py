@@ -3,36 +3,108 @@
 """
 
 import os
+import sys
 import yaml
 import asyncio
+import hashlib
+import json
+import sqlite3
 import time
+from datetime import datetime, timedelta
+
+import apscheduler
 
 from astrbot.api import logger
 from astrbot.api.event import MessageChain
-from astrbot.api.message_components import Image, Plain
-from apscheduler.schedulers.background import BackgroundScheduler
+from astrbot.api.message_components import Plain
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from tzlocal import get_localzone
+
+from .broadcast import BroadcastEngine
+from .config_snapshot import ConfigSnapshot, code_signature
+from .job_store import JobStore, RUN_CANCELLED, RUN_FAILED, RUN_OK
+from .remote_image_cache import collect_image_urls, image_component
+
+# 调度选项，可在 config.yaml 的 scheduler 一节设置默认值，也可在 scheduled.yaml 中按条覆盖
+JOB_OPTIONS = ("coalesce", "misfire_grace_time", "max_instances")
+
+# 定时任务模块的默认配置
+DEFAULT_SCHEDULER_CONFIG = {
+    "coalesce": True,  # 错过多次触发时是否只补执行一次
+    "misfire_grace_time": 60,  # 错过触发时间后多少秒内仍然执行
+    "max_instances": 1,  # 同一个任务最多同时运行几个实例
+    "broadcast": {},  # 群发配置，见 broadcast.DEFAULT_BROADCAST_CONFIG
+    "image_prefetch_lead": 600,  # 任务触发前多少秒预先下载其中的网络图片
+    "job_store": True,  # 是否在 data/scheduler.db 中记录每个任务的触发时间和执行历史
+    "catch_up_grace": 300,  # 插件重启后补执行多少秒内错过的触发，0 表示不补执行
+    "history_days": 30,  # 执行历史保留的天数，0 表示一直保留
+}
+
+# 定期检查即将触发的任务并预取图片的内部任务 ID
+PREFETCH_JOB_ID = "__prefetch_images__"
+
+# 正在运行的模块实例: 配置文件路径 -> ScheduledTaskModule，保证同一份配置只有一个调度器在运行
+_live_modules = {}
 
 
 class ScheduledTaskModule:
     """定时任务功能模块"""
 
-    def __init__(self, context, source_dir):
+    def __init__(self, context, source_dir, config=None, watcher=None, image_cache=None, snapshots=None):
         self.context = context
         self.source_dir = source_dir
+        self.config = dict(DEFAULT_SCHEDULER_CONFIG, **(config or {}))
+        self.image_cache = image_cache  # 远程图片缓存，定时消息中的网络图片提前下载到本地
+        self.snapshots = snapshots or ConfigSnapshot()  # 配置快照，配置文件未变化时跳过解析和编译
+        self.yaml_path = os.path.join(source_dir, "data", "scheduled.yaml")
         self.schedules = []
+        self.target_groups = {}  # 目标分组名 -> 目标列表
+        self.jobs = {}  # 已注册的任务: job_id -> (cron 表达式, 目标列表, 发送内容, 调度选项)
+        self.triggers = {}  # 解析好的触发器: cron 表达式 -> CronTrigger
         self.scheduler = None
+        self.watcher = watcher
+        self.running_tasks = set()  # 正在执行的定时任务，卸载插件时取消
+        self.last_reports = {}  # job_id -> 最近一次群发的投递报告摘要
+
+        # 群发引擎：一条定时任务可以并发、限流地发送给多个目标
+        self.broadcaster = BroadcastEngine(self.context_send_message, self.config["broadcast"])
+
+        # 任务的触发记录和执行历史，插件重启后据此补执行错过的触发
+        self.store = None
+        if self.config["job_store"]:
+            try:
+                self.store = JobStore(os.path.join(source_dir, "data", "scheduler.db"))
+            except sqlite3.Error as e:
+                logger.error(f"无法打开定时任务数据库，重启后不会补执行错过的任务: {e}")
+
+        # 定时任务运行在插件所在的事件循环上，不再为每次触发创建新的事件循环
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = asyncio.get_event_loop()
 
         # 加载定时任务配置
-        self.load_scheduled_tasks()
+        jobs, errors = self.load_scheduled_tasks()
+
+        # 启动定时任务调度器
+        self.start_scheduler(jobs, errors)
 
-        # 启动定时任务线程
-        self.start_scheduler()
+        # 配置文件变化时自动更新定时任务
+        if watcher:
+            watcher.watch(self.yaml_path, self.reload_scheduled_tasks)
 
     def load_scheduled_tasks(self):
-        """加载定时任务配置"""
+        """
+        加载定时任务配置
+
+        返回:
+            (jobs, errors): 见 build_jobs
+        """
         # 构建定时任务配置文件路径
-        yaml_path = os.path.join(self.source_dir, "data", "scheduled.yaml")
+        yaml_path = self.yaml_path
         directory = os.path.dirname(yaml_path)
 
         # 若目录不存在则创建
@@ -45,60 +117,392 @@ class ScheduledTaskModule:
             with open(yaml_path, "w", encoding="utf-8") as f:
                 yaml.dump(default_schedules, f, allow_unicode=True, indent=2)
 
-        # 从 YAML 文件加载定时任务
-        with open(yaml_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            self.schedules = data.get("schedules", [])
+        # 从 YAML 文件加载定时任务并解析 cron 表达式，文件内容与上次编译时相同则直接读取快照
+        schedules, target_groups, jobs, errors, triggers = self.snapshots.load(
+            "scheduled", yaml_path, self.compile_scheduled_tasks, self.snapshot_salt()
+        )
+        self.schedules = schedules
+        self.target_groups = target_groups
+        self.triggers = triggers
+        return jobs, errors
 
-    def start_scheduler(self):
-        """启动定时任务调度器"""
-        # 停止并清除现有的调度器
-        if self.scheduler and self.scheduler.running:
-            self.scheduler.shutdown()
+    def snapshot_salt(self):
+        """快照键中除文件内容以外影响编译结果的部分：默认调度选项、本地时区和代码版本"""
+        options = json.dumps({key: self.config[key] for key in JOB_OPTIONS}, sort_keys=True)
+        return f"{options}|{get_localzone()}|{code_signature(sys.modules[__name__], apscheduler)}"
+
+    def compile_scheduled_tasks(self, data):
+        """
+        校验定时任务配置并生成任务列表
 
-        # 创建新的调度器
-        self.scheduler = BackgroundScheduler()
+        返回:
+            (schedules, target_groups, jobs, errors, triggers)
+        """
+        data = data or {}
+        if not isinstance(data, dict) or not isinstance(data.get("schedules", []), list):
+            raise ValueError("scheduled.yaml 格式不正确，schedules 必须是列表")
+        schedules = data.get("schedules") or []
+        target_groups = data.get("target_groups") or {}
+        if not isinstance(target_groups, dict) or not all(
+            isinstance(targets, list) for targets in target_groups.values()
+        ):
+            raise ValueError("scheduled.yaml 格式不正确，target_groups 必须是 分组名 -> 目标列表")
+        for scheduled_item in schedules:
+            if not isinstance(scheduled_item, dict):
+                raise ValueError(f"定时任务配置格式不正确: {scheduled_item}")
+            tasks = scheduled_item.get("tasks") or []
+            if not isinstance(tasks, list) or not all(isinstance(task, dict) for task in tasks):
+                raise ValueError(f"定时任务的 tasks 格式不正确: {scheduled_item}")
+        jobs, errors, triggers = self.build_jobs(schedules, target_groups)
+        return schedules, target_groups, jobs, errors, triggers
 
-        # 注册所有定时任务
-        for scheduled_item in self.schedules:
+    def resolve_targets(self, task, target_groups=None):
+        """
+        合并任务中的 target、targets 和 target_groups，返回去重后的目标列表
+        
+        异常:
+            ValueError: 引用了不存在的目标分组，或没有任何目标
+        """
+        if target_groups is None:
+            target_groups = self.target_groups
+        targets = []
+        if task.get("target"):
+            targets.append(task["target"])
+        targets.extend(task.get("targets") or [])
+        for group in task.get("target_groups") or []:
+            if group not in target_groups:
+                raise ValueError(f"目标分组 '{group}' 不存在")
+            targets.extend(target_groups[group])
+        # 去重并保持原有顺序
+        targets = list(dict.fromkeys(targets))
+        if not targets:
+            raise ValueError(f"定时任务没有设置发送目标: {task}")
+        return targets
+
+    @staticmethod
+    def describe_targets(targets):
+        """生成用于日志的目标描述"""
+        if len(targets) == 1:
+            return targets[0]
+        return f"{targets[0]} 等 {len(targets)} 个目标"
+
+    def build_jobs(self, schedules, target_groups=None):
+        """
+        根据定时任务配置生成任务列表
+        
+        返回:
+            (jobs, errors, triggers): job_id -> (cron 表达式, 目标列表, 发送内容, 调度选项) 的字典，
+            配置错误列表，以及 cron 表达式 -> CronTrigger 的字典
+        """
+        jobs = {}
+        errors = []
+        triggers = {}
+        for scheduled_item in schedules:
             cron_expression = scheduled_item.get("schedule")
-            tasks = scheduled_item.get("tasks", [])
+            options = {key: scheduled_item.get(key, self.config[key]) for key in JOB_OPTIONS}
+            try:
+                # 提前校验 crontab 语法，解析结果在添加任务时直接使用
+                if cron_expression not in triggers:
+                    triggers[cron_expression] = CronTrigger.from_crontab(cron_expression)
+            except Exception as e:
+                errors.append(f"定时任务表达式不合法: {cron_expression}, 错误: {str(e)}")
+                continue
 
-            # 为每个任务创建一个调度
-            for task in tasks:
-                target = task.get("target")
+            # 为每个任务生成一个调度
+            for task in scheduled_item.get("tasks") or []:
+                try:
+                    targets = self.resolve_targets(task, target_groups)
+                except ValueError as e:
+                    errors.append(str(e))
+                    continue
+                if task.get("id") is not None and f"task_{task['id']}" in jobs:
+                    errors.append(f"定时任务 id 重复: {task['id']}")
+                    continue
                 send_items = task.get("send", [])
+                job_id = self.make_job_id(cron_expression, targets, jobs, task.get("id"))
+                jobs[job_id] = (cron_expression, targets, send_items, options)
+        return jobs, errors, triggers
 
-                try:
-                    # 使用 CronTrigger 直接支持 crontab 语法
-                    self.scheduler.add_job(
-                        self.run_scheduled_task,
-                        CronTrigger.from_crontab(cron_expression),
-                        args=[target, send_items],
-                        id=f"task_{target}_{cron_expression.replace(' ', '_')}",
-                    )
+    @staticmethod
+    def make_job_id(cron_expression, targets, existing, task_id=None):
+        """
+        生成稳定的 job_id，触发记录和执行历史按 job_id 保存
+
+        配置了 id 的任务直接使用该 id；否则按 cron 表达式和目标生成，修改发送内容或调度选项
+        不会改变 job_id。cron 表达式和目标都相同的任务按出现顺序追加序号区分。
+        """
+        if task_id is not None:
+            return f"task_{task_id}"
+        content = json.dumps([cron_expression, targets], ensure_ascii=False)
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:8]
+        base_id = f"task_{targets[0]}_{cron_expression.replace(' ', '_')}_{digest}"
+        job_id = base_id
+        index = 1
+        while job_id in existing:
+            index += 1
+            job_id = f"{base_id}_{index}"
+        return job_id
+
+    def start_scheduler(self, jobs=None, errors=()):
+        """
+        启动定时任务调度器
+
+        参数:
+            jobs / errors: 已编译的任务列表和配置错误，为 None 时根据当前配置重新生成
+        """
+        # 停止并清除现有的调度器
+        if self.scheduler and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+        # 同一份配置只保留一个调度器：之前的实例没有正常卸载时先停止它，避免任务重复触发
+        previous = _live_modules.get(self.yaml_path)
+        if previous is not None and previous is not self:
+            logger.warning("发现上一次加载的定时任务调度器仍在运行，先将其停止")
+            try:
+                previous.shutdown()
+            except Exception as e:
+                logger.error(f"停止上一次加载的定时任务调度器失败: {e}")
+        _live_modules[self.yaml_path] = self
+
+        # 创建绑定到插件事件循环的调度器，任务以协程的形式直接在该循环上执行
+        self.scheduler = AsyncIOScheduler(event_loop=self.loop)
+        self.jobs = {}
 
-                    logger.info(f"已添加定时任务: {cron_expression} -> {target}")
-                except Exception as e:
-                    logger.error(f"添加定时任务失败: {cron_expression}, 错误: {str(e)}")
+        # 注册所有定时任务，配置有误的任务跳过
+        if jobs is None:
+            jobs, errors, self.triggers = self.build_jobs(self.schedules)
+        for error in errors:
+            logger.error(f"添加定时任务失败: {error}")
+        self.sync_jobs(jobs)
+
+        # 补执行插件停止期间错过的触发，并清理过期的执行历史
+        if self.store:
+            self.catch_up_missed_runs()
+            if self.config["history_days"]:
+                self.store.prune(time.time() - self.config["history_days"] * 86400)
+
+        # 定期预取即将触发的任务中的网络图片，发送时只读取本地文件
+        if self.image_cache and self.config["image_prefetch_lead"]:
+            self.scheduler.add_job(
+                self.prefetch_upcoming_images,
+                IntervalTrigger(seconds=max(30, self.config["image_prefetch_lead"] // 4)),
+                id=PREFETCH_JOB_ID,
+                next_run_time=datetime.now(),
+                coalesce=True,
+                max_instances=1,
+            )
 
         # 启动调度器
         self.scheduler.start()
 
-    def run_scheduled_task(self, target, send_items):
-        """执行定时任务"""
-        # 创建一个新的事件循环来运行异步任务
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    def sync_jobs(self, jobs):
+        """对比新旧任务列表，只移除、添加和更新有变化的任务，调度器无需重启"""
+        removed = self.jobs.keys() - jobs.keys()
+        for job_id in removed:
+            cron_expression, targets, _, _ = self.jobs[job_id]
+            self.last_reports.pop(job_id, None)
+            try:
+                self.scheduler.remove_job(job_id)
+                logger.info(f"已移除定时任务: {cron_expression} -> {self.describe_targets(targets)}")
+            except JobLookupError:
+                pass
+
+        added = {}
+        for job_id in jobs.keys() - self.jobs.keys():
+            cron_expression, targets, send_items, options = jobs[job_id]
+            try:
+                # 使用 CronTrigger 直接支持 crontab 语法
+                self.scheduler.add_job(
+                    self.run_scheduled_task,
+                    self.triggers.get(cron_expression) or CronTrigger.from_crontab(cron_expression),
+                    args=[targets, send_items, job_id],
+                    id=job_id,
+                    **options,
+                )
+                added[job_id] = jobs[job_id]
+                logger.info(f"已添加定时任务: {cron_expression} -> {self.describe_targets(targets)}")
+            except Exception as e:
+                logger.error(f"添加定时任务失败: {cron_expression}, 错误: {str(e)}")
+
+        # job_id 相同但内容有变化的任务原地更新，保留调度器中的任务和数据库中的触发记录
+        for job_id in jobs.keys() & self.jobs.keys():
+            if jobs[job_id] == self.jobs[job_id]:
+                continue
+            cron_expression, targets, send_items, options = jobs[job_id]
+            try:
+                if cron_expression != self.jobs[job_id][0]:
+                    self.scheduler.reschedule_job(
+                        job_id, trigger=self.triggers.get(cron_expression) or CronTrigger.from_crontab(cron_expression)
+                    )
+                self.scheduler.modify_job(job_id, args=[targets, send_items, job_id], **options)
+                self.jobs[job_id] = added[job_id] = jobs[job_id]
+                logger.info(f"已更新定时任务: {cron_expression} -> {self.describe_targets(targets)}")
+            except Exception as e:
+                logger.error(f"更新定时任务失败: {cron_expression}, 错误: {str(e)}")
+
+        self.jobs = {job_id: job for job_id, job in self.jobs.items() if job_id in jobs}
+        self.jobs.update(added)
+        if self.store:
+            self.store.forget(removed)
+            self.store.register(added.keys())
+
+        # 新增或更新的任务可能很快触发，立即预取其中的图片
+        if self.image_cache and added:
+            self.image_cache.schedule_prefetch(
+                [url for _, _, send_items, _ in added.values() for url in collect_image_urls(send_items)]
+            )
+
+    def catch_up_missed_runs(self):
+        """补执行插件停止期间错过、且距今不超过 catch_up_grace 秒的触发"""
+        grace = self.config["catch_up_grace"]
+        last_fires = self.store.last_fire_times()
+        # 插件停止期间从配置中删除的任务
+        self.store.forget(last_fires.keys() - self.jobs.keys())
+        if not grace:
+            return
+
+        for job_id, (cron_expression, targets, send_items, options) in self.jobs.items():
+            since = last_fires.get(job_id)
+            if since is None:
+                continue
+            trigger = self.triggers.get(cron_expression) or CronTrigger.from_crontab(cron_expression)
+            missed = self.missed_fire_times(trigger, since, grace)
+            if options["coalesce"]:
+                missed = missed[-1:]
+            for fire_time in missed:
+                # 不指定触发器的任务在调度器启动后立即执行一次
+                self.scheduler.add_job(
+                    self.run_scheduled_task,
+                    args=[targets, send_items, job_id],
+                    kwargs={"scheduled": fire_time.timestamp(), "catch_up": True},
+                    id=f"{job_id}_catch_up_{int(fire_time.timestamp())}",
+                    misfire_grace_time=None,
+                )
+                logger.info(
+                    f"补执行错过的定时任务: {cron_expression} ({fire_time:%Y-%m-%d %H:%M}) "
+                    f"-> {self.describe_targets(targets)}"
+                )
 
+    @staticmethod
+    def missed_fire_times(trigger, since, grace, now=None):
+        """
+        计算 since 之后、距 now 不超过 grace 秒的所有触发时间
+
+        参数:
+            trigger: CronTrigger
+            since: 上一次触发的时间戳，只计算这之后的触发
+            grace: 补执行窗口（秒）
+            now: 当前时间，默认为触发器时区的当前时间
+        """
+        now = now or datetime.now(trigger.timezone)
+        start = max(
+            datetime.fromtimestamp(since, trigger.timezone) + timedelta(seconds=1),
+            now - timedelta(seconds=grace),
+        )
+        missed = []
+        fire_time = trigger.get_next_fire_time(None, start)
+        while fire_time and fire_time < now:
+            missed.append(fire_time)
+            fire_time = trigger.get_next_fire_time(fire_time, fire_time + timedelta(seconds=1))
+        return missed
+
+    async def prefetch_upcoming_images(self):
+        """预先下载将在 image_prefetch_lead 秒内触发的任务中的网络图片，已缓存的图片过期时重新验证"""
+        lead = timedelta(seconds=self.config["image_prefetch_lead"])
+        urls = []
+        for job_id, (_, _, send_items, _) in self.jobs.items():
+            job = self.scheduler.get_job(job_id)
+            if job and job.next_run_time and job.next_run_time - datetime.now(job.next_run_time.tzinfo) <= lead:
+                urls.extend(collect_image_urls(send_items))
+        if urls:
+            await self.image_cache.prefetch(urls)
+
+    def reload_scheduled_tasks(self, path=None):
+        """重新加载定时任务配置并增量更新任务，配置有误时保留当前任务继续运行"""
+        previous = self.schedules, self.target_groups, self.triggers
+        try:
+            jobs, errors = self.load_scheduled_tasks()
+            if errors:
+                raise ValueError("; ".join(errors))
+        except (OSError, yaml.YAMLError, ValueError) as e:
+            self.schedules, self.target_groups, self.triggers = previous
+            logger.error(f"定时任务配置有误，继续使用之前的配置: {e}")
+            return
+        # 监视线程中触发的重新加载，交给事件循环执行，避免与调度器并发修改任务
+        self.loop.call_soon_threadsafe(self.apply_reloaded_jobs, jobs)
+
+    def apply_reloaded_jobs(self, jobs):
+        """在事件循环中应用重新加载后的任务列表"""
+        if not self.scheduler or not self.scheduler.running:
+            return
+        self.sync_jobs(jobs)
+        logger.info(f"已重新加载定时任务配置，共 {len(self.jobs)} 个任务")
+
+    def shutdown(self):
+        """停止调度器、取消正在执行的定时任务并关闭数据库，插件卸载时调用，可以重复调用"""
+        if self.scheduler:
+            if self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+        for task in list(self.running_tasks):
+            task.cancel()
+        self.running_tasks.clear()
+        if self.watcher:
+            self.watcher.unwatch(self.yaml_path)
+            self.watcher = None
+        if self.store:
+            self.store.close()
+        if _live_modules.get(self.yaml_path) is self:
+            del _live_modules[self.yaml_path]
+
+    async def run_scheduled_task(self, targets, send_items, job_id=None, scheduled=None, catch_up=False):
+        """
+        执行定时任务（由调度器在插件的事件循环上调用）
+
+        参数:
+            scheduled: 这次执行对应的计划触发时间戳，默认为当前时间
+            catch_up: 是否为重启后补执行的触发
+        """
+        task = asyncio.current_task()
+        self.running_tasks.add(task)
+        run_id = self.store.start_run(job_id, scheduled or time.time(), catch_up) if self.store and job_id else None
+        status, summary = RUN_FAILED, {}
         try:
             # 运行发送消息的异步任务
-            loop.run_until_complete(self.send_scheduled_message(target, send_items))
+            report = await self.send_scheduled_message(targets, send_items, job_id)
+            summary = report.summary()
+            status = RUN_FAILED if summary["failed"] else RUN_OK
+            if job_id:
+                self.last_reports[job_id] = summary
+        except asyncio.CancelledError:
+            # 插件卸载时取消，正常结束即可
+            status = RUN_CANCELLED
+            logger.info(f"定时任务已取消: {self.describe_targets(targets)}")
         finally:
-            loop.close()
+            self.running_tasks.discard(task)
+            if self.store:
+                self.store.finish_run(run_id, status, summary.get("delivered"), summary.get("failed"))
+
+    async def context_send_message(self, target, chain):
+        """通过 AstrBot 上下文发送消息，返回是否找到目标平台"""
+        return await self.context.send_message(target, chain)
 
-    async def send_scheduled_message(self, target, send_items):
-        """发送定时消息"""
+    async def send_scheduled_message(self, targets, send_items, name=None):
+        """
+        发送定时消息
+        
+        参数:
+            targets: 目标或目标列表，每个目标内按顺序发送，不同目标之间并发
+            send_items: 要发送的内容列表
+            name: 本次发送的名称，用于日志
+            
+        返回:
+            DeliveryReport: 投递报告
+        """
+        if isinstance(targets, str):
+            targets = [targets]
+
+        chains = []
         for item in send_items:
             reply_chain = []
 
@@ -109,18 +513,19 @@ class ScheduledTaskModule:
             # 添加图片
             if item.get("images"):
                 for image_url in item["images"]:
-                    if image_url.startswith(("http://", "https://")):
-                        reply_chain.append(Image.fromURL(url=image_url))
-                    else:
-                        reply_chain.append(Image.fromLocal(path=image_url))
+                    reply_chain.append(image_component(image_url, self.image_cache))
 
-            # 发送消息
             if reply_chain:
                 chain = MessageChain()
                 chain.chain.extend(reply_chain)
-                try:
-                    # 使用 API 发送消息到指定目标
-                    await self.context.send_message(target, chain)
-                    logger.info(f"已发送定时消息到 {target}")
-                except Exception as e:
-                    logger.error(f"发送定时消息失败: {str(e)}")
+                chains.append(chain)
+
+        # 使用群发引擎发送消息到所有目标
+        report = await self.broadcaster.broadcast(name or self.describe_targets(targets), targets, chains)
+        summary = report.summary()
+        logger.info(
+            f"已发送定时消息到 {self.describe_targets(targets)}: 成功 {summary['delivered']}, "
+            f"失败 {summary['failed']}, 重试 {summary['retries']}, 耗时 {summary['duration']} 秒, "
+            f"送达延迟 p50={summary['latency']['p50']} p95={summary['latency']['p95']} p99={summary['latency']['p99']}"
+        )
+        return report
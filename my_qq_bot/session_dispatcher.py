@@ -0,0 +1,207 @@
+"""
+会话调度模块 - 合并同一会话中连续发送的消息片段，并按顺序逐条处理
+
+同一会话（unified_msg_origin）在防抖窗口内收到的多条消息合并为一批，由最后一条
+消息的处理流程统一处理，之前的片段直接结束。每个会话的各批消息严格按顺序处理，
+不同会话之间互不影响、并行处理。
+
+本模块不依赖 AstrBot，只使用 asyncio。
+"""
+
+import asyncio
+from collections import deque
+
+# 会话调度的默认配置
+DEFAULT_DISPATCHER_CONFIG = {
+    "enabled": True,  # 是否合并消息片段并按会话顺序处理
+    "debounce": 0.3,  # 收到消息后等待多久没有新消息再处理（秒），每条消息的回复都会因此推迟这么久
+    "max_fragments": 5,  # 一批最多合并多少条消息，达到后立即处理
+    "max_queue": 3,  # 每个会话最多排队的批次数（包括正在处理的一批）
+    "shed_policy": "reject",  # 队列已满时: reject(拒绝新消息) / drop_oldest(丢弃最早排队的一批)
+    "busy_reply": "消息太多啦，等我回复完再发吧~",  # 拒绝新消息时的回复，留空则不回复
+}
+
+SHED_POLICIES = ("reject", "drop_oldest")
+
+# 提交结果
+READY = "ready"  # 轮到这一批处理
+MERGED = "merged"  # 已合并到同一会话的后续消息中，由后续消息处理
+REJECTED = "rejected"  # 队列已满，新消息被拒绝
+DROPPED = "dropped"  # 队列已满，排队中的这一批被丢弃
+
+
+class _Batch:
+    """一批合并后的消息"""
+
+    __slots__ = ("fragments", "image_urls", "leader", "deadline", "dropped", "running")
+
+    def __init__(self):
+        self.fragments = []
+        self.image_urls = []
+        self.leader = None  # 负责处理这一批的提交（最后一条消息）
+        self.deadline = 0.0
+        self.dropped = False
+        self.running = False
+
+
+class _SessionState:
+    """一个会话的调度状态"""
+
+    __slots__ = ("open_batch", "queue", "lock")
+
+    def __init__(self):
+        self.open_batch = None  # 仍在防抖窗口内、可以继续合并的一批
+        self.queue = deque()  # 尚未处理完的批次（按到达顺序，包括正在处理的一批）
+        self.lock = asyncio.Lock()  # 保证同一会话的批次按顺序处理（asyncio.Lock 按等待顺序唤醒）
+
+
+class Ticket:
+    """一次提交的结果，status 为 READY 时处理完成后需要调用 SessionDispatcher.done"""
+
+    __slots__ = ("session", "status", "text", "image_urls", "fragments", "wait", "_state", "_batch")
+
+    def __init__(self, session, state=None, batch=None):
+        self.session = session
+        self.status = None
+        self.text = ""
+        self.image_urls = []
+        self.fragments = 0
+        self.wait = 0.0  # 防抖结束后等待前一批处理完成的时间（秒）
+        self._state = state
+        self._batch = batch
+
+
+class SessionDispatcher:
+    """按会话合并消息片段并顺序处理"""
+
+    def __init__(self, debounce=0.3, max_fragments=5, max_queue=3, shed_policy="reject"):
+        if shed_policy not in SHED_POLICIES:
+            raise ValueError(f"未知的队列满处理策略: {shed_policy}")
+        self.debounce = debounce
+        self.max_fragments = max(1, max_fragments)
+        self.max_queue = max(1, max_queue)
+        self.shed_policy = shed_policy
+        self.sessions = {}  # 会话 -> _SessionState
+
+        # 统计计数器
+        self.merged = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    async def submit(self, session, text, image_urls=()):
+        """
+        提交一条消息，等待防抖窗口结束并轮到这一批处理
+
+        参数:
+            session: 会话标识
+            text: 消息文本
+            image_urls: 消息中的图片
+
+        返回:
+            Ticket: status 为 READY 时 text/image_urls 为合并后的内容
+        """
+        loop = asyncio.get_running_loop()
+        state = self.sessions.get(session)
+        if state is None:
+            state = self.sessions[session] = _SessionState()
+
+        batch = state.open_batch
+        if batch is None:
+            if len(state.queue) >= self.max_queue and not self._shed(state):
+                self.rejected += 1
+                ticket = Ticket(session)
+                ticket.status = REJECTED
+                return ticket
+            batch = _Batch()
+            state.open_batch = batch
+            state.queue.append(batch)
+
+        ticket = Ticket(session, state, batch)
+        batch.fragments.append(text)
+        batch.image_urls.extend(image_urls)
+        batch.leader = ticket
+        batch.deadline = loop.time() + self.debounce
+        if len(batch.fragments) >= self.max_fragments:
+            # 片段数达到上限，立即结束合并
+            batch.deadline = loop.time()
+            state.open_batch = None
+
+        try:
+            # 防抖：窗口内收到新消息时由新消息接管这一批
+            while batch.leader is ticket and not batch.dropped:
+                delay = batch.deadline - loop.time()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if batch.leader is ticket:
+                self._discard(state, batch)
+            raise
+
+        if batch.leader is not ticket:
+            self.merged += 1
+            ticket.status = MERGED
+            return ticket
+        if batch.dropped:
+            ticket.status = DROPPED
+            return ticket
+        if state.open_batch is batch:
+            state.open_batch = None
+
+        # 等待同一会话中前面的批次处理完成
+        waited_from = loop.time()
+        try:
+            await state.lock.acquire()
+        except asyncio.CancelledError:
+            self._discard(state, batch)
+            raise
+        if batch.dropped:
+            state.lock.release()
+            ticket.status = DROPPED
+            return ticket
+
+        batch.running = True
+        ticket.status = READY
+        ticket.text = "\n".join(fragment for fragment in batch.fragments if fragment)
+        ticket.image_urls = list(dict.fromkeys(batch.image_urls))
+        ticket.fragments = len(batch.fragments)
+        ticket.wait = loop.time() - waited_from
+        return ticket
+
+    def done(self, ticket):
+        """一批消息处理完成，让同一会话的下一批开始处理"""
+        if ticket.status != READY:
+            return
+        state = ticket._state
+        self._discard(state, ticket._batch)
+        state.lock.release()
+        if not state.queue and state.open_batch is None and self.sessions.get(ticket.session) is state:
+            del self.sessions[ticket.session]
+
+    def _shed(self, state):
+        """队列已满时按策略腾出位置，返回是否可以接收新的一批"""
+        if self.shed_policy != "drop_oldest":
+            return False
+        for batch in state.queue:
+            if not batch.running and batch is not state.open_batch:
+                batch.dropped = True
+                state.queue.remove(batch)
+                self.dropped += 1
+                return True
+        return False
+
+    @staticmethod
+    def _discard(state, batch):
+        if batch in state.queue:
+            state.queue.remove(batch)
+        if state.open_batch is batch:
+            state.open_batch = None
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "queued": sum(len(state.queue) for state in self.sessions.values()),
+            "merged": self.merged,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,141 @@
+"""
+流式回复模块 - 逐段读取 LLM 的输出，在句子或段落结束处切分，切好一段就可以先发送
+
+本模块只使用 AstrBot 的日志接口，提供商只需要实现 text_chat_stream / text_chat 接口。
+"""
+
+from astrbot.api import logger
+
+# 流式回复的默认配置
+DEFAULT_STREAMING_CONFIG = {
+    "enabled": False,  # 是否以流式方式生成自由回复，边生成边分条发送
+    "min_chars": 20,  # 一条消息至少多少个字，达到后在下一个句子结尾处切分
+    "max_chars": 200,  # 一条消息最多多少个字，一直没有句子结尾时强制切分
+    "max_messages": 5,  # 一次回复最多发送几条消息，剩余内容合并到最后一条
+    "interval": 1.0,  # 相邻两条消息之间至少间隔多少秒，避免触发平台的发送频率限制
+}
+
+# 句子和段落的结束符，以及可以跟在结束符后面的右引号、右括号
+SENTENCE_ENDINGS = "。！？!?；;…~～\n"
+CLOSING_MARKS = "”’」』）)】\"'"
+# 没有句子结尾、需要强制切分时优先在这些字符后切分
+SOFT_BREAKS = "，,、：: "
+
+
+class SentenceChunker:
+    """把增量到达的文本切分为完整的句子或段落"""
+
+    def __init__(self, min_chars=20, max_chars=200):
+        self.min_chars = max(1, min_chars)
+        self.max_chars = max(self.min_chars, max_chars)
+        self.buffer = ""
+
+    def feed(self, text):
+        """
+        追加一段文本
+
+        返回:
+            已经完整的文本片段列表（保留原有的空白，拼接起来与输入完全相同）
+        """
+        self.buffer += text
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if not cut:
+                return chunks
+            chunks.append(self.buffer[:cut])
+            self.buffer = self.buffer[cut:]
+
+    def flush(self):
+        """返回剩余的全部文本"""
+        rest, self.buffer = self.buffer, ""
+        return rest
+
+    def _find_cut(self):
+        buffer = self.buffer
+        length = len(buffer)
+        limit = min(length, self.max_chars)
+        index = self.min_chars - 1
+        while index < limit:
+            char = buffer[index]
+            # 英文句号后面需要跟空白，避免在小数点处切分
+            if char in SENTENCE_ENDINGS or (char == "." and index + 1 < length and buffer[index + 1].isspace()):
+                # 结束符后面连续的结束符和右引号属于同一句
+                end = index + 1
+                while end < length and (buffer[end] in SENTENCE_ENDINGS or buffer[end] in CLOSING_MARKS):
+                    end += 1
+                # 已经看到结束符之后的文字，才能确定这一句完整了（例如 "……" 可能分两次到达）
+                if end < length:
+                    return end
+                return None
+            index += 1
+
+        if length < self.max_chars:
+            return None
+        # 超过最大长度仍没有句子结尾，在最后一个逗号等处切分，都没有时按最大长度切分
+        for index in range(self.max_chars - 1, self.min_chars - 2, -1):
+            if buffer[index] in SOFT_BREAKS:
+                return index + 1
+        return self.max_chars
+
+
+def response_text(response):
+    """取出 LLM 响应中的文本"""
+    return getattr(response, "completion_text", None) or ""
+
+
+async def complete(provider, kwargs):
+    """一次性请求 LLM，返回完整的回复文本"""
+    response = await provider.text_chat(**kwargs)
+    if response.role == "err":
+        raise RuntimeError(response_text(response))
+    return response_text(response)
+
+
+async def stream_completion(provider, **kwargs):
+    """
+    以流式方式请求 LLM，逐段产出新增的文本
+
+    提供商不支持流式输出，或在产出任何文本之前流式请求失败时，改用 text_chat
+    一次产出完整的回复。
+
+    参数:
+        provider: LLM 提供商
+        kwargs: 传给 text_chat_stream / text_chat 的参数
+
+    异常:
+        RuntimeError: LLM 返回了错误响应
+    """
+    stream = None
+    stream_chat = getattr(provider, "text_chat_stream", None)
+    if stream_chat:
+        try:
+            stream = stream_chat(**kwargs)
+        except (NotImplementedError, TypeError) as e:
+            logger.debug("提供商不支持流式输出: %s", e)
+    if stream is None or not hasattr(stream, "__aiter__"):
+        # 未实现流式接口的提供商（基类中的空方法）返回的是协程，关闭以免产生未等待的警告
+        if hasattr(stream, "close"):
+            stream.close()
+        yield await complete(provider, kwargs)
+        return
+
+    received = ""
+    try:
+        async for response in stream:
+            if response.role == "err":
+                raise RuntimeError(response_text(response))
+            text = response_text(response)
+            if getattr(response, "is_chunk", False):
+                received += text
+                yield text
+            elif text.startswith(received):
+                # 最后一次返回完整的结果，只产出此前没有收到的部分
+                if len(text) > len(received):
+                    yield text[len(received):]
+                received = text
+    except Exception as e:
+        if received:
+            raise
+        logger.warning(f"流式请求失败，改为一次性请求: {e}")
+        yield await complete(provider, kwargs)